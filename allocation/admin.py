@@ -1,91 +1,79 @@
 from django.contrib import admin
-from .models import Group, AllocationResult
+from django.utils import timezone
+from .models import Group, AllocationResult, AllocationJob, EmailOutbox
+from .persistence import refresh_group_stats
 
 
 class GroupInline(admin.TabularInline):
     model = Group
     extra = 0
-    readonly_fields = ['number', 'supervisor', 'average_grade']
+    fields = ['number', 'supervisor', 'student_count', 'average_cgpa', 'min_cgpa', 'max_cgpa']
+    readonly_fields = fields
     can_delete = False
 
     def has_add_permission(self, request, obj=None):
         return False
 
 
-class DepartmentFilter(admin.SimpleListFilter):
-    title = 'Department'
-    parameter_name = 'department'
-
-    def lookups(self, request, model_admin):
-        # Import here to avoid circular imports
-        from frontend.models import Department
-        departments = Department.objects.all()
-        return [(dept.id, dept.name) for dept in departments]
-
-    def queryset(self, request, queryset):
-        if self.value():
-            return queryset.filter(groups__department_id=self.value()).distinct()
-        return queryset
-
-
 @admin.register(AllocationResult)
 class AllocationResultAdmin(admin.ModelAdmin):
-    list_display = ['id', 'created_at', 'method', 'num_groups', 'department', 'total_students_allocated']
-    list_filter = [DepartmentFilter, 'method', 'created_at']
-    readonly_fields = ['created_at', 'method', 'num_groups', 'department_info']
+    list_display = ['id', 'created_at', 'method', 'num_groups', 'department', 'student_count']
+    list_filter = ['department', 'method', 'created_at']
+    list_select_related = ['department']
+    readonly_fields = ['created_at', 'method', 'num_groups', 'department', 'student_count']
     inlines = [GroupInline]
 
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        # Annotate with department for efficient filtering
-        from django.db.models import Count, Max
-        return qs.annotate(
-            department_count=Count('groups__department', distinct=True)
-        )
-
-    def department(self, obj):
-        # Get the first department (assuming one allocation per department)
-        groups = obj.groups.all()
-        if groups.exists():
-            return groups.first().department
-        return "No Department"
-
-    department.short_description = 'Department'
-
-    def total_students_allocated(self, obj):
-        return sum(group.students.count() for group in obj.groups.all())
-
-    total_students_allocated.short_description = 'Total Students'
-
-    def department_info(self, obj):
-        departments = set()
-        for group in obj.groups.all():
-            if group.department:
-                departments.add(group.department.name)
-        return ", ".join(departments) if departments else "No Departments"
-
-    department_info.short_description = 'Departments'
-
 
 class GroupAdmin(admin.ModelAdmin):
-    list_display = ['number', 'supervisor', 'department', 'allocation_result', 'student_count', 'average_grade_display']
+    list_display = ['number', 'supervisor', 'department', 'allocation_result', 'student_count', 'average_grade_display',
+                    'min_cgpa', 'max_cgpa']
     list_filter = ['department', 'allocation_result', 'supervisor']
-    readonly_fields = ['average_grade_display']
+    readonly_fields = ['student_count', 'average_grade_display', 'min_cgpa', 'max_cgpa', 'classification_display']
+    exclude = ['cgpa_total', 'average_cgpa', 'class_counts']
     search_fields = ['number', 'supervisor__name', 'students__name']
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs.select_related('supervisor', 'department', 'allocation_result').prefetch_related('students')
-
-    def student_count(self, obj):
-        return obj.students.count()
+        return qs.select_related('supervisor', 'department', 'allocation_result')
 
-    student_count.short_description = 'Students'
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Members may have been edited by hand
+        refresh_group_stats([form.instance.pk])
 
     def average_grade_display(self, obj):
         return f"{obj.average_grade:.2f}"
 
     average_grade_display.short_description = 'Average Grade'
 
+    def classification_display(self, obj):
+        return ", ".join(f"{label}: {count}" for label, count in obj.classification_breakdown) or "-"
+
+    classification_display.short_description = 'Classifications'
+
+
+admin.site.register(Group, GroupAdmin)
 
-admin.site.register(Group, GroupAdmin)
\ No newline at end of file
+
+@admin.register(AllocationJob)
+class AllocationJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'department', 'method', 'num_groups', 'status', 'phase', 'progress', 'created_at', 'finished_at']
+    list_filter = ['status', 'method', 'department']
+    readonly_fields = ['started_at', 'finished_at', 'timings', 'allocation_result']
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ['id', 'department', 'kind', 'to_email', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status', 'kind', 'department']
+    list_select_related = ['department']
+    search_fields = ['to_email', 'subject']
+    readonly_fields = ['group', 'student', 'claim_token', 'claimed_at', 'last_error', 'created_at', 'sent_at']
+    actions = ['retry_now']
+
+    @admin.action(description='Retry selected e-mails now')
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status=EmailOutbox.STATUS_SENT).update(
+            status=EmailOutbox.STATUS_PENDING, attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f"{updated} e-mails queued again.")
@@ -0,0 +1,61 @@
+# allocation/batch.py
+"""
+Per-department work for ``manage.py allocate_departments``.
+
+Kept free of module-level model imports: the functions are unpickled in
+freshly spawned worker processes before Django is set up there.
+"""
+import time
+
+
+def init_worker():
+    # Runs once per worker process; the process then keeps one DB connection
+    # for all the departments it is given.
+    import django
+    django.setup()
+
+
+def allocate_department(department_id, method, num_groups, optimize_ms, send_notifications, dry_run):
+    """
+    Allocate one department and return a picklable outcome dict
+    (``status`` is "ok", "skipped" or "failed"; timings in ms).
+    ``num_groups`` 0 means one group per supervisor.
+    """
+    from frontend.models import Department
+    from .services import AllocationError, execute_allocation
+
+    department = Department.objects.select_related("school").get(pk=department_id)
+    started = time.perf_counter()
+    outcome = {
+        "department": str(department),
+        "status": "ok",
+        "students": 0,
+        "unallocated": 0,
+        "groups": 0,
+        "allocation_result_id": None,
+        "timings": {},
+        "message": "",
+    }
+    try:
+        summary = execute_allocation(
+            department,
+            method,
+            num_groups or department.supervisors.count(),
+            send_notifications=send_notifications,
+            optimize_ms=optimize_ms,
+            dry_run=dry_run,
+        )
+    except AllocationError as exc:
+        outcome.update(status="skipped", message=str(exc))
+    except Exception as exc:
+        outcome.update(status="failed", message=str(exc))
+    else:
+        outcome.update(
+            students=summary["students_allocated"],
+            unallocated=summary["students_unallocated"],
+            groups=summary["num_groups"],
+            allocation_result_id=summary["allocation_result"].pk if summary["allocation_result"] else None,
+            timings={phase: round(seconds * 1000) for phase, seconds in summary["timings"].items()},
+        )
+    outcome["timings"]["total"] = round((time.perf_counter() - started) * 1000)
+    return outcome
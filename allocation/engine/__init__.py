@@ -0,0 +1,44 @@
+"""
+Array-backed allocation engine.
+
+Works on ``StudentPool`` snapshots (typed arrays of student ids and CGPAs)
+instead of ``Student`` model instances, so strategies can be run, compared
+and tested without touching the ORM.
+"""
+from .balance import place_into_groups
+from .compare import compare_strategies
+from .metrics import combine_stats, group_stats, member_stats, plan_metrics
+from .optimize import optimize_plan
+from .plan import AllocationPlan
+from .pool import (
+    CLASSIFICATIONS,
+    PreferenceTable,
+    StudentPool,
+    SupervisorPool,
+    classify_points,
+    snapshot_fingerprint,
+    to_points,
+)
+from .strategies import FIXED_ASSIGNMENT_STRATEGIES, PREFERENCE_STRATEGIES, STRATEGIES, allocate
+
+__all__ = [
+    "AllocationPlan",
+    "CLASSIFICATIONS",
+    "FIXED_ASSIGNMENT_STRATEGIES",
+    "PREFERENCE_STRATEGIES",
+    "PreferenceTable",
+    "STRATEGIES",
+    "StudentPool",
+    "SupervisorPool",
+    "allocate",
+    "classify_points",
+    "combine_stats",
+    "compare_strategies",
+    "group_stats",
+    "member_stats",
+    "optimize_plan",
+    "place_into_groups",
+    "plan_metrics",
+    "snapshot_fingerprint",
+    "to_points",
+]
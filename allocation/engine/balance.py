@@ -0,0 +1,148 @@
+# allocation/engine/balance.py
+import heapq
+import random
+import time
+from array import array
+from bisect import bisect_left, insort
+
+from .plan import AllocationPlan
+
+
+def heap_balanced(pool, num_groups, seed=None, supervisors=None, swap_seconds=0.2):
+    """
+    Balance group mean CGPA.
+
+    1. Greedy largest-first: students in descending CGPA order each go to the
+       group at the top of a min-heap keyed on (size, CGPA sum), so sizes
+       never differ by more than one and, among equally sized groups, the
+       weakest group receives the next strongest student. O(n log g).
+    2. Pairwise-swap improvement: repeatedly take the groups with the highest
+       and lowest mean and make the single swap between them that most
+       reduces the squared deviation of group means from the overall mean.
+       Each candidate's effect is evaluated in O(1) from the running sums.
+       Stops when no improving swap exists or after ``swap_seconds``.
+    """
+    points = pool.points
+    order = pool.order_by_points()
+
+    # Members are kept sorted by points as (points, pool index) pairs so the
+    # swap pass can binary-search for the best partner.
+    members = [[] for _ in range(num_groups)]
+    sums = [0] * num_groups
+    heap = [(0, 0, number) for number in range(num_groups)]
+
+    for index in order:
+        size, total, number = heap[0]
+        value = points[index]
+        members[number].append((value, index))
+        sums[number] = total + value
+        heapq.heapreplace(heap, (size + 1, total + value, number))
+
+    for group in members:
+        group.reverse()  # filled highest-first; the swap pass needs ascending
+
+    if swap_seconds and num_groups > 1 and len(order):
+        _improve_by_swaps(members, sums, len(order), sum(points), time.perf_counter() + swap_seconds)
+
+    ids = pool.ids
+    rng = random.Random(seed)
+    groups = []
+    for group in members:
+        group_ids = array("q", (ids[index] for _, index in group))
+        rng.shuffle(group_ids)  # don't leak the CGPA ranking into member order
+        groups.append(group_ids)
+    return AllocationPlan("heap_balanced", groups)
+
+
+def place_into_groups(pool, sizes, sums, capacities=None):
+    """
+    Add the students of ``pool`` to existing groups without moving anyone
+    already placed.
+
+    ``sizes`` and ``sums`` (CGPA hundredths) describe the current groups;
+    ``capacities`` optionally caps each group's final size (0 = no limit).
+    Students go best-CGPA-first to the group at the top of a min-heap keyed
+    on (size, CGPA sum), as in ``heap_balanced``, so every placement is
+    O(log g). Full groups leave the heap; students left over once every
+    group is full stay unplaced.
+
+    Returns an AllocationPlan whose ``groups[i]`` holds only the new members
+    of existing group ``i``.
+    """
+    num_groups = len(sizes)
+    capacities = capacities or [0] * num_groups
+    heap = [
+        (size, total, number)
+        for number, (size, total, capacity) in enumerate(zip(sizes, sums, capacities))
+        if not capacity or size < capacity
+    ]
+    heapq.heapify(heap)
+
+    ids = pool.ids
+    points = pool.points
+    groups = [array("q") for _ in range(num_groups)]
+    for index in pool.order_by_points():
+        if not heap:
+            break
+        size, total, number = heap[0]
+        groups[number].append(ids[index])
+        capacity = capacities[number]
+        if capacity and size + 1 >= capacity:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, (size + 1, total + points[index], number))
+    return AllocationPlan("incremental", groups)
+
+
+def _improve_by_swaps(members, sums, num_students, total_points, deadline):
+    overall = total_points / num_students
+    sizes = [len(group) for group in members]
+    means = [total / size if size else overall for total, size in zip(sums, sizes)]
+    candidates = [number for number, size in enumerate(sizes) if size]
+    mean_of = means.__getitem__
+
+    while time.perf_counter() < deadline:
+        high = max(candidates, key=mean_of)
+        low = min(candidates, key=mean_of)
+        if means[high] - means[low] <= 0:
+            return
+
+        n_high, n_low = sizes[high], sizes[low]
+        s_high, s_low = sums[high], sums[low]
+        before = (means[high] - overall) ** 2 + (means[low] - overall) ** 2
+        # Moving ``d`` points from high to low equalises their means at d_star.
+        d_star = (s_high * n_low - s_low * n_high) / (n_high + n_low)
+
+        low_values = [value for value, _ in members[low]]
+        best_gain, best = 0.0, None
+        for a_pos, (a_value, _) in enumerate(members[high]):
+            # Partner in ``low`` whose value is closest to a_value - d_star.
+            target = a_value - d_star
+            at = bisect_left(low_values, target)
+            for b_pos in (at - 1, at):
+                if not 0 <= b_pos < n_low:
+                    continue
+                d = a_value - low_values[b_pos]
+                if d <= 0:
+                    continue
+                after = (
+                    ((s_high - d) / n_high - overall) ** 2
+                    + ((s_low + d) / n_low - overall) ** 2
+                )
+                gain = before - after
+                if gain > best_gain:
+                    best_gain, best = gain, (a_pos, b_pos, d)
+
+        if best is None:
+            return
+
+        a_pos, b_pos, d = best
+        a = members[high].pop(a_pos)
+        b = members[low].pop(b_pos)
+        insort(members[high], b)
+        insort(members[low], a)
+        sums[high] -= d
+        sums[low] += d
+        means[high] = sums[high] / n_high
+        means[low] = sums[low] / n_low
+
@@ -0,0 +1,91 @@
+# allocation/engine/compare.py
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from .metrics import plan_metrics
+from .strategies import PREFERENCE_STRATEGIES, SEEDED_STRATEGIES, STRATEGIES, allocate
+
+# Score = mean_spread + class_mix + SIZE_WEIGHT * (size_spread / mean group size).
+# All three terms are "0 is perfect"; lower scores rank first.
+SIZE_WEIGHT = 1.0
+
+# Snapshot shared by the tasks of one worker process (set by _init_worker).
+_snapshot = None
+
+
+def plan_score(metrics, pool_size, num_groups):
+    mean_size = pool_size / num_groups if num_groups else 0
+    size_imbalance = metrics['size_spread'] / mean_size if mean_size else 0.0
+    return round(metrics['mean_spread'] + metrics['class_mix'] + SIZE_WEIGHT * size_imbalance, 4)
+
+
+def comparison_tasks(pool, supervisors=None, methods=None, seeds=3):
+    """
+    ``(method, seed)`` pairs to evaluate: every registered strategy once,
+    seeded strategies once per seed in ``1..seeds``. Strategies that need
+    supervisors or preferences the caller did not supply are left out.
+    """
+    tasks = []
+    for method in methods or STRATEGIES:
+        if method == "capacity" or method in PREFERENCE_STRATEGIES:
+            if supervisors is None:
+                continue
+        if method in PREFERENCE_STRATEGIES and not (pool.preferences and pool.preferences.choices):
+            continue
+        if method in SEEDED_STRATEGIES:
+            tasks.extend((method, seed) for seed in range(1, seeds + 1))
+        else:
+            tasks.append((method, None))
+    return tasks
+
+
+def _init_worker(pool, supervisors, num_groups):
+    global _snapshot
+    _snapshot = (pool, supervisors, num_groups)
+
+
+def _evaluate(task):
+    method, seed = task
+    pool, supervisors, num_groups = _snapshot
+    plan = allocate(method, pool, num_groups, seed=seed, supervisors=supervisors)
+    metrics = plan_metrics(plan, pool)
+    return {
+        'method': method,
+        'seed': seed,
+        'score': plan_score(metrics, len(pool), plan.num_groups),
+        'metrics': metrics,
+        'plan': plan,
+    }
+
+
+def compare_strategies(pool, num_groups, supervisors=None, methods=None, seeds=3, workers=None):
+    """
+    Run every strategy (and several seeds of the randomised ones) on the same
+    snapshot and return the candidates best-first, as dicts with ``method``,
+    ``seed``, ``score``, ``metrics`` and ``plan``.
+
+    With ``workers`` > 1 the candidates are computed in a process pool; the
+    snapshot is shipped once per worker (pool initializer) rather than once
+    per task. ``spawn`` is used so no locks or DB connections of a threaded
+    web process are inherited.
+    """
+    tasks = comparison_tasks(pool, supervisors, methods, seeds)
+    workers = min(workers or multiprocessing.cpu_count(), len(tasks))
+
+    if workers <= 1:
+        _init_worker(pool, supervisors, num_groups)
+        try:
+            candidates = [_evaluate(task) for task in tasks]
+        finally:
+            _init_worker(None, None, None)
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(pool, supervisors, num_groups),
+        ) as executor:
+            candidates = list(executor.map(_evaluate, tasks))
+
+    candidates.sort(key=lambda candidate: candidate['score'])
+    return candidates
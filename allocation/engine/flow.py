@@ -0,0 +1,284 @@
+# allocation/engine/flow.py
+import heapq
+from array import array
+
+from .plan import AllocationPlan
+from .pool import CLASSIFICATIONS
+
+INF = float("inf")
+
+# Cost per student placed beyond a supervisor's proportional share of a
+# classification, and beyond their proportional share of the cohort.
+MIX_OVERFLOW_COST = 1
+LOAD_OVERFLOW_COST = 2
+
+
+class MinCostFlow:
+    """
+    Successive-shortest-path min-cost flow with Johnson potentials.
+
+    Edges live in flat parallel arrays; edge ``e`` and its residual twin are
+    ``e`` and ``e ^ 1``. Each phase runs Dijkstra on reduced costs
+    (non-negative thanks to the potentials) and then saturates every
+    shortest path at once with blocking flows, so the number of Dijkstra
+    runs is bounded by the number of distinct path costs rather than the
+    number of augmenting paths.
+    """
+
+    def __init__(self, num_nodes):
+        self.num_nodes = num_nodes
+        self.adjacency = [[] for _ in range(num_nodes)]
+        self.to = array("l")
+        self.cap = array("q")
+        self.cost = array("q")
+
+    def add_edge(self, source, target, capacity, cost):
+        """Add a directed edge; returns its index (use ``flow_on`` to read it back)."""
+        index = len(self.to)
+        self.adjacency[source].append(index)
+        self.to.append(target)
+        self.cap.append(capacity)
+        self.cost.append(cost)
+        self.adjacency[target].append(index + 1)
+        self.to.append(source)
+        self.cap.append(0)
+        self.cost.append(-cost)
+        return index
+
+    def flow_on(self, edge):
+        return self.cap[edge ^ 1]
+
+    def push(self, edge, amount):
+        """Send ``amount`` units along ``edge`` directly (used to seed a starting flow)."""
+        self.cap[edge] -= amount
+        self.cap[edge ^ 1] += amount
+
+    def solve(self, source, sink, max_flow=None):
+        """Push up to ``max_flow`` (default: as much as possible) at minimum cost. Returns (flow, cost)."""
+        num_nodes = self.num_nodes
+        adjacency, to, cap, cost = self.adjacency, self.to, self.cap, self.cost
+        potential = [0] * num_nodes  # all initial costs are non-negative
+        limit = INF if max_flow is None else max_flow
+        total_flow = total_cost = 0
+
+        while total_flow < limit:
+            distance = [INF] * num_nodes
+            distance[source] = 0
+            heap = [(0, source)]
+            while heap:
+                dist, node = heapq.heappop(heap)
+                if dist > distance[node]:
+                    continue
+                base = dist + potential[node]
+                for edge in adjacency[node]:
+                    if cap[edge] <= 0:
+                        continue
+                    target = to[edge]
+                    candidate = base + cost[edge] - potential[target]
+                    if candidate < distance[target]:
+                        distance[target] = candidate
+                        heapq.heappush(heap, (candidate, target))
+
+            if distance[sink] == INF:
+                break
+            for node in range(num_nodes):
+                if distance[node] < INF:
+                    potential[node] += distance[node]
+
+            # Every shortest path now uses only zero reduced-cost edges:
+            # saturate all of them (Dinic-style blocking flows) before the
+            # next Dijkstra instead of augmenting one path per Dijkstra.
+            while total_flow < limit:
+                level = self._admissible_levels(source, potential)
+                if level[sink] < 0:
+                    break
+                pushed, path_cost = self._blocking_flow(source, sink, potential, level, limit - total_flow)
+                if not pushed:
+                    break
+                total_flow += pushed
+                total_cost += path_cost
+
+        return total_flow, total_cost
+
+    def _admissible_levels(self, source, potential):
+        """BFS levels over residual edges with zero reduced cost (-1 = unreachable)."""
+        adjacency, to, cap, cost = self.adjacency, self.to, self.cap, self.cost
+        level = [-1] * self.num_nodes
+        level[source] = 0
+        frontier = [source]
+        while frontier:
+            following = []
+            for node in frontier:
+                next_level = level[node] + 1
+                offset = potential[node]
+                for edge in adjacency[node]:
+                    target = to[edge]
+                    if level[target] < 0 and cap[edge] > 0 and cost[edge] + offset == potential[target]:
+                        level[target] = next_level
+                        following.append(target)
+            frontier = following
+        return level
+
+    def _blocking_flow(self, source, sink, potential, level, limit):
+        """Augment along level-increasing admissible paths until none is left. Returns (flow, cost)."""
+        adjacency, to, cap, cost = self.adjacency, self.to, self.cap, self.cost
+        position = [0] * self.num_nodes
+        total_flow = total_cost = 0
+        path = []
+        node = source
+
+        while total_flow < limit:
+            if node == sink:
+                push = limit - total_flow
+                for edge in path:
+                    push = min(push, cap[edge])
+                for edge in path:
+                    cap[edge] -= push
+                    cap[edge ^ 1] += push
+                    total_cost += push * cost[edge]
+                total_flow += push
+                path.clear()
+                node = source
+                continue
+
+            edges = adjacency[node]
+            while position[node] < len(edges):
+                edge = edges[position[node]]
+                target = to[edge]
+                if (cap[edge] > 0 and level[target] == level[node] + 1
+                        and cost[edge] + potential[node] == potential[target]):
+                    break
+                position[node] += 1
+            else:
+                # Dead end: retreat and skip the edge that led here.
+                if node == source:
+                    break
+                level[node] = -1
+                edge = path.pop()
+                node = to[edge ^ 1]
+                position[node] += 1
+                continue
+
+            path.append(edge)
+            node = target
+
+        return total_flow, total_cost
+
+
+def capacity_flow(pool, num_groups, seed=None, supervisors=None):
+    """
+    Capacity-aware allocation: one group per supervisor (the first
+    ``num_groups`` of ``supervisors``), never exceeding
+    ``supervisors.capacities``. Supervisors with capacity 0 have no explicit
+    limit and share whatever the others cannot take.
+
+    Students are aggregated by classification and routed
+    source -> classification -> supervisor -> sink. Arcs up to a supervisor's
+    proportional share of each classification (and of the whole cohort)
+    are free, anything beyond costs extra, so the min-cost max-flow fills
+    every supervisor in proportion to their capacity with a classification
+    mix matching the cohort. Students are then dealt to supervisors within
+    each classification in CGPA order. If total capacity is short, the
+    lowest-ranked students of each classification are left unassigned.
+    """
+    if supervisors is None:
+        raise ValueError("capacity allocation needs supervisors")
+
+    supervisor_ids = list(supervisors.ids[:num_groups])
+    count = len(supervisor_ids)
+    num_students = len(pool)
+    capacities = supervisors.resolved_capacities(count, num_students)
+    total_capacity = sum(capacities)
+
+    buckets = pool.buckets()
+    num_classes = len(CLASSIFICATIONS)
+    source, sink = 0, 1
+    class_node = 2
+    supervisor_node = class_node + num_classes
+
+    graph = MinCostFlow(supervisor_node + count)
+    assigned = min(num_students, total_capacity)
+    class_arcs = [[] for _ in range(num_classes)]
+
+    # Proportional targets: each supervisor's share of the cohort, and of
+    # every classification, apportioned so the shares add up exactly.
+    load_shares = _apportion(assigned, capacities)
+    load_arcs = []
+    for position, (capacity, share) in enumerate(zip(capacities, load_shares)):
+        node = supervisor_node + position
+        load_arcs.append(graph.add_edge(node, sink, share, 0))
+        graph.add_edge(node, sink, capacity - share, LOAD_OVERFLOW_COST)
+
+    # Zero-cost source -> class -> supervisor -> sink paths can be filled
+    # greedily up front: every residual arc they create also costs 0, so the
+    # seeded flow is min-cost for its value and the shortest-path phase only
+    # has to route the rounding leftovers.
+    load_left = list(load_shares)
+    for code, bucket in enumerate(buckets):
+        if not bucket:
+            continue
+        source_arc = graph.add_edge(source, class_node + code, len(bucket), 0)
+        remaining = len(bucket)
+        mix_shares = _apportion(len(bucket), load_shares)
+        for position, (capacity, share) in enumerate(zip(capacities, mix_shares)):
+            node = supervisor_node + position
+            quota_arc = graph.add_edge(class_node + code, node, share, 0)
+            class_arcs[code].append((position, quota_arc))
+            class_arcs[code].append((position, graph.add_edge(class_node + code, node, capacity, MIX_OVERFLOW_COST)))
+
+            amount = min(remaining, share, load_left[position])
+            if amount:
+                graph.push(source_arc, amount)
+                graph.push(quota_arc, amount)
+                graph.push(load_arcs[position], amount)
+                load_left[position] -= amount
+                remaining -= amount
+
+    graph.solve(source, sink)
+
+    # Turn per-(classification, supervisor) flows into concrete students.
+    points = pool.points
+    ids = pool.ids
+    members = [array("q") for _ in range(count)]
+    for code, bucket in enumerate(buckets):
+        quota = [0] * count
+        for position, edge in class_arcs[code]:
+            quota[position] += graph.flow_on(edge)
+        bucket = sorted(bucket, key=points.__getitem__, reverse=True)
+        _deal(bucket, quota, members, ids)
+
+    used = [position for position in range(count) if members[position]]
+    return AllocationPlan(
+        "capacity",
+        [members[position] for position in used],
+        [supervisor_ids[position] for position in used],
+    )
+
+
+def _apportion(total, weights):
+    """Split ``total`` in proportion to ``weights`` (largest remainder); the parts sum to ``total``."""
+    weight_sum = sum(weights)
+    if not weight_sum:
+        return [0] * len(weights)
+    exact = [total * weight / weight_sum for weight in weights]
+    parts = [int(value) for value in exact]
+    by_remainder = sorted(range(len(weights)), key=lambda i: parts[i] - exact[i])
+    for i in by_remainder[:total - sum(parts)]:
+        parts[i] += 1
+    return parts
+
+
+def _deal(bucket, quota, members, ids):
+    """
+    Hand out ``bucket`` (best first) so every supervisor gets students spread
+    evenly over the bucket's CGPA range: supervisor ``s`` owns the slots at
+    fractions (k + 0.5) / quota[s], and the i-th best student takes the
+    i-th slot overall.
+    """
+    slots = sorted(
+        ((k + 0.5) / remaining, position)
+        for position, remaining in enumerate(quota)
+        for k in range(remaining)
+    )
+    for index, (_, position) in zip(bucket, slots):
+        members[position].append(ids[index])
@@ -0,0 +1,101 @@
+# allocation/engine/matching.py
+import heapq
+from array import array
+from collections import deque
+
+from .plan import AllocationPlan
+
+
+def stable_matching(pool, num_groups, seed=None, supervisors=None):
+    """
+    Student-proposing deferred acceptance (Gale–Shapley) with supervisor
+    capacities; one group per supervisor (the first ``num_groups`` of
+    ``supervisors``).
+
+    Students propose down ``pool.preferences``; every supervisor ranks
+    students by CGPA (ties by id) and keeps its best ``capacity`` proposers
+    in a heap whose top is the weakest held student. Each proposal is O(log
+    capacity), so the whole match is O(total preference length * log c).
+
+    Students with no preferences, or whose list runs out, are placed
+    afterwards in CGPA order into the supervisor with the most spare
+    capacity (relative to its limit).
+    """
+    if supervisors is None:
+        raise ValueError("stable matching needs supervisors")
+
+    num_students = len(pool)
+    supervisor_ids = list(supervisors.ids[:num_groups])
+    count = len(supervisor_ids)
+    capacities = supervisors.resolved_capacities(count, num_students)
+    position_of = dict(zip(supervisor_ids, range(count)))
+
+    rank = pool.rank_by_points()
+    preferences = pool.preferences
+    if preferences is not None:
+        offsets = preferences.offsets
+        choices = array("l", (position_of.get(supervisor_id, -1) for supervisor_id in preferences.choices))
+    else:
+        offsets = array("l", [0]) * (num_students + 1)
+        choices = array("l")
+
+    # held[s]: heap of (-rank, student index) -> weakest held student on top.
+    held = [[] for _ in range(count)]
+    cursor = array("l", offsets[:num_students]) if num_students else array("l")
+    free = deque(index for index in range(num_students) if offsets[index] < offsets[index + 1])
+    unmatched = []
+
+    while free:
+        student = free.popleft()
+        end = offsets[student + 1]
+        while True:
+            at = cursor[student]
+            if at >= end:
+                unmatched.append(student)
+                break
+            cursor[student] = at + 1
+            target = choices[at]
+            if target < 0 or not capacities[target]:
+                continue
+            queue = held[target]
+            entry = (-rank[student], student)
+            if len(queue) < capacities[target]:
+                heapq.heappush(queue, entry)
+                break
+            if entry > queue[0]:
+                # Better (lower) rank than the weakest held student: bump them.
+                _, bumped = heapq.heapreplace(queue, entry)
+                free.append(bumped)
+                break
+
+    # Fallback for students without (usable) preferences: CGPA order, into
+    # the supervisor with the most spare capacity relative to its limit.
+    matched = set()
+    for queue in held:
+        matched.update(student for _, student in queue)
+    leftovers = [index for index in pool.order_by_points() if index not in matched]
+
+    spare = [
+        (len(queue) / capacity, position)
+        for position, (queue, capacity) in enumerate(zip(held, capacities))
+        if len(queue) < capacity
+    ]
+    heapq.heapify(spare)
+    members = [[student for _, student in queue] for queue in held]
+    for student in leftovers:
+        if not spare:
+            break
+        _, position = spare[0]
+        members[position].append(student)
+        if len(members[position]) < capacities[position]:
+            heapq.heapreplace(spare, (len(members[position]) / capacities[position], position))
+        else:
+            heapq.heappop(spare)
+
+    ids = pool.ids
+    used = [position for position in range(count) if members[position]]
+    return AllocationPlan(
+        "preference",
+        [array("q", sorted(ids[student] for student in members[position])) for position in used],
+        [supervisor_ids[position] for position in used],
+    )
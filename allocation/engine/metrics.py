@@ -0,0 +1,104 @@
+# allocation/engine/metrics.py
+from statistics import pstdev
+
+from .pool import CLASSIFICATIONS, classify_points
+
+
+def index_by_id(pool):
+    """Map student id -> position in the pool."""
+    return dict(zip(pool.ids, range(len(pool.ids))))
+
+
+def group_sums(plan, pool, positions=None):
+    """CGPA sums (in hundredths) per group of ``plan``."""
+    positions = positions or index_by_id(pool)
+    points = pool.points
+    return [sum(points[positions[student_id]] for student_id in members) for members in plan.groups]
+
+
+def member_stats(points):
+    """
+    Summary of one group from its members' CGPAs (in hundredths): ``size``,
+    ``total``, ``min``, ``max`` (None when empty) and ``class_counts``
+    (indexed like CLASSIFICATIONS).
+    """
+    class_counts = [0] * len(CLASSIFICATIONS)
+    for value in points:
+        class_counts[classify_points(value)] += 1
+    return {
+        'size': len(points),
+        'total': sum(points),
+        'min': min(points, default=None),
+        'max': max(points, default=None),
+        'class_counts': class_counts,
+    }
+
+
+def combine_stats(first, second):
+    """``member_stats`` of the union of two disjoint sets of members."""
+    bounds = [value for value in (first['min'], second['min']) if value is not None]
+    tops = [value for value in (first['max'], second['max']) if value is not None]
+    return {
+        'size': first['size'] + second['size'],
+        'total': first['total'] + second['total'],
+        'min': min(bounds, default=None),
+        'max': max(tops, default=None),
+        'class_counts': [a + b for a, b in zip(first['class_counts'], second['class_counts'])],
+    }
+
+
+def group_stats(plan, pool, positions=None):
+    """``member_stats`` for every group of ``plan``."""
+    positions = positions or index_by_id(pool)
+    points = pool.points
+    return [
+        member_stats([points[positions[student_id]] for student_id in members])
+        for members in plan.groups
+    ]
+
+
+def class_mix_deviation(plan, pool, positions=None):
+    """
+    Average, over non-empty groups, of the total variation distance between
+    the group's classification shares and the whole pool's (0 = every group
+    has exactly the pool's class mix, 1 = completely disjoint).
+    """
+    positions = positions or index_by_id(pool)
+    classes = pool.classes
+    num_classes = len(CLASSIFICATIONS)
+    overall = [classes.count(code) / len(classes) for code in range(num_classes)] if classes else []
+
+    deviations = []
+    for members in plan.groups:
+        if not members:
+            continue
+        counts = [0] * num_classes
+        for student_id in members:
+            counts[classes[positions[student_id]]] += 1
+        size = len(members)
+        deviations.append(sum(abs(count / size - share) for count, share in zip(counts, overall)) / 2)
+    return sum(deviations) / len(deviations) if deviations else 0.0
+
+
+def plan_metrics(plan, pool):
+    """
+    Balance figures for a plan, in grade points:
+
+    - ``mean_spread``: highest minus lowest group mean CGPA
+    - ``mean_stddev``: population std-dev of group mean CGPAs
+    - ``size_spread``: largest minus smallest group size
+    - ``class_mix``: see ``class_mix_deviation``
+    """
+    positions = index_by_id(pool)
+    sizes = [len(members) for members in plan.groups]
+    means = [
+        total / size / 100
+        for total, size in zip(group_sums(plan, pool, positions), sizes)
+        if size
+    ]
+    return {
+        'mean_spread': round(max(means) - min(means), 4) if means else 0.0,
+        'mean_stddev': round(pstdev(means), 4) if len(means) > 1 else 0.0,
+        'size_spread': max(sizes) - min(sizes) if sizes else 0,
+        'class_mix': round(class_mix_deviation(plan, pool, positions), 4),
+    }
@@ -0,0 +1,157 @@
+# allocation/engine/optimize.py
+import math
+import random
+import time
+from array import array
+
+from .metrics import index_by_id
+from .plan import AllocationPlan
+from .pool import CLASSIFICATIONS
+
+# Stop once this many candidate swaps in a row fail to improve the best
+# state, or four times the number of possible swaps if that is fewer.
+STALL_ITERATIONS = 20000
+MIN_STALL_ITERATIONS = 1024
+# Iterations between clock reads.
+CLOCK_INTERVAL = 64
+
+
+def optimize_plan(plan, pool, budget_ms=500, seed=None, class_weight=1.0):
+    """
+    Improve ``plan`` by swapping students between groups.
+
+    Minimises the variance of group mean CGPA (in grade points) plus
+    ``class_weight`` times the squared deviation of every group's
+    classification mix from the overall mix. Group sizes never change.
+
+    Runs simulated annealing for at most ``budget_ms`` wall-clock
+    milliseconds and returns a new plan holding the best state seen, which
+    is never worse than ``plan``. Stops early once STALL_ITERATIONS swaps
+    in a row have not improved the best state, or, without a temperature,
+    as soon as no swap lowers the objective. Per-group point sums and class counts are
+    kept up to date so each candidate swap is scored in O(1).
+    """
+    deadline = time.perf_counter() + budget_ms / 1000
+    rng = random.Random(seed)
+
+    positions = index_by_id(pool)
+    points = pool.points
+    classes = pool.classes
+    num_students = len(pool)
+
+    members = [[positions[student_id] for student_id in group] for group in plan.groups]
+    sizes = [len(group) for group in members]
+    movable = [number for number, size in enumerate(sizes) if size]
+    if len(movable) < 2 or not num_students:
+        return plan
+
+    overall_mean = sum(points) / num_students / 100
+    class_share = [classes.count(code) / num_students for code in range(len(CLASSIFICATIONS))]
+
+    sums = [sum(points[index] for index in group) for group in members]
+    counts = [[0] * len(CLASSIFICATIONS) for _ in members]
+    for number, group in enumerate(members):
+        for index in group:
+            counts[number][classes[index]] += 1
+
+    def mean_term(total, size):
+        return (total / size / 100 - overall_mean) ** 2
+
+    def class_term(count, code, size):
+        return class_weight * (count / size - class_share[code]) ** 2
+
+    def swap_delta(i, a, j, b):
+        """Change in objective if pool index ``a`` (group i) and ``b`` (group j) trade places."""
+        d = points[a] - points[b]
+        n_i, n_j = sizes[i], sizes[j]
+        delta = (
+            mean_term(sums[i] - d, n_i) + mean_term(sums[j] + d, n_j)
+            - mean_term(sums[i], n_i) - mean_term(sums[j], n_j)
+        )
+        ca, cb = classes[a], classes[b]
+        if ca != cb:
+            ci, cj = counts[i], counts[j]
+            delta += (
+                class_term(ci[ca] - 1, ca, n_i) + class_term(ci[cb] + 1, cb, n_i)
+                + class_term(cj[ca] + 1, ca, n_j) + class_term(cj[cb] - 1, cb, n_j)
+                - class_term(ci[ca], ca, n_i) - class_term(ci[cb], cb, n_i)
+                - class_term(cj[ca], ca, n_j) - class_term(cj[cb], cb, n_j)
+            )
+        return delta
+
+    def apply_swap(i, pos_i, j, pos_j):
+        a, b = members[i][pos_i], members[j][pos_j]
+        d = points[a] - points[b]
+        sums[i] -= d
+        sums[j] += d
+        ca, cb = classes[a], classes[b]
+        counts[i][ca] -= 1
+        counts[i][cb] += 1
+        counts[j][cb] -= 1
+        counts[j][ca] += 1
+        members[i][pos_i], members[j][pos_j] = b, a
+
+    def random_move():
+        i, j = rng.sample(movable, 2)
+        return i, rng.randrange(sizes[i]), j, rng.randrange(sizes[j])
+
+    # Starting temperature: a tenth of a typical uphill move, so the search
+    # can step out of shallow local minima without undoing earlier gains.
+    samples = [swap_delta(i, members[i][p], j, members[j][q]) for i, p, j, q in
+               (random_move() for _ in range(64))]
+    uphill = [value for value in samples if value > 0]
+    start_temperature = 0.1 * sum(uphill) / len(uphill) if uphill else 0.0
+
+    total_size = sum(sizes)
+    pairs = (total_size ** 2 - sum(size ** 2 for size in sizes)) // 2
+    stall_limit = min(STALL_ITERATIONS, max(MIN_STALL_ITERATIONS, 4 * pairs))
+
+    def has_downhill():
+        return any(
+            swap_delta(i, a, j, b) < -1e-12
+            for i in movable for j in movable if i < j
+            for a in members[i] for b in members[j]
+        )
+
+    current = best = 0.0  # objective relative to the starting plan
+    since_best = []  # swaps applied after the best state, undone at the end
+    stall = 0  # iterations since ``best`` last improved
+    started = time.perf_counter()
+    span = max(deadline - started, 1e-9)
+    temperature = start_temperature
+    iteration = 0
+
+    while True:
+        iteration += 1
+        if iteration % CLOCK_INTERVAL == 0:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            temperature = start_temperature * (1 - (now - started) / span) ** 2
+
+        i, pos_i, j, pos_j = random_move()
+        delta = swap_delta(i, members[i][pos_i], j, members[j][pos_j])
+        if delta < 0 or (temperature > 0 and rng.random() < math.exp(-delta / temperature)):
+            apply_swap(i, pos_i, j, pos_j)
+            current += delta
+            since_best.append((i, pos_i, j, pos_j))
+            if current < best - 1e-12:
+                best = current
+                since_best.clear()
+                stall = 0
+                continue
+
+        stall += 1
+        if stall >= stall_limit:
+            break
+        if not start_temperature and stall % 1024 == 0 and pairs <= STALL_ITERATIONS and not has_downhill():
+            # Plain descent at a local minimum of a small plan: nothing left to accept
+            break
+
+    # Roll back to the best state seen.
+    for i, pos_i, j, pos_j in reversed(since_best):
+        apply_swap(i, pos_i, j, pos_j)
+
+    ids = pool.ids
+    groups = [array("q", (ids[index] for index in group)) for group in members]
+    return AllocationPlan(plan.method, groups, list(plan.supervisor_ids))
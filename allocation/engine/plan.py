@@ -0,0 +1,30 @@
+# allocation/engine/plan.py
+from array import array
+from dataclasses import dataclass, field
+
+
+@dataclass
+class AllocationPlan:
+    """
+    Result of running a strategy: one array of student ids per group.
+
+    ``groups[i]`` holds the members of group number ``i + 1``. Strategies that
+    decide supervisors themselves fill ``supervisor_ids`` (parallel to
+    ``groups``); otherwise it is left empty and the caller assigns them.
+    """
+
+    method: str
+    groups: list
+    supervisor_ids: list = field(default_factory=list)
+
+    @property
+    def num_groups(self):
+        return len(self.groups)
+
+    @property
+    def total_students(self):
+        return sum(len(members) for members in self.groups)
+
+
+def empty_groups(num_groups):
+    return [array("q") for _ in range(num_groups)]
@@ -0,0 +1,222 @@
+# allocation/engine/pool.py
+import hashlib
+import math
+from array import array
+from decimal import Decimal
+
+# Classification codes, indexed the same way as CLASSIFICATIONS.
+FIRST_CLASS = 0
+SECOND_CLASS_UPPER = 1
+SECOND_CLASS_LOWER = 2
+THIRD_CLASS = 3
+PASS = 4
+FAIL = 5
+
+CLASSIFICATIONS = (
+    "First Class",
+    "Second Class Upper",
+    "Second Class Lower",
+    "Third Class",
+    "Pass",
+    "Fail",
+)
+
+# Lower bound (in hundredths of a grade point) of every class except Fail.
+# Mirrors the thresholds used by Student.classification().
+_CLASS_FLOORS = (450, 350, 240, 150, 100)
+
+# Lookup table: hundredths -> classification code, so classifying a student
+# is a single index instead of a chain of float comparisons.
+_CLASS_BY_POINTS = bytes(
+    next((code for code, floor in enumerate(_CLASS_FLOORS) if points >= floor), FAIL)
+    for points in range(501)
+)
+
+
+def to_points(cgpa):
+    """Convert a CGPA (Decimal, float or str) to integer hundredths."""
+    if not isinstance(cgpa, Decimal):
+        cgpa = Decimal(str(cgpa))
+    return int((cgpa * 100).to_integral_value())
+
+
+def classify_points(points):
+    return _CLASS_BY_POINTS[points]
+
+
+class StudentPool:
+    """
+    Compact, ORM-free snapshot of the students to allocate.
+
+    ``ids`` and ``points`` are parallel typed arrays (student id, CGPA in
+    hundredths) and ``classes`` holds the classification code of each
+    student. CGPAs are stored as integers so sums and comparisons are exact
+    and never go through Decimal/float conversion again.
+    """
+
+    __slots__ = ("ids", "points", "classes", "preferences")
+
+    def __init__(self, ids, points, preferences=None):
+        self.ids = array("q", ids)
+        self.points = array("H", points)
+        if len(self.ids) != len(self.points):
+            raise ValueError("ids and points must have the same length")
+        self.classes = bytes(map(_CLASS_BY_POINTS.__getitem__, self.points))
+        # Optional PreferenceTable, parallel to ``ids``.
+        self.preferences = preferences
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Build a pool from ``(student_id, cgpa)`` pairs, typically
+        ``Student.objects.filter(...).values_list('id', 'cgpa')``.
+        """
+        ids = array("q")
+        points = array("H")
+        for student_id, cgpa in rows:
+            ids.append(student_id)
+            points.append(to_points(cgpa))
+        return cls(ids, points)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getstate__(self):
+        return self.ids, self.points, self.classes, self.preferences
+
+    def __setstate__(self, state):
+        self.ids, self.points, self.classes, self.preferences = state
+
+    def rank_by_points(self):
+        """rank[i] = position of student i in CGPA order (0 = best, ties by id)."""
+        rank = array("l", [0]) * len(self.ids)
+        for position, index in enumerate(self.order_by_points()):
+            rank[index] = position
+        return rank
+
+    def order_by_points(self, reverse=True):
+        """Indices sorted by CGPA (highest first by default), ties by id."""
+        # Two C-level key sorts instead of one tuple-building lambda; list.sort
+        # is stable (also with reverse=True), so ties keep ascending id order.
+        order = sorted(range(len(self.ids)), key=self.ids.__getitem__)
+        order.sort(key=self.points.__getitem__, reverse=reverse)
+        return order
+
+    def buckets(self):
+        """Indices grouped by classification code (list of 6 lists)."""
+        buckets = [[] for _ in CLASSIFICATIONS]
+        for index, code in enumerate(self.classes):
+            buckets[code].append(index)
+        return buckets
+
+
+class PreferenceTable:
+    """
+    Students' ranked supervisor choices in CSR form: the choices of pool
+    student ``i`` are ``choices[offsets[i]:offsets[i + 1]]`` (supervisor ids,
+    most preferred first). Students without preferences have an empty slice.
+    """
+
+    __slots__ = ("offsets", "choices")
+
+    def __init__(self, offsets, choices):
+        self.offsets = array("l", offsets)
+        self.choices = array("q", choices)
+
+    @classmethod
+    def from_rows(cls, pool, rows):
+        """
+        Build from ``(student_id, [supervisor_id, ...])`` rows, e.g. a
+        ``values_list('student_id', 'ranking')``. Rows for students outside
+        ``pool`` are ignored; duplicate choices keep their first position.
+        """
+        position_of = dict(zip(pool.ids, range(len(pool.ids))))
+        by_position = {}
+        for student_id, ranking in rows:
+            position = position_of.get(student_id)
+            if position is not None and ranking:
+                by_position[position] = list(dict.fromkeys(ranking))
+
+        offsets = array("l", [0])
+        choices = array("q")
+        for position in range(len(pool.ids)):
+            choices.extend(by_position.get(position, ()))
+            offsets.append(len(choices))
+        return cls(offsets, choices)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getstate__(self):
+        return self.offsets, self.choices
+
+    def __setstate__(self, state):
+        self.offsets, self.choices = state
+
+
+class SupervisorPool:
+    """
+    Supervisor ids in assignment order with their maximum student load
+    (``capacities``; 0 means no explicit limit).
+    """
+
+    __slots__ = ("ids", "capacities")
+
+    def __init__(self, ids, capacities=None):
+        self.ids = array("q", ids)
+        self.capacities = array("l", capacities if capacities is not None else [0] * len(self.ids))
+        if len(self.ids) != len(self.capacities):
+            raise ValueError("ids and capacities must have the same length")
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from ``(supervisor_id, max_students)`` pairs; ``None`` capacity means unlimited."""
+        ids = array("q")
+        capacities = array("l")
+        for supervisor_id, capacity in rows:
+            ids.append(supervisor_id)
+            capacities.append(capacity or 0)
+        return cls(ids, capacities)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def resolved_capacities(self, count, num_students):
+        """
+        Capacities of the first ``count`` supervisors with the 0 ("no limit")
+        entries replaced: unlimited supervisors split whatever the limited
+        ones can't take, but never get less than an equal share.
+        """
+        explicit = list(self.capacities[:count])
+        uncapped = explicit.count(0)
+        default_capacity = max(
+            math.ceil(num_students / len(explicit)) if explicit else 0,
+            math.ceil((num_students - sum(explicit)) / uncapped) if uncapped else 0,
+        )
+        return [capacity or default_capacity for capacity in explicit]
+
+    def __getstate__(self):
+        return self.ids, self.capacities
+
+    def __setstate__(self, state):
+        self.ids, self.capacities = state
+
+
+def snapshot_fingerprint(pool, supervisors=None):
+    """
+    Hex digest identifying an allocation input: student ids and CGPAs,
+    supervisor ids and capacities, and preferences when loaded. Equal
+    fingerprints mean a strategy would see exactly the same data.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(pool.ids.tobytes())
+    digest.update(pool.points.tobytes())
+    if supervisors is not None:
+        digest.update(b"supervisors")
+        digest.update(supervisors.ids.tobytes())
+        digest.update(supervisors.capacities.tobytes())
+    if pool.preferences is not None:
+        digest.update(b"preferences")
+        digest.update(pool.preferences.offsets.tobytes())
+        digest.update(pool.preferences.choices.tobytes())
+    return digest.hexdigest()
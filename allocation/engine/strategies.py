@@ -0,0 +1,93 @@
+# allocation/engine/strategies.py
+import random
+from array import array
+
+from .balance import heap_balanced
+from .flow import capacity_flow
+from .matching import stable_matching
+from .plan import AllocationPlan, empty_groups
+from .pool import FIRST_CLASS
+
+
+def grade_based(pool, num_groups, seed=None, supervisors=None):
+    """
+    Sort by CGPA (highest first), deal up to three First-Class students to
+    each group, then deal everyone else round-robin starting again at group 1.
+    """
+    ids = pool.ids
+    order = pool.order_by_points()
+    ranked = array("q", map(ids.__getitem__, order))
+
+    # Sorting puts all First-Class students in a prefix of ``ranked``.
+    first_class = pool.classes.count(FIRST_CLASS)
+    head = min(3 * num_groups, first_class)
+
+    groups = empty_groups(num_groups)
+    for number, members in enumerate(groups):
+        members.extend(ranked[number:head:num_groups])
+        members.extend(ranked[head + number::num_groups])
+    return AllocationPlan("grade_based", groups)
+
+
+def random_split(pool, num_groups, seed=None, supervisors=None):
+    """Shuffle everyone and deal round-robin."""
+    shuffled = array("q", pool.ids)
+    random.Random(seed).shuffle(shuffled)
+
+    groups = [shuffled[number::num_groups] for number in range(num_groups)]
+    return AllocationPlan("random", groups)
+
+
+def balanced(pool, num_groups, seed=None, supervisors=None):
+    """
+    Bucket students by classification, shuffle each bucket and deal every
+    bucket round-robin so each group gets a share of every class.
+    """
+    rng = random.Random(seed)
+    ids = pool.ids
+
+    groups = empty_groups(num_groups)
+    for bucket in pool.buckets():
+        if not bucket:
+            continue
+        members = array("q", map(ids.__getitem__, bucket))
+        rng.shuffle(members)
+        for number, group in enumerate(groups):
+            group.extend(members[number::num_groups])
+    return AllocationPlan("balanced", groups)
+
+
+STRATEGIES = {
+    "grade_based": grade_based,
+    "random": random_split,
+    "balanced": balanced,
+    "heap_balanced": heap_balanced,
+    "capacity": capacity_flow,
+    "preference": stable_matching,
+}
+
+# Strategies whose plan depends on ``seed`` (worth sampling several seeds).
+SEEDED_STRATEGIES = {"random", "balanced"}
+
+# Strategies that read StudentPool.preferences.
+PREFERENCE_STRATEGIES = {"preference"}
+
+# Strategies whose assignment must not be reshuffled afterwards (swapping
+# students between groups would break the stability of the matching).
+FIXED_ASSIGNMENT_STRATEGIES = {"preference"}
+
+
+def allocate(method, pool, num_groups, seed=None, supervisors=None):
+    """
+    Run the strategy registered under ``method`` and return its plan.
+
+    ``supervisors`` is a SupervisorPool; strategies that pick supervisors
+    themselves (e.g. ``capacity``) require it, the others ignore it.
+    """
+    try:
+        strategy = STRATEGIES[method]
+    except KeyError:
+        raise ValueError(f"Unknown allocation method: {method}") from None
+    if num_groups < 1:
+        raise ValueError("num_groups must be at least 1")
+    return strategy(pool, num_groups, seed=seed, supervisors=supervisors)
@@ -0,0 +1,255 @@
+# allocation/exports.py
+"""
+Streaming CSV exports of saved allocations.
+
+Rows are read as plain tuples, with group, supervisor and student joined in
+SQL, through ``iterator(chunk_size=...)`` (a server-side cursor on
+PostgreSQL). Each CSV line is yielded as soon as it is formatted, so memory
+does not grow with the export and the first bytes go out before the query
+has been read to the end.
+
+The roster archive works the same way: ``zipfile`` writes into a
+non-seekable sink (so it uses data descriptors instead of seeking back),
+and whatever it has written is handed to the response as soon as the
+compressor emits it.
+"""
+import csv
+import io
+import threading
+import zipfile
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+
+from .models import Group
+
+# Rows fetched from the database cursor per round trip.
+EXPORT_CHUNK_SIZE = 2000
+
+ALLOCATION_HEADER = ['Group', 'Supervisor', 'Matric No', 'Student Name']
+HISTORY_HEADER = ['Allocation', 'Created', 'Method'] + ALLOCATION_HEADER
+# One group's members: the supervisor e-mail attachment and the zip entries.
+ROSTER_HEADER = ['Matric No', 'Full Name', 'CGPA', 'Email']
+INDEX_HEADER = ['Group', 'Supervisor', 'Supervisor Email', 'Students', 'Mean CGPA', 'File']
+
+
+class ByteLRU:
+    """Thread-safe LRU of ``bytes`` values, bounded by their total size."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+# Per-process cache of generated run CSVs, keyed by AllocationResult.version.
+# Runs only change through allocation.persistence, which bumps the version.
+csv_cache = ByteLRU(getattr(settings, 'ALLOCATION_EXPORT_CACHE_BYTES', 32 * 1024 * 1024))
+
+
+class Echo:
+    """File-like object whose ``write`` hands the formatted line back."""
+
+    def write(self, value):
+        return value
+
+
+def roster_row(matric_no, full_name, cgpa, email):
+    return [matric_no, full_name or '', str(cgpa), email or '']
+
+
+def roster_filename(number):
+    return f'group_{number}_students.csv'
+
+
+def memberships(department):
+    return Group.students.through.objects.filter(group__department=department)
+
+
+def allocation_rows(allocation, department):
+    """
+    (group, supervisor, matric no, name) for every member of one run, by
+    group and highest CGPA first within a group.
+    """
+    rows = (
+        memberships(department)
+        .filter(group__allocation_result=allocation)
+        .order_by('group__number', 'group_id', '-student__cgpa', 'student__matric_no')
+        .values_list('group__number', 'group__supervisor__name', 'student__matric_no', 'student__full_name')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    for number, supervisor, matric_no, full_name in rows:
+        yield [f'Group {number}', supervisor or '', matric_no, full_name or '']
+
+
+def history_rows(department):
+    """Every membership of every run of ``department``, newest run first."""
+    rows = (
+        memberships(department)
+        .filter(group__allocation_result__isnull=False)
+        .order_by('-group__allocation_result__created_at', '-group__allocation_result_id',
+                  'group__number', 'student__matric_no')
+        .values_list(
+            'group__allocation_result_id', 'group__allocation_result__created_at', 'group__allocation_result__method',
+            'group__number', 'group__supervisor__name', 'student__matric_no', 'student__full_name',
+        )
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    for allocation_id, created_at, method, number, supervisor, matric_no, full_name in rows:
+        yield [
+            allocation_id, created_at.strftime('%Y-%m-%d %H:%M'), method,
+            f'Group {number}', supervisor or '', matric_no, full_name or '',
+        ]
+
+
+def csv_response(filename, header, rows, cache_key=None):
+    """
+    A StreamingHttpResponse that writes ``header`` and then ``rows`` as CSV.
+
+    With ``cache_key`` the bytes are kept in ``csv_cache`` once fully sent
+    (if they fit), and later calls with the same key answer from memory
+    without touching ``rows``.
+    """
+    if cache_key is not None:
+        data = csv_cache.get(cache_key)
+        if data is not None:
+            response = HttpResponse(data, content_type='text/csv')
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            return response
+
+    writer = csv.writer(Echo())
+
+    def lines():
+        # Keep a copy for the cache only while it can still fit.
+        kept = [] if cache_key is not None else None
+        size = 0
+        for row in _with_header(header, rows):
+            line = writer.writerow(row).encode()
+            if kept is not None:
+                kept.append(line)
+                size += len(line)
+                if size > csv_cache.max_bytes:
+                    kept = None
+            yield line
+        if kept is not None:
+            csv_cache.set(cache_key, b''.join(kept))
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _with_header(header, rows):
+    yield header
+    yield from rows
+
+
+class ZipSink(io.RawIOBase):
+    """Write-only, non-seekable buffer that ``drain`` empties."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def roster_archive(allocation, department):
+    """
+    Yield a zip archive in pieces: ``index.csv`` listing the groups, then one
+    roster CSV per group (ROSTER_HEADER columns). Two queries: the groups,
+    and one streamed pass over all members in the same group order (numbers
+    may repeat, so ties are broken by id and a repeated number's rosters
+    are named after the group id as well).
+    """
+    groups = list(
+        Group.objects.filter(allocation_result=allocation, department=department)
+        .order_by('number', 'id')
+        .values_list('id', 'number', 'supervisor__name', 'supervisor__email', 'student_count', 'average_cgpa')
+    )
+    rows = (
+        memberships(department)
+        .filter(group__allocation_result=allocation)
+        .order_by('group__number', 'group_id', 'student__matric_no')
+        .values_list('group_id', 'student__matric_no', 'student__full_name', 'student__cgpa', 'student__email')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+    repeated = {number for number, count in Counter(group[1] for group in groups).items() if count > 1}
+    filenames = {
+        group_id: f'group_{number}_{group_id}_students.csv' if number in repeated else roster_filename(number)
+        for group_id, number, *_ in groups
+    }
+
+    sink = ZipSink()
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open('index.csv', mode='w') as entry:
+            text = io.TextIOWrapper(entry, encoding='utf-8', newline='')
+            writer = csv.writer(text)
+            writer.writerow(INDEX_HEADER)
+            for group_id, number, supervisor, email, size, average in groups:
+                writer.writerow([
+                    f'Group {number}', supervisor or '', email or '', size,
+                    average if average is not None else '', filenames[group_id],
+                ])
+            text.flush()
+            text.detach()
+        yield sink.drain()
+
+        row = next(rows, None)
+        for group_id, *_ in groups:
+            with archive.open(filenames[group_id], mode='w') as entry:
+                text = io.TextIOWrapper(entry, encoding='utf-8', newline='')
+                writer = csv.writer(text)
+                writer.writerow(ROSTER_HEADER)
+                while row is not None and row[0] == group_id:
+                    writer.writerow(roster_row(*row[1:]))
+                    if sink.chunks:
+                        yield sink.drain()
+                    row = next(rows, None)
+                text.flush()
+                text.detach()
+            yield sink.drain()
+    yield sink.drain()
+
+
+def zip_response(filename, chunks):
+    response = StreamingHttpResponse(chunks, content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -8,6 +8,9 @@ class AllocationForm(forms.Form):
         ('grade_based', 'Grade-Based Allocation'),
         ('random', 'Random Allocation'),
         ('balanced', 'Balanced Allocation'),
+        ('heap_balanced', 'CGPA-Balanced Allocation'),
+        ('capacity', 'Capacity-Aware Allocation'),
+        ('preference', 'Preference-Based Allocation'),
     ]
 
     num_groups = forms.IntegerField(
@@ -20,6 +23,39 @@ class AllocationForm(forms.Form):
     )
     preserve_existing = forms.BooleanField(required=False, initial=False)
     send_notifications = forms.BooleanField(required=False, initial=True)
+    optimize = forms.BooleanField(required=False, initial=False)
+    optimize_budget_ms = forms.IntegerField(
+        required=False,
+        min_value=50,
+        max_value=5000,
+        initial=500,
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('optimize') and not cleaned_data.get('optimize_budget_ms'):
+            cleaned_data['optimize_budget_ms'] = self.fields['optimize_budget_ms'].initial
+        return cleaned_data
+
+
+class CompareForm(forms.Form):
+    num_groups = forms.IntegerField(
+        min_value=1,
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+
+
+class CommitPlanForm(forms.Form):
+    token = forms.CharField(max_length=32)
+    index = forms.IntegerField(min_value=0)
+
+
+class CommitPreviewForm(forms.Form):
+    allocation_method = forms.ChoiceField(choices=AllocationForm.ALLOCATION_METHODS)
+    num_groups = forms.IntegerField(min_value=1)
+    optimize_ms = forms.IntegerField(min_value=0)
+    fingerprint = forms.CharField(max_length=32)
 
 #
 # class GroupForm(forms.ModelForm):
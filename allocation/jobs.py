@@ -0,0 +1,200 @@
+# allocation/jobs.py
+"""
+Out-of-band execution of AllocationJob rows.
+
+Jobs are either picked up by the in-process thread pool (when
+``ALLOCATION_JOB_WORKERS`` > 0) or by the ``run_allocation_jobs``
+management command. Both go through ``run_job``, which claims the row
+atomically so a job is never executed twice, and only while no other job
+of the same department is running. Jobs left running or queued by a
+worker that died are failed after ``ALLOCATION_JOB_TIMEOUT_SECONDS``.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from frontend.models import Department
+
+from . import outbox
+from .models import AllocationJob
+from .services import AllocationError, execute_allocation, summary_message
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=job_workers(),
+            thread_name_prefix='allocation-job',
+        )
+    return _executor
+
+
+def job_workers():
+    return getattr(settings, 'ALLOCATION_JOB_WORKERS', 2)
+
+
+def submit(job):
+    """
+    Hand ``job`` to the local thread pool once the surrounding transaction
+    commits. With ``ALLOCATION_JOB_WORKERS = 0`` the job stays queued for
+    ``manage.py run_allocation_jobs``.
+    """
+    if job_workers() <= 0:
+        return
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_thread, job.pk))
+
+
+def _run_in_thread(job_id):
+    try:
+        job = run_job(job_id)
+        if job is not None:
+            # Jobs of the department that were refused while this one ran
+            waiting = (
+                AllocationJob.objects.filter(department_id=job.department_id, status=AllocationJob.STATUS_QUEUED)
+                .order_by('created_at').values_list('pk', flat=True).first()
+            )
+            if waiting is not None:
+                _get_executor().submit(_run_in_thread, waiting)
+    finally:
+        # Worker threads get their own connections; don't leak them.
+        connections.close_all()
+
+
+def job_timeout():
+    return getattr(settings, 'ALLOCATION_JOB_TIMEOUT_SECONDS', 1800)
+
+
+def fail_stale_jobs(department_id=None):
+    """
+    Fail jobs whose worker crashed or was restarted, which the status page
+    would otherwise poll forever: running jobs started more than
+    ALLOCATION_JOB_TIMEOUT_SECONDS ago, and queued jobs created that long
+    ago that no running job holds up (the worker died before claiming
+    them). Returns the number of jobs failed.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=job_timeout())
+    failed = {
+        'status': AllocationJob.STATUS_FAILED,
+        'phase': 'failed',
+        'message': 'The allocation job stopped responding. Please run the allocation again.',
+        'finished_at': now,
+    }
+    jobs = AllocationJob.objects.all()
+    if department_id is not None:
+        jobs = jobs.filter(department_id=department_id)
+    count = jobs.filter(status=AllocationJob.STATUS_RUNNING, started_at__lt=cutoff).update(**failed)
+    running = AllocationJob.objects.filter(
+        department_id=OuterRef('department_id'), status=AllocationJob.STATUS_RUNNING
+    )
+    return count + jobs.filter(
+        ~Exists(running), status=AllocationJob.STATUS_QUEUED, created_at__lt=cutoff
+    ).update(**failed)
+
+
+def claim(job_id):
+    """
+    Atomically flip a queued job to running. Returns False if someone else
+    got it or another job of its department is running (it then stays
+    queued).
+    """
+    department_id = AllocationJob.objects.filter(pk=job_id).values_list('department_id', flat=True).first()
+    if department_id is None:
+        return False
+    fail_stale_jobs(department_id)
+    with transaction.atomic():
+        # Serialises claims per department, so two cannot both see none running
+        list(Department.objects.select_for_update().filter(pk=department_id).values_list('pk', flat=True))
+        running = AllocationJob.objects.filter(
+            department_id=OuterRef('department_id'), status=AllocationJob.STATUS_RUNNING
+        )
+        return AllocationJob.objects.filter(pk=job_id, status=AllocationJob.STATUS_QUEUED).filter(
+            ~Exists(running)
+        ).update(status=AllocationJob.STATUS_RUNNING, started_at=timezone.now()) == 1
+
+
+def run_job(job_id):
+    """Execute a queued job, recording phase, progress and timings on the row."""
+    close_old_connections()
+    if not claim(job_id):
+        return None
+
+    job = AllocationJob.objects.select_related('department').get(pk=job_id)
+    last_reported = {'phase': None, 'percent': -1}
+
+    def progress(phase, percent):
+        # One UPDATE per phase change, and at most one per 5% within a phase.
+        if phase == last_reported['phase'] and percent - last_reported['percent'] < 5:
+            return
+        last_reported.update(phase=phase, percent=percent)
+        AllocationJob.objects.filter(pk=job_id).update(phase=phase, progress=percent)
+
+    started = time.perf_counter()
+    try:
+        summary = execute_allocation(
+            job.department,
+            job.method,
+            job.num_groups,
+            send_notifications=job.send_notifications,
+            optimize_ms=job.optimize_ms,
+            progress=progress,
+        )
+    except AllocationError as exc:
+        _finish(job, AllocationJob.STATUS_FAILED, str(exc), max(last_reported['percent'], 0),
+                {'total': time.perf_counter() - started})
+        return job
+    except Exception as exc:
+        logger.exception("Allocation job %s failed", job_id)
+        _finish(job, AllocationJob.STATUS_FAILED, f"Allocation failed: {exc}", max(last_reported['percent'], 0),
+                {'total': time.perf_counter() - started})
+        return job
+
+    timings = dict(summary['timings'], total=time.perf_counter() - started)
+    _finish(job, AllocationJob.STATUS_SUCCEEDED, summary_message(summary), 100, timings,
+            allocation_result=summary['allocation_result'])
+    if summary['emails_queued']:
+        outbox.submit()
+    return job
+
+
+def _finish(job, status, message, percent, timings, allocation_result=None):
+    job.status = status
+    job.phase = 'done' if status == AllocationJob.STATUS_SUCCEEDED else 'failed'
+    job.progress = percent
+    job.message = message
+    job.timings = {phase: round(seconds * 1000, 1) for phase, seconds in timings.items()}
+    job.allocation_result = allocation_result
+    job.finished_at = timezone.now()
+    job.save(update_fields=[
+        'status', 'phase', 'progress', 'message', 'timings', 'allocation_result', 'finished_at',
+    ])
+
+
+def job_status(job):
+    """JSON-serialisable status snapshot for the polling endpoint."""
+    end = job.finished_at or timezone.now()
+    return {
+        'id': job.pk,
+        'status': job.status,
+        'phase': job.phase,
+        'percent': job.progress,
+        'finished': job.is_finished,
+        'message': job.message,
+        'timings_ms': job.timings,
+        'elapsed_ms': round((end - job.started_at).total_seconds() * 1000, 1) if job.started_at else None,
+        'queued_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'allocation_result_id': job.allocation_result_id,
+    }
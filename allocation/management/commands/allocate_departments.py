@@ -0,0 +1,158 @@
+# allocation/management/commands/allocate_departments.py
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+
+from allocation import outbox
+from allocation.batch import allocate_department, init_worker
+from allocation.engine import STRATEGIES
+from frontend.models import Department
+
+
+class Command(BaseCommand):
+    help = "Run allocation for all (or selected) departments, spreading departments over a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--department",
+            action="append",
+            default=[],
+            help="Department code to include (repeatable). Defaults to every department."
+        )
+        parser.add_argument(
+            "--school",
+            action="append",
+            default=[],
+            help="Only departments of the school with this code (repeatable)."
+        )
+        parser.add_argument(
+            "--method",
+            choices=sorted(STRATEGIES),
+            default="balanced",
+            help="Allocation strategy to use for every department."
+        )
+        parser.add_argument(
+            "--groups",
+            type=int,
+            default=0,
+            help="Groups per department. Defaults to one group per supervisor of the department."
+        )
+        parser.add_argument(
+            "--optimize-ms",
+            type=int,
+            default=0,
+            help="Local-search budget per department in milliseconds (0 disables it)."
+        )
+        parser.add_argument(
+            "--notify",
+            action="store_true",
+            help="Queue e-mails to the supervisors and students of every new group and send them at the end."
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=multiprocessing.cpu_count(),
+            help="Worker processes (each with its own DB connection). 1 runs everything in this process."
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Compute and report the plans without saving anything or sending email."
+        )
+
+    def handle(self, *args, **options):
+        departments = Department.objects.all()
+        if options["department"]:
+            departments = departments.filter(code__in=options["department"])
+        if options["school"]:
+            departments = departments.filter(school__code__in=options["school"])
+        department_ids = list(
+            departments.annotate(num_students=Count("students"))
+            .order_by("-num_students", "pk")  # biggest first so stragglers are small
+            .values_list("pk", flat=True)
+        )
+        if not department_ids:
+            raise CommandError("No departments match the given filters.")
+        if options["groups"] < 0 or options["optimize_ms"] < 0:
+            raise CommandError("--groups and --optimize-ms must not be negative.")
+
+        arguments = (
+            options["method"],
+            options["groups"],
+            options["optimize_ms"],
+            options["notify"],
+            options["dry_run"],
+        )
+        workers = max(1, min(options["workers"], len(department_ids)))
+
+        started = time.perf_counter()
+        if workers == 1:
+            outcomes = (allocate_department(department_id, *arguments) for department_id in department_ids)
+            self._report_all(outcomes, options["dry_run"], started)
+            self._send_notifications(options)
+            return
+
+        # Workers must not share this process's connections.
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+        ) as executor:
+            futures = [
+                executor.submit(allocate_department, department_id, *arguments)
+                for department_id in department_ids
+            ]
+            self._report_all((future.result() for future in futures), options["dry_run"], started)
+        self._send_notifications(options)
+
+    def _send_notifications(self, options):
+        # Every department queued its e-mails; send them from this process.
+        if not options["notify"] or options["dry_run"]:
+            return
+        counts = outbox.drain()
+        self.stdout.write(
+            f"E-mails: {counts['sent']} sent, {counts['retrying']} to retry "
+            f"(manage.py send_outbox), {counts['failed']} failed."
+        )
+
+    def _report_all(self, outcomes, dry_run, started):
+        counts = {"ok": 0, "skipped": 0, "failed": 0}
+        students = 0
+        busy_ms = 0
+        for outcome in outcomes:
+            self._report(outcome)
+            counts[outcome["status"]] += 1
+            students += outcome["students"]
+            busy_ms += outcome["timings"]["total"]
+
+        wall_ms = round((time.perf_counter() - started) * 1000)
+        verb = "would allocate" if dry_run else "allocated"
+        self.stdout.write(
+            f"{counts['ok']} departments {verb} ({students} students), "
+            f"{counts['skipped']} skipped, {counts['failed']} failed; "
+            f"{wall_ms} ms wall clock, {busy_ms} ms summed over departments."
+        )
+        if counts["failed"]:
+            self.stdout.write(self.style.ERROR("Done with failures."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Dry run, nothing saved." if dry_run else "Done."))
+
+    def _report(self, outcome):
+        timings = ", ".join(f"{phase} {ms} ms" for phase, ms in outcome["timings"].items())
+        if outcome["status"] == "ok":
+            line = f"{outcome['department']}: {outcome['students']} students in {outcome['groups']} groups"
+            if outcome["unallocated"]:
+                line += f", {outcome['unallocated']} unplaced"
+            line += f" ({timings})"
+            if outcome["allocation_result_id"]:
+                line += f" -> allocation {outcome['allocation_result_id']}"
+            self.stdout.write(self.style.SUCCESS(line))
+        elif outcome["status"] == "skipped":
+            self.stdout.write(self.style.WARNING(f"{outcome['department']}: skipped, {outcome['message']}"))
+        else:
+            self.stdout.write(self.style.ERROR(f"{outcome['department']}: failed, {outcome['message']}"))
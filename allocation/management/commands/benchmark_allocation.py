@@ -0,0 +1,248 @@
+# allocation/management/commands/benchmark_allocation.py
+import json
+import platform
+import random
+import time
+import tracemalloc
+from decimal import Decimal
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from allocation import jobs
+from allocation.engine import STRATEGIES, allocate
+from allocation.models import AllocationJob, AllocationResult
+from allocation.services import load_preferences, load_student_pool, load_supervisor_pool
+from frontend.models import Department, School, User
+from students.models import Student, SupervisorPreference
+from supervisors.models import Supervisor
+
+# One supervisor (and group) per this many students.
+STUDENTS_PER_SUPERVISOR = 25
+# Share of students that upload ranked supervisor choices, and list length.
+PREFERENCE_SHARE = 0.8
+PREFERENCE_LENGTH = 3
+BATCH_SIZE = 5000
+
+
+class QueryCounter:
+    """
+    ``connection.execute_wrapper`` that counts statements. Unlike
+    CaptureQueriesContext it survives the ``reset_queries`` Django runs at
+    the start of every request.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every allocation strategy on synthetic data in a throwaway SQLite "
+        "database: engine-only and end-to-end through the run view, recording wall "
+        "time, peak memory and SQL query count to a JSON file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="1000,10000,100000",
+            help="Comma-separated student counts (default: 1000,10000,100000)."
+        )
+        parser.add_argument(
+            "--strategies",
+            default=",".join(STRATEGIES),
+            help="Comma-separated strategies to run (default: all registered)."
+        )
+        parser.add_argument(
+            "--skip-view",
+            action="store_true",
+            help="Only time the engine, not the end-to-end view + job path."
+        )
+        parser.add_argument(
+            "--no-memory",
+            action="store_true",
+            help="Skip the tracemalloc pass (peak memory is then reported as null)."
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=1,
+            help="Random seed for the synthetic data."
+        )
+        parser.add_argument(
+            "--output",
+            help="JSON results file (default: allocation-benchmark-<timestamp>.json)."
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError(
+                "The benchmark runs against SQLite so results are comparable; "
+                "unset DATABASE_URL and set SPAS_ALLOW_SQLITE=1 (or point DATABASE_URL at a sqlite:// URL)."
+            )
+        try:
+            sizes = [int(size) for size in options["sizes"].split(",")]
+        except ValueError:
+            raise CommandError("--sizes must be a comma-separated list of integers.") from None
+        strategies = [name.strip() for name in options["strategies"].split(",") if name.strip()]
+        unknown = set(strategies) - set(STRATEGIES)
+        if unknown:
+            raise CommandError(f"Unknown strategies: {', '.join(sorted(unknown))}")
+
+        self.measure_memory = not options["no_memory"]
+        output = options["output"] or f"allocation-benchmark-{timezone.now():%Y%m%d-%H%M%S}.json"
+
+        # Fresh database (in-memory for SQLite), so nothing real is touched.
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        results = []
+        try:
+            rng = random.Random(options["seed"])
+            for size in sizes:
+                department, user = self._seed(size, rng)
+                num_groups = department.supervisors.count()
+                for strategy in strategies:
+                    results.append(self._bench_engine(department, strategy, size, num_groups))
+                    if not options["skip_view"]:
+                        results.append(self._bench_view(department, user, strategy, size, num_groups))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        with open(output, "w") as handle:
+            json.dump({
+                "created_at": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "platform": platform.platform(),
+                "database": connection.vendor,
+                "students_per_supervisor": STUDENTS_PER_SUPERVISOR,
+                "results": results,
+            }, handle, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} results to {output}"))
+
+    def _seed(self, size, rng):
+        started = time.perf_counter()
+        school = School.objects.create(name=f"Benchmark School {size}", code=f"B{size}"[:10])
+        department = Department.objects.create(school=school, name=f"Benchmark {size}", code=f"B{size}"[:10])
+        user = User.objects.create_user(
+            email=f"bench{size}@example.com", password=None, department=department, is_department_admin=True
+        )
+
+        num_supervisors = max(1, size // STUDENTS_PER_SUPERVISOR)
+        supervisors = Supervisor.objects.bulk_create([
+            Supervisor(
+                name=f"Supervisor {number}",
+                email=f"supervisor{number}.{size}@example.com",
+                department=department,
+                # A fifth of the supervisors have a (generous) load limit.
+                max_students=STUDENTS_PER_SUPERVISOR * 2 if number % 5 == 0 else None,
+            )
+            for number in range(num_supervisors)
+        ], batch_size=BATCH_SIZE)
+
+        students = Student.objects.bulk_create([
+            Student(
+                matric_no=f"B{size}-{number:06d}",
+                full_name=f"Student {number}",
+                email=f"student{number}.{size}@example.com",
+                cgpa=Decimal(rng.randint(100, 500)) / 100,
+                department=department,
+            )
+            for number in range(size)
+        ], batch_size=BATCH_SIZE)
+
+        supervisor_ids = [supervisor.pk for supervisor in supervisors]
+        SupervisorPreference.objects.bulk_create([
+            SupervisorPreference(
+                student_id=student.pk,
+                ranking=rng.sample(supervisor_ids, min(PREFERENCE_LENGTH, len(supervisor_ids))),
+            )
+            for student in students
+            if rng.random() < PREFERENCE_SHARE
+        ], batch_size=BATCH_SIZE)
+
+        self.stdout.write(
+            f"Seeded {size} students / {num_supervisors} supervisors in {time.perf_counter() - started:.1f}s"
+        )
+        return department, user
+
+    def _measure(self, run, reset=None):
+        """Run ``run`` for wall time and queries, then again under tracemalloc for peak memory."""
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            started = time.perf_counter()
+            run()
+            wall = time.perf_counter() - started
+        if reset is not None:
+            reset()
+
+        peak = None
+        if self.measure_memory:
+            tracemalloc.start()
+            try:
+                run()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            if reset is not None:
+                reset()
+        return {
+            "wall_ms": round(wall * 1000, 2),
+            "peak_kib": round(peak / 1024, 1) if peak is not None else None,
+            "queries": queries.count,
+        }
+
+    def _record(self, size, strategy, mode, measurement):
+        result = {"size": size, "strategy": strategy, "mode": mode, **measurement}
+        peak = measurement["peak_kib"]
+        self.stdout.write(
+            f"{size:>7} {strategy:<14} {mode:<6} {measurement['wall_ms']:>10.1f} ms "
+            f"{'-' if peak is None else f'{peak / 1024:.1f}':>8} MiB {measurement['queries']:>6} queries"
+        )
+        return result
+
+    def _bench_engine(self, department, strategy, size, num_groups):
+        pool = load_student_pool(department)
+        supervisors = load_supervisor_pool(department)
+        load_preferences(department, pool)
+        measurement = self._measure(
+            lambda: allocate(strategy, pool, num_groups, seed=1, supervisors=supervisors)
+        )
+        return self._record(size, strategy, "engine", measurement)
+
+    def _bench_view(self, department, user, strategy, size, num_groups):
+        client = Client()
+        client.force_login(user)
+        url = reverse("allocation:run")
+
+        def run():
+            # The view only queues the job; run it inline so the timing covers
+            # request, load, allocate and save.
+            response = client.post(
+                url, {"num_groups": num_groups, "allocation_method": strategy}, secure=True
+            )
+            if response.status_code != 302:
+                raise CommandError(f"{strategy}: run view returned {response.status_code}")
+            job = AllocationJob.objects.filter(department=department).latest("created_at")
+            job = jobs.run_job(job.pk)
+            if job is None or job.status != AllocationJob.STATUS_SUCCEEDED:
+                raise CommandError(f"{strategy}: job did not succeed ({job and job.message})")
+
+        def reset():
+            # Free the students again for the next run.
+            AllocationJob.objects.filter(department=department).delete()
+            AllocationResult.objects.filter(department=department).delete()
+
+        with override_settings(ALLOCATION_JOB_WORKERS=0):
+            measurement = self._measure(run, reset)
+        return self._record(size, strategy, "view", measurement)
@@ -0,0 +1,73 @@
+# allocation/management/commands/run_allocation_jobs.py
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from allocation.jobs import fail_stale_jobs, run_job
+from allocation.models import AllocationJob
+
+
+class Command(BaseCommand):
+    help = "Execute queued allocation jobs (use with ALLOCATION_JOB_WORKERS = 0 or to drain a backlog)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of jobs to run concurrently (each worker thread uses its own DB connection)."
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling for new jobs instead of exiting once the queue is empty."
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2.0,
+            help="Seconds to sleep between polls when --loop is given."
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options["workers"])
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="allocation-job") as executor:
+            while True:
+                failed = fail_stale_jobs()
+                if failed:
+                    self.stdout.write(self.style.WARNING(f"Marked {failed} stale running job(s) as failed."))
+                job_ids = list(
+                    AllocationJob.objects.filter(status=AllocationJob.STATUS_QUEUED)
+                    .order_by("created_at")
+                    .values_list("id", flat=True)[:workers * 4]
+                )
+                ran = False
+                for job in executor.map(self._run, job_ids):
+                    if job is not None:
+                        ran = True
+                        self._report(job)
+                if ran:
+                    continue
+                # Nothing queued, or only jobs waiting for their department's running job
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS("Done."))
+
+    def _run(self, job_id):
+        try:
+            return run_job(job_id)
+        finally:
+            connections.close_all()
+
+    def _report(self, job):
+        total = job.timings.get("total")
+        line = f"Job {job.pk} [{job.department}] {job.status} in {total} ms: {job.message}"
+        if job.status == AllocationJob.STATUS_SUCCEEDED:
+            self.stdout.write(self.style.SUCCESS(line))
+        else:
+            self.stdout.write(self.style.ERROR(line))
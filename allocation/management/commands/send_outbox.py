@@ -0,0 +1,57 @@
+# allocation/management/commands/send_outbox.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from allocation import outbox
+from allocation.models import EmailOutbox
+
+
+class Command(BaseCommand):
+    help = "Send queued e-mail notifications (use with EMAIL_OUTBOX_WORKERS = 0 or to drain a backlog)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="Concurrent senders, each with its own mail connection (default: EMAIL_OUTBOX_WORKERS, at least 1)."
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="Rows each sender claims at a time (default: EMAIL_OUTBOX_BATCH_SIZE)."
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            help="Maximum messages per second over all senders; 0 for no limit (default: EMAIL_OUTBOX_RATE)."
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling for due e-mails instead of exiting once nothing is due."
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5.0,
+            help="Seconds to sleep between polls when --loop is given."
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            counts = outbox.drain(
+                workers=options["workers"] or max(1, outbox.outbox_setting("WORKERS", 2)),
+                batch_size=options["batch_size"],
+                rate=options["rate"],
+            )
+            if any(counts.values()):
+                self.stdout.write(
+                    f"{counts['sent']} sent, {counts['retrying']} to retry, {counts['failed']} failed."
+                )
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        pending = EmailOutbox.objects.filter(status=EmailOutbox.STATUS_PENDING).count()
+        self.stdout.write(self.style.SUCCESS(f"Done. {pending} e-mails waiting for a retry."))
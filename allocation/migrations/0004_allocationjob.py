@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('allocation', '0003_remove_group_students_alter_group_supervisor_and_more'),
+        ('frontend', '0003_alter_user_managers'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AllocationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('method', models.CharField(max_length=50)),
+                ('num_groups', models.PositiveIntegerField()),
+                ('send_notifications', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('phase', models.CharField(default='queued', max_length=20)),
+                ('progress', models.PositiveSmallIntegerField(default=0)),
+                ('timings', models.JSONField(blank=True, default=dict)),
+                ('message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('allocation_result', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to='allocation.allocationresult')),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocation_jobs', to='frontend.department')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='allocation_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='allocation__status_9653fc_idx')],
+            },
+        ),
+    ]
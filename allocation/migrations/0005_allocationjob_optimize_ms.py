@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('allocation', '0004_allocationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='allocationjob',
+            name='optimize_ms',
+            field=models.PositiveIntegerField(default=0, help_text='Wall-clock budget for the local-search optimizer; 0 disables it.'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('allocation', '0005_allocationjob_optimize_ms'),
+        ('supervisors', '0005_supervisor_max_students'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='group',
+            name='supervisor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='groups', to='supervisors.supervisor'),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:02
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+
+# Frozen copy of the classification thresholds at the time of this
+# migration (lower bound in hundredths of a grade point; First Class to
+# Pass, anything lower is Fail).
+CLASS_FLOORS = (450, 350, 240, 150, 100)
+
+
+def classify(points):
+    for code, floor in enumerate(CLASS_FLOORS):
+        if points >= floor:
+            return code
+    return len(CLASS_FLOORS)
+
+
+def backfill_group_stats(apps, schema_editor):
+    Group = apps.get_model('allocation', 'Group')
+    points = defaultdict(list)
+    for group_id, cgpa in Group.students.through.objects.values_list('group_id', 'student__cgpa').iterator():
+        points[group_id].append(int((Decimal(str(cgpa)) * 100).to_integral_value()))
+
+    groups = list(Group.objects.only('pk'))
+    for group in groups:
+        values = points[group.pk]
+        size = len(values)
+        class_counts = [0] * (len(CLASS_FLOORS) + 1)
+        for value in values:
+            class_counts[classify(value)] += 1
+        group.student_count = size
+        group.cgpa_total = Decimal(sum(values)).scaleb(-2)
+        group.average_cgpa = (group.cgpa_total / size).quantize(Decimal('0.01')) if size else None
+        group.min_cgpa = Decimal(min(values)).scaleb(-2) if size else None
+        group.max_cgpa = Decimal(max(values)).scaleb(-2) if size else None
+        group.class_counts = class_counts
+    Group.objects.bulk_update(
+        groups,
+        ['student_count', 'cgpa_total', 'average_cgpa', 'min_cgpa', 'max_cgpa', 'class_counts'],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('allocation', '0006_group_supervisor_foreign_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='average_cgpa',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=3, null=True),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='cgpa_total',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='class_counts',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='max_cgpa',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=3, null=True),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='min_cgpa',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=3, null=True),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='student_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_group_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_allocation_results(apps, schema_editor):
+    AllocationResult = apps.get_model('allocation', 'AllocationResult')
+    Group = apps.get_model('allocation', 'Group')
+    run_groups = Group.objects.filter(allocation_result=OuterRef('pk')).values('allocation_result')
+    AllocationResult.objects.update(
+        # Runs have always been per department; take it from the groups.
+        department_id=Subquery(run_groups.annotate(first=Min('department_id')).values('first')),
+        student_count=Coalesce(Subquery(run_groups.annotate(total=Sum('student_count')).values('total')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('allocation', '0007_group_stats'),
+        ('frontend', '0003_alter_user_managers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='allocationresult',
+            name='department',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='allocation_results', to='frontend.department'),
+        ),
+        migrations.AddField(
+            model_name='allocationresult',
+            name='student_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='allocationresult',
+            index=models.Index(fields=['department', '-created_at'], name='allocation__departm_60e30d_idx'),
+        ),
+        migrations.RunPython(backfill_allocation_results, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:20
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_updated_at(apps, schema_editor):
+    AllocationResult = apps.get_model('allocation', 'AllocationResult')
+    AllocationResult.objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('allocation', '0008_allocationresult_department'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='allocationresult',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
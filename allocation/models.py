@@ -1,14 +1,28 @@
+from decimal import Decimal
+
 from django.db import models
+from django.utils import timezone
+
+from allocation.engine import CLASSIFICATIONS, to_points
 from students.models import Student
 from supervisors.models import Supervisor
 
+CENT = Decimal('0.01')
+
+
+def from_points(points):
+    """Inverse of engine.to_points (None stays None)."""
+    return None if points is None else Decimal(points).scaleb(-2)
+
 
 class Group(models.Model):
     number = models.PositiveIntegerField()
-    supervisor = models.OneToOneField(
+    # A supervisor may lead groups in several runs (and, with capacity-aware
+    # allocation, carry any load up to Supervisor.max_students).
+    supervisor = models.ForeignKey(
         "supervisors.Supervisor",
         on_delete=models.CASCADE,
-        related_name="group",
+        related_name="groups",
         blank=True,
         null=True
     )
@@ -29,6 +43,18 @@ class Group(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Membership statistics, written together with the membership rows (see
+    # allocation.persistence) so pages never aggregate over students.
+    student_count = models.PositiveIntegerField(default=0)
+    cgpa_total = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    average_cgpa = models.DecimalField(max_digits=3, decimal_places=2, null=True, blank=True)
+    min_cgpa = models.DecimalField(max_digits=3, decimal_places=2, null=True, blank=True)
+    max_cgpa = models.DecimalField(max_digits=3, decimal_places=2, null=True, blank=True)
+    # Member count per classification, indexed like engine.CLASSIFICATIONS.
+    class_counts = models.JSONField(default=list, blank=True)
+
+    STAT_FIELDS = ['student_count', 'cgpa_total', 'average_cgpa', 'min_cgpa', 'max_cgpa', 'class_counts']
+
     class Meta:
         ordering = ['number']
         unique_together = ['number', 'supervisor', 'allocation_result']
@@ -38,28 +64,192 @@ class Group(models.Model):
 
     @property
     def average_grade(self):
-        if self.students.exists():
-            total = sum(float(student.cgpa) for student in self.students.all())
-            return total / self.students.count()
-        return 0.0
+        return float(self.average_cgpa or 0)
 
-    def student_count(self):
-        return self.students.count()
-    student_count.short_description = 'Student Count'
+    @property
+    def classification_breakdown(self):
+        """(classification, count) pairs for the classes present in the group."""
+        return [(label, count) for label, count in zip(CLASSIFICATIONS, self.class_counts) if count]
+
+    def stats(self):
+        """The stored statistics in engine form (``member_stats``, hundredths)."""
+        return {
+            'size': self.student_count,
+            'total': to_points(self.cgpa_total),
+            'min': to_points(self.min_cgpa) if self.min_cgpa is not None else None,
+            'max': to_points(self.max_cgpa) if self.max_cgpa is not None else None,
+            'class_counts': list(self.class_counts) or [0] * len(CLASSIFICATIONS),
+        }
+
+    def set_stats(self, stats):
+        """Store engine ``member_stats`` on the instance (does not save)."""
+        size = stats['size']
+        self.student_count = size
+        self.cgpa_total = from_points(stats['total'])
+        self.average_cgpa = (from_points(stats['total']) / size).quantize(CENT) if size else None
+        self.min_cgpa = from_points(stats['min'])
+        self.max_cgpa = from_points(stats['max'])
+        self.class_counts = stats['class_counts']
 
 
 class AllocationResult(models.Model):
+    department = models.ForeignKey(
+        "frontend.Department",
+        on_delete=models.CASCADE,
+        related_name="allocation_results",
+        null=True,
+        blank=True
+    )
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped by allocation.persistence whenever members (or their details)
+    # change after the run was saved; drives ETags and export caching.
+    updated_at = models.DateTimeField(auto_now=True)
     method = models.CharField(max_length=50)
     num_groups = models.PositiveIntegerField()
+    # Students across all groups; kept current by allocation.persistence.
+    student_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['department', '-created_at'])]
 
     def __str__(self):
         return f"Allocation {self.created_at.strftime('%Y-%m-%d %H:%M')}"
 
-    def departments(self):
-        return ", ".join(set(group.department.name for group in self.groups.all() if group.department))
-    departments.short_description = 'Departments'
+    @property
+    def version(self):
+        """Identifies this run's current content (for ETags and cache keys)."""
+        return f"{self.pk}-{self.updated_at.timestamp():.6f}"
+
+
+class AllocationJob(models.Model):
+    """An allocation run queued from the web UI and executed out-of-band."""
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    department = models.ForeignKey(
+        "frontend.Department",
+        on_delete=models.CASCADE,
+        related_name="allocation_jobs"
+    )
+    requested_by = models.ForeignKey(
+        "frontend.User",
+        on_delete=models.SET_NULL,
+        related_name="allocation_jobs",
+        null=True,
+        blank=True
+    )
+    method = models.CharField(max_length=50)
+    num_groups = models.PositiveIntegerField()
+    send_notifications = models.BooleanField(default=False)
+    optimize_ms = models.PositiveIntegerField(
+        default=0,
+        help_text="Wall-clock budget for the local-search optimizer; 0 disables it."
+    )
 
-    def total_students(self):
-        return sum(group.students.count() for group in self.groups.all())
-    total_students.short_description = 'Total Students'
\ No newline at end of file
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    phase = models.CharField(max_length=20, default='queued')
+    progress = models.PositiveSmallIntegerField(default=0)
+    timings = models.JSONField(default=dict, blank=True)
+    message = models.TextField(blank=True)
+    allocation_result = models.ForeignKey(
+        AllocationResult,
+        on_delete=models.SET_NULL,
+        related_name="jobs",
+        null=True,
+        blank=True
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"Allocation job {self.pk} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_SUCCEEDED, self.STATUS_FAILED)
+
+
+class EmailOutbox(models.Model):
+    """
+    One rendered e-mail waiting to be sent (or already sent) by
+    allocation.outbox, with its delivery status.
+    """
+
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    KIND_SUPERVISOR = 'supervisor'
+    KIND_STUDENT = 'student'
+    KIND_CHOICES = [
+        (KIND_SUPERVISOR, 'Supervisor'),
+        (KIND_STUDENT, 'Student'),
+    ]
+
+    department = models.ForeignKey(
+        "frontend.Department",
+        on_delete=models.CASCADE,
+        related_name="outbox"
+    )
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.SET_NULL,
+        related_name="emails",
+        null=True,
+        blank=True
+    )
+    student = models.ForeignKey(
+        Student,
+        on_delete=models.SET_NULL,
+        related_name="emails",
+        null=True,
+        blank=True
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    text_body = models.TextField()
+    html_body = models.TextField(blank=True)
+    attachment_name = models.CharField(max_length=255, blank=True)
+    attachment = models.TextField(blank=True)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # Set when a sender claims the row; rows stuck in "sending" past
+    # EMAIL_OUTBOX_CLAIM_SECONDS are treated as pending again.
+    claim_token = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx')]
+        verbose_name_plural = "email outbox"
+
+    def __str__(self):
+        return f"{self.get_kind_display()} e-mail to {self.to_email} ({self.status})"
@@ -0,0 +1,152 @@
+# allocation/notifications.py
+"""
+Rendering of the allocation notification e-mails.
+
+Every student of a group gets the same e-mail except for a few fields
+(``recipient`` in the templates). ``StudentNotification`` renders the
+HTML and text templates once per group with a marker in place of each of
+those fields and splits the output at the markers. A student's e-mail is
+then the fixed pieces joined with that student's values, escaped for the
+HTML part, instead of a full template render.
+
+That only works while the templates use those fields as plain
+``{{ recipient.<field> }}`` variables. A template that filters them,
+branches or loops on them, or pulls in other templates by a computed name
+is rendered in full for every student, as is a group whose first student
+does not come out the same both ways.
+
+Plain-text bodies come from the ``.txt`` templates rather than from
+stripping the HTML.
+"""
+import re
+
+from django.template.base import Lexer, TokenType
+from django.template.loader import get_template
+from django.template.loader_tags import ExtendsNode, IncludeNode
+from django.utils import formats
+from django.utils.html import conditional_escape
+
+STUDENT_HTML = 'emails/student_email.html'
+STUDENT_TEXT = 'emails/student_email.txt'
+SUPERVISOR_HTML = 'emails/supervisor_email.html'
+SUPERVISOR_TEXT = 'emails/supervisor_email.txt'
+
+# Per-student values, as the templates see them under ``recipient``.
+RECIPIENT_FIELDS = {
+    'name': lambda student: student.full_name or student.matric_no,
+    'matric_no': lambda student: student.matric_no,
+    'cgpa': lambda student: student.cgpa,
+}
+
+# Control characters: neither escaped by the template engine nor found in
+# rendered text, so they delimit the slots unambiguously.
+SLOT = '\x1e{}\x1f'
+SLOT_PATTERN = re.compile('\x1e(\\w+)\x1f')
+# The only way a template may use a recipient field for the slot rendering.
+PLAIN_FIELD = re.compile(r'recipient\.(\w+)')
+RECIPIENT_NAME = re.compile(r'\brecipient\b')
+
+
+def recipient(student):
+    return {name: value(student) for name, value in RECIPIENT_FIELDS.items()}
+
+
+def slot_fields(template, seen=None):
+    """
+    Recipient fields the compiled ``template`` (and every template it
+    extends or includes) shows as plain variables, or None if any tag or
+    variable uses ``recipient`` in another way or a template name is not a
+    constant.
+    """
+    seen = seen if seen is not None else set()
+    if template.origin.name in seen:
+        return set()
+    seen.add(template.origin.name)
+
+    fields = set()
+    for token in Lexer(template.source).tokenize():
+        if token.token_type not in (TokenType.VAR, TokenType.BLOCK) or not RECIPIENT_NAME.search(token.contents):
+            continue
+        match = PLAIN_FIELD.fullmatch(token.contents.strip())
+        if token.token_type != TokenType.VAR or match is None or match.group(1) not in RECIPIENT_FIELDS:
+            return None
+        fields.add(match.group(1))
+
+    for node in template.nodelist.get_nodes_by_type((ExtendsNode, IncludeNode)):
+        name = (node.parent_name if isinstance(node, ExtendsNode) else node.template).var
+        if not isinstance(name, str):
+            return None
+        included = slot_fields(get_template(name).template, seen)
+        if included is None:
+            return None
+        fields |= included
+    return fields
+
+
+def split_slots(rendered, fields):
+    """
+    ``[text, field, text, field, ..., text]`` from a render with slots, or
+    None if a filter changed a slot or one of ``fields`` (those the source
+    shows) is missing from the render; the template then has to be
+    rendered per student.
+    """
+    parts = SLOT_PATTERN.split(rendered)
+    if any('\x1e' in text or '\x1f' in text for text in parts[::2]):
+        return None
+    if any(field not in RECIPIENT_FIELDS for field in parts[1::2]):
+        return None
+    if not fields <= set(parts[1::2]):
+        return None
+    return parts
+
+
+class StudentNotification:
+    """The student e-mail of one group, rendered once."""
+
+    def __init__(self, group, supervisor, body):
+        self.context = {'group': group, 'supervisor': supervisor, 'body': body}
+        self.html_template = get_template(STUDENT_HTML)
+        self.text_template = get_template(STUDENT_TEXT)
+        self.html_parts = self.slot_render(self.html_template)
+        self.text_parts = self.slot_render(self.text_template)
+        self.checked = False
+
+    def slot_render(self, template):
+        fields = slot_fields(template.template)
+        if fields is None:
+            return None
+        slots = {name: SLOT.format(name) for name in RECIPIENT_FIELDS}
+        return split_slots(template.render(dict(self.context, recipient=slots)), fields)
+
+    def full_render(self, student):
+        context = dict(self.context, recipient=recipient(student))
+        return self.text_template.render(context), self.html_template.render(context)
+
+    def render(self, student):
+        """``(text, html)`` for ``student``."""
+        if self.html_parts is None or self.text_parts is None:
+            return self.full_render(student)
+        values = {name: formats.localize(value) for name, value in recipient(student).items()}
+        rendered = (
+            fill(self.text_parts, values),
+            fill(self.html_parts, {name: conditional_escape(value) for name, value in values.items()}),
+        )
+        if not self.checked:
+            # Safety net for what the source check cannot see: the first
+            # student must come out exactly as a full render.
+            self.checked = True
+            full = self.full_render(student)
+            if full != rendered:
+                self.html_parts = self.text_parts = None
+                return full
+        return rendered
+
+
+def fill(parts, values):
+    return ''.join(part if index % 2 == 0 else values[part] for index, part in enumerate(parts))
+
+
+def render_supervisor(group, supervisor, students, body):
+    """``(text, html)`` of the supervisor's e-mail listing ``students``."""
+    context = {'group': group, 'supervisor': supervisor, 'students': students, 'body': body}
+    return get_template(SUPERVISOR_TEXT).render(context), get_template(SUPERVISOR_HTML).render(context)
@@ -0,0 +1,309 @@
+# allocation/outbox.py
+"""
+Queued e-mail notifications.
+
+When a run is saved with notifications on, every supervisor and student
+e-mail is rendered into an EmailOutbox row (bulk INSERTs) and nothing is
+sent. ``drain`` then sends the due rows: each sender thread claims a batch
+of rows atomically, keeps one mail connection open across its batches and
+records the outcome per recipient. Failures are retried with exponential
+backoff until EMAIL_OUTBOX_MAX_ATTEMPTS; an optional rate limit spaces
+sends across all threads of the drain.
+
+Rows are drained by the in-process sender (``submit``, when
+``EMAIL_OUTBOX_WORKERS`` > 0), which sets a timer to drain again when the
+earliest retry is due, or by ``manage.py send_outbox``. Timers do not
+survive a restart or a frozen serverless instance (Vercel): there, run
+``send_outbox --loop`` (or on a schedule) so retries are sent. Delivery is
+at least once: a sender that dies mid-batch leaves its rows in "sending",
+and they are claimed again after EMAIL_OUTBOX_CLAIM_SECONDS.
+"""
+import csv
+import io
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import close_old_connections, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import exports
+from .models import EmailOutbox, Group
+from .notifications import StudentNotification, render_supervisor
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT when queueing.
+QUEUE_BATCH_SIZE = 500
+# Longest wait between two attempts at one message.
+MAX_RETRY_SECONDS = 3600
+
+_executor = None
+# Timer for the next drain of rows waiting for a retry, and when it fires.
+_retry_timer = None
+_retry_at = None
+_retry_lock = threading.Lock()
+
+
+def outbox_setting(name, default):
+    return getattr(settings, f'EMAIL_OUTBOX_{name}', default)
+
+
+def group_emails(group, students, subject, body):
+    """
+    Unsaved EmailOutbox rows for one group: the supervisor's (with the
+    roster CSV attached) and one per student with an address.
+    """
+    supervisor = group.supervisor
+    rows = []
+    if supervisor is not None and supervisor.email:
+        text, html = render_supervisor(group, supervisor, students, body)
+        roster = io.StringIO()
+        writer = csv.writer(roster)
+        writer.writerow(exports.ROSTER_HEADER)
+        for student in students:
+            writer.writerow(exports.roster_row(student.matric_no, student.full_name, student.cgpa, student.email))
+        rows.append(EmailOutbox(
+            department_id=group.department_id, group=group, kind=EmailOutbox.KIND_SUPERVISOR,
+            to_email=supervisor.email, subject=subject, text_body=text, html_body=html,
+            attachment_name=exports.roster_filename(group.number), attachment=roster.getvalue(),
+        ))
+
+    notification = StudentNotification(group, supervisor, body)
+    for student in students:
+        if not student.email:
+            continue
+        text, html = notification.render(student)
+        rows.append(EmailOutbox(
+            department_id=group.department_id, group=group, student=student, kind=EmailOutbox.KIND_STUDENT,
+            to_email=student.email, subject=subject, text_body=text, html_body=html,
+        ))
+    return rows
+
+
+def queue_group_emails(groups, subject, body):
+    """
+    Render the notifications of ``groups`` into the outbox; members are
+    read in one query. Returns the number of e-mails queued.
+    """
+    groups = list(Group.objects.filter(pk__in=[group.pk for group in groups]).select_related('supervisor'))
+    members = {group.pk: [] for group in groups}
+    memberships = (
+        Group.students.through.objects.filter(group__in=groups)
+        .select_related('student')
+        .order_by('group_id', 'student__matric_no')
+    )
+    for membership in memberships:
+        members[membership.group_id].append(membership.student)
+
+    rows = [row for group in groups for row in group_emails(group, members[group.pk], subject, body)]
+    EmailOutbox.objects.bulk_create(rows, batch_size=QUEUE_BATCH_SIZE)
+    return len(rows)
+
+
+def to_message(row, connection=None):
+    message = EmailMultiAlternatives(
+        subject=row.subject,
+        body=row.text_body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[row.to_email],
+        connection=connection,
+    )
+    if row.html_body:
+        message.attach_alternative(row.html_body, 'text/html')
+    if row.attachment_name:
+        message.attach(row.attachment_name, row.attachment, 'text/csv')
+    return message
+
+
+def retry_delay(attempts):
+    """Seconds before attempt ``attempts + 1``: base, 2x base, 4x base, ..."""
+    return min(outbox_setting('RETRY_SECONDS', 30) * 2 ** (attempts - 1), MAX_RETRY_SECONDS)
+
+
+class RateLimiter:
+    """Spaces calls to ``wait`` at least 1/``rate`` seconds apart, across threads."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_at = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_at)
+            self.next_at = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def claim_batch(limit):
+    """Atomically mark up to ``limit`` due rows as sending for this caller and return them."""
+    now = timezone.now()
+    due = (
+        Q(status=EmailOutbox.STATUS_PENDING, next_attempt_at__lte=now)
+        | Q(status=EmailOutbox.STATUS_SENDING,
+            claimed_at__lt=now - timedelta(seconds=outbox_setting('CLAIM_SECONDS', 600)))
+    )
+    ids = list(EmailOutbox.objects.filter(due).order_by('id').values_list('id', flat=True)[:limit])
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    # The due condition again, so rows another sender claimed meanwhile are skipped.
+    EmailOutbox.objects.filter(due, pk__in=ids).update(
+        status=EmailOutbox.STATUS_SENDING, claim_token=token, claimed_at=now
+    )
+    return list(EmailOutbox.objects.filter(claim_token=token, status=EmailOutbox.STATUS_SENDING))
+
+
+def send_batch(rows, connection, limiter):
+    """Send ``rows`` over ``connection`` and store each outcome; returns status counts."""
+    counts = {'sent': 0, 'retrying': 0, 'failed': 0}
+    max_attempts = outbox_setting('MAX_ATTEMPTS', 5)
+    for row in rows:
+        limiter.wait()
+        row.attempts += 1
+        row.claim_token = ''
+        row.claimed_at = None
+        try:
+            # Reopens after an error; a no-op while the connection is up.
+            connection.open()
+            connection.send_messages([to_message(row, connection)])
+        except Exception as exc:
+            logger.warning("E-mail %s to %s failed (attempt %s): %s", row.pk, row.to_email, row.attempts, exc)
+            row.last_error = str(exc)
+            if row.attempts >= max_attempts:
+                row.status = EmailOutbox.STATUS_FAILED
+                counts['failed'] += 1
+            else:
+                row.status = EmailOutbox.STATUS_PENDING
+                row.next_attempt_at = timezone.now() + timedelta(seconds=retry_delay(row.attempts))
+                counts['retrying'] += 1
+            try:
+                connection.close()
+            except Exception:
+                logger.debug("Connection close failed (ignored)")
+        else:
+            row.status = EmailOutbox.STATUS_SENT
+            row.sent_at = timezone.now()
+            row.last_error = ''
+            counts['sent'] += 1
+    EmailOutbox.objects.bulk_update(rows, [
+        'status', 'attempts', 'next_attempt_at', 'claim_token', 'claimed_at', 'last_error', 'sent_at',
+    ])
+    return counts
+
+
+def send_due(batch_size, limiter):
+    """One sender: claim and send batches over one connection until nothing is due."""
+    totals = {'sent': 0, 'retrying': 0, 'failed': 0}
+    connection = get_connection(fail_silently=False)
+    try:
+        while True:
+            rows = claim_batch(batch_size)
+            if not rows:
+                return totals
+            for status, count in send_batch(rows, connection, limiter).items():
+                totals[status] += count
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            logger.debug("Connection close failed (ignored)")
+
+
+def drain(workers=None, batch_size=None, rate=None):
+    """
+    Send everything that is due with ``workers`` sender threads (each with
+    its own mail and DB connection; 1, and always on SQLite, runs in the
+    calling thread), at most ``rate`` messages per second in total (0: no
+    limit). Returns the number of messages sent, rescheduled and given up on.
+    """
+    workers = max(1, workers if workers is not None else outbox_setting('WORKERS', 2))
+    if connections['default'].vendor == 'sqlite':
+        # One writer at a time: parallel senders would only hit "database is locked"
+        workers = 1
+    batch_size = batch_size or outbox_setting('BATCH_SIZE', 50)
+    limiter = RateLimiter(rate if rate is not None else outbox_setting('RATE', 0))
+    if workers == 1:
+        return send_due(batch_size, limiter)
+
+    totals = {'sent': 0, 'retrying': 0, 'failed': 0}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='email-outbox') as executor:
+        for counts in executor.map(lambda _: _send_in_thread(batch_size, limiter), range(workers)):
+            for status, count in counts.items():
+                totals[status] += count
+    return totals
+
+
+def _send_in_thread(batch_size, limiter):
+    try:
+        close_old_connections()
+        return send_due(batch_size, limiter)
+    finally:
+        connections.close_all()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='email-outbox-drain')
+    return _executor
+
+
+def submit():
+    """
+    Drain the outbox in the background once the surrounding transaction
+    commits. With ``EMAIL_OUTBOX_WORKERS = 0`` queued e-mails wait for
+    ``manage.py send_outbox``.
+    """
+    if outbox_setting('WORKERS', 2) <= 0:
+        return
+    transaction.on_commit(lambda: _get_executor().submit(_drain_in_thread))
+
+
+def schedule_retry():
+    """
+    Drain again in the background when the earliest pending row is due,
+    unless a timer already fires by then. Returns the seconds until then,
+    or None when nothing waits for a retry.
+    """
+    global _retry_timer, _retry_at
+    due = (
+        EmailOutbox.objects.filter(status=EmailOutbox.STATUS_PENDING)
+        .order_by('next_attempt_at')
+        .values_list('next_attempt_at', flat=True)
+        .first()
+    )
+    if due is None:
+        return None
+    delay = max(0.0, (due - timezone.now()).total_seconds())
+    with _retry_lock:
+        if _retry_timer is not None and _retry_timer.is_alive() and _retry_at <= due:
+            return max(0.0, (_retry_at - timezone.now()).total_seconds())
+        if _retry_timer is not None:
+            _retry_timer.cancel()
+        _retry_timer = threading.Timer(delay, lambda: _get_executor().submit(_drain_in_thread))
+        _retry_timer.daemon = True
+        _retry_at = due
+        _retry_timer.start()
+    return delay
+
+
+def _drain_in_thread():
+    try:
+        drain()
+        schedule_retry()
+    except Exception:
+        logger.exception("Outbox drain failed")
+    finally:
+        connections.close_all()
@@ -0,0 +1,174 @@
+# allocation/persistence.py
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from frontend.cache import bump_data_version
+from frontend.models import Department
+from frontend.stats import adjust_stats
+from students.models import Student
+
+from .engine import combine_stats, group_stats, member_stats, to_points
+from .models import AllocationResult, Group
+
+# Rows per INSERT for the Group.students through table. Keeps statements a
+# sane size on Postgres; SQLite caps it further by its variable limit.
+MEMBERSHIP_BATCH_SIZE = 5000
+
+
+class AllocationError(Exception):
+    """Raised when a department's data does not allow an allocation run."""
+
+
+def lock_unassigned(department_id, student_ids):
+    """
+    Inside a transaction: lock the department row, so concurrent runs for it
+    save one after the other, and check that ``student_ids`` are all still
+    unassigned. Another run (a second job, the batch command, a preview
+    commit) may have placed some of them after they were loaded.
+    """
+    list(Department.objects.select_for_update().filter(pk=department_id).values_list('pk', flat=True))
+    unassigned = set(
+        Student.objects.filter(department_id=department_id, groups__isnull=True).values_list('id', flat=True)
+    )
+    if not unassigned.issuperset(student_ids):
+        raise AllocationError(
+            'Some of these students were allocated by another run in the meantime. Please run the allocation again.'
+        )
+
+
+def save_plan(plan, department, supervisor_ids, pool):
+    """
+    Persist an engine ``AllocationPlan`` in one transaction.
+
+    ``supervisor_ids`` is parallel to ``plan.groups``; ``pool`` is the
+    snapshot the plan was computed from and supplies the CGPAs for the
+    groups' stored statistics. Writes the AllocationResult, all Group rows
+    (one bulk INSERT) and all membership rows (bulk INSERTs of
+    MEMBERSHIP_BATCH_SIZE), so the number of queries does not depend on the
+    number of groups.
+
+    Raises AllocationError if any of the plan's students has been assigned
+    since ``pool`` was loaded. Returns ``(allocation_result, groups)``.
+    """
+    if len(supervisor_ids) != plan.num_groups:
+        raise ValueError("supervisor_ids must have one entry per group")
+
+    Membership = Group.students.through
+
+    groups = []
+    for index, (supervisor_id, stats) in enumerate(zip(supervisor_ids, group_stats(plan, pool))):
+        group = Group(number=index + 1, supervisor_id=supervisor_id, department=department)
+        group.set_stats(stats)
+        groups.append(group)
+
+    with transaction.atomic():
+        lock_unassigned(department.pk, (student_id for members in plan.groups for student_id in members))
+        allocation_result = AllocationResult.objects.create(
+            department=department,
+            method=plan.method,
+            num_groups=plan.num_groups,
+            student_count=plan.total_students,
+        )
+        for group in groups:
+            group.allocation_result = allocation_result
+        groups = Group.objects.bulk_create(groups)
+
+        Membership.objects.bulk_create(
+            (
+                Membership(group_id=group.id, student_id=student_id)
+                for group, members in zip(groups, plan.groups)
+                for student_id in members
+            ),
+            batch_size=MEMBERSHIP_BATCH_SIZE,
+        )
+        # Bulk writes send no signals (the run's own row did)
+        adjust_stats(department.pk, total_groups=len(groups), unassigned_students=-plan.total_students)
+
+    return allocation_result, groups
+
+
+def add_members(plan, groups, pool):
+    """
+    Insert only the membership rows of ``plan`` into existing ``groups``
+    (parallel to ``plan.groups``, all of one AllocationResult) and fold the
+    new members into the groups' and the result's stored statistics, in one
+    transaction.
+
+    Raises AllocationError like ``save_plan``. Returns the number of rows
+    written.
+    """
+    if len(groups) != plan.num_groups:
+        raise ValueError("groups must have one entry per group")
+
+    Membership = Group.students.through
+
+    changed = []
+    for group, stats in zip(groups, group_stats(plan, pool)):
+        if stats['size']:
+            group.set_stats(combine_stats(group.stats(), stats))
+            changed.append(group)
+
+    with transaction.atomic():
+        if changed:
+            lock_unassigned(
+                changed[0].department_id, (student_id for members in plan.groups for student_id in members)
+            )
+        Membership.objects.bulk_create(
+            (
+                Membership(group_id=group.id, student_id=student_id)
+                for group, members in zip(groups, plan.groups)
+                for student_id in members
+            ),
+            batch_size=MEMBERSHIP_BATCH_SIZE,
+        )
+        Group.objects.bulk_update(changed, Group.STAT_FIELDS)
+        if changed:
+            AllocationResult.objects.filter(pk=changed[0].allocation_result_id).update(
+                student_count=F('student_count') + plan.total_students,
+                updated_at=timezone.now(),
+            )
+            # Bulk writes send no signals
+            bump_data_version(changed[0].department_id)
+            adjust_stats(changed[0].department_id, unassigned_students=-plan.total_students)
+    return plan.total_students
+
+
+def refresh_group_stats(group_ids):
+    """
+    Recompute the stored statistics of ``group_ids`` from their current
+    members, for changes made outside an allocation run (admin edits,
+    edited or deleted students), in a fixed number of queries. Also marks
+    the groups' runs as updated, which invalidates their ETags and cached
+    exports.
+    """
+    group_ids = set(group_ids)
+    if not group_ids:
+        return
+    points = defaultdict(list)
+    for group_id, cgpa in Group.students.through.objects.filter(group_id__in=group_ids).values_list(
+        'group_id', 'student__cgpa'
+    ):
+        points[group_id].append(to_points(cgpa))
+
+    groups = list(Group.objects.filter(pk__in=group_ids).only('pk', 'allocation_result_id'))
+    for group in groups:
+        group.set_stats(member_stats(points[group.pk]))
+    with transaction.atomic():
+        Group.objects.bulk_update(groups, Group.STAT_FIELDS)
+        AllocationResult.objects.filter(pk__in={group.allocation_result_id for group in groups}).update(
+            student_count=Subquery(
+                Group.objects.filter(allocation_result=OuterRef('pk'))
+                .values('allocation_result')
+                .annotate(total=Sum('student_count'))
+                .values('total')
+            ),
+            updated_at=timezone.now(),
+        )
+
+
+def mark_runs_updated(groups):
+    """Bump the runs of ``groups`` (a Group queryset) after edits that change what they show."""
+    AllocationResult.objects.filter(pk__in=groups.values('allocation_result')).update(updated_at=timezone.now())
@@ -0,0 +1,405 @@
+# allocation/services.py
+import logging
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+
+from students.models import Student, SupervisorPreference
+from supervisors.models import Supervisor
+
+from .engine import (
+    FIXED_ASSIGNMENT_STRATEGIES,
+    PREFERENCE_STRATEGIES,
+    PreferenceTable,
+    StudentPool,
+    SupervisorPool,
+    allocate,
+    compare_strategies,
+    optimize_plan,
+    place_into_groups,
+    plan_metrics,
+    snapshot_fingerprint,
+    to_points,
+)
+from .engine.metrics import group_sums
+from .models import AllocationResult, Group
+from .outbox import queue_group_emails
+from .persistence import AllocationError, add_members, save_plan
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_SUBJECT = "Project Group Allocation Notification"
+NOTIFICATION_BODY = "You have been allocated to a project group. Please check the system for details."
+
+
+def load_student_pool(department):
+    """Snapshot of the department's unassigned students as (id, cgpa) arrays."""
+    return StudentPool.from_rows(
+        Student.objects.filter(department=department, groups__isnull=True)
+        .order_by('id')
+        .values_list('id', 'cgpa')
+    )
+
+
+def load_preferences(department, pool):
+    """Attach the department's ranked supervisor choices to ``pool``."""
+    pool.preferences = PreferenceTable.from_rows(
+        pool,
+        SupervisorPreference.objects.filter(
+            student__department=department, student__groups__isnull=True
+        ).values_list('student_id', 'ranking'),
+    )
+    return pool
+
+
+def load_supervisor_pool(department):
+    """
+    Department supervisors (id, remaining capacity) in assignment order:
+    supervisors without a group come first, then the ones that already
+    have one.
+
+    ``max_students`` bounds a supervisor's total load, so the students they
+    already supervise in earlier runs are subtracted from it; supervisors
+    at their limit are left out.
+    """
+    supervisors = list(
+        Supervisor.objects.filter(department=department).values_list('id', 'max_students')
+    )
+    # Every supervisor with a group, with the students they already have
+    earlier_load = dict(
+        Group.objects.filter(department=department, supervisor__isnull=False)
+        .values_list('supervisor_id')
+        .annotate(load=Sum('student_count'))
+    )
+
+    rows = []
+    for supervisor_id, limit in supervisors:
+        if limit:
+            limit -= earlier_load.get(supervisor_id, 0)
+            if limit <= 0:
+                continue
+        rows.append((supervisor_id, limit))
+    return SupervisorPool.from_rows(
+        [row for row in rows if row[0] not in earlier_load]
+        + [row for row in rows if row[0] in earlier_load]
+    )
+
+
+def load_snapshot(department, with_preferences=False):
+    """Student and supervisor pools for one run, plus the fingerprint of both."""
+    pool = load_student_pool(department)
+    supervisors = load_supervisor_pool(department)
+    if with_preferences:
+        load_preferences(department, pool)
+    return pool, supervisors, snapshot_fingerprint(pool, supervisors)
+
+
+def check_allocation_inputs(num_students, num_supervisors, num_groups):
+    if num_students == 0 or num_supervisors == 0:
+        raise AllocationError('Need at least 1 unassigned student and 1 supervisor to run allocation.')
+    if num_groups > num_supervisors:
+        raise AllocationError(f'Number of groups cannot exceed number of supervisors ({num_supervisors}).')
+
+
+def group_supervisor_ids(plan, supervisor_ids):
+    """Supervisor per group: the plan's own choice, else rotate through ``supervisor_ids``."""
+    return plan.supervisor_ids or [
+        supervisor_ids[index % len(supervisor_ids)]
+        for index in range(plan.num_groups)
+    ]
+
+
+def execute_allocation(department, method, num_groups, send_notifications=False, optimize_ms=0,
+                       progress=None, dry_run=False):
+    """
+    Load, allocate, persist and optionally notify for one department.
+
+    With ``optimize_ms`` > 0 the strategy's plan is refined by the
+    local-search optimizer for at most that many milliseconds (ignored for
+    strategies whose assignment is fixed, such as stable matching).
+
+    ``progress`` is an optional callable ``progress(phase, percent)`` invoked
+    as the run moves through its phases. Returns a summary dict with the
+    saved AllocationResult, counts and per-phase timings (seconds).
+
+    With ``dry_run`` nothing is saved or sent; ``allocation_result`` is None.
+    """
+    def report(phase, percent):
+        if progress is not None:
+            progress(phase, percent)
+
+    timings = {}
+
+    report('loading', 0)
+    started = time.perf_counter()
+    pool = load_student_pool(department)
+    supervisors = load_supervisor_pool(department)
+    if method in PREFERENCE_STRATEGIES:
+        load_preferences(department, pool)
+    check_allocation_inputs(len(pool), len(supervisors), num_groups)
+    timings['loading'] = time.perf_counter() - started
+
+    report('allocating', 10)
+    started = time.perf_counter()
+    plan = allocate(method, pool, num_groups, supervisors=supervisors)
+    timings['allocating'] = time.perf_counter() - started
+
+    if optimize_ms and method not in FIXED_ASSIGNMENT_STRATEGIES:
+        report('optimizing', 20)
+        started = time.perf_counter()
+        plan = optimize_plan(plan, pool, budget_ms=optimize_ms)
+        timings['optimizing'] = time.perf_counter() - started
+
+    metrics = plan_metrics(plan, pool)
+
+    if dry_run:
+        allocation_result, groups = None, []
+    else:
+        report('saving', 40)
+        started = time.perf_counter()
+        allocation_result, groups = save_plan(
+            plan, department, group_supervisor_ids(plan, supervisors.ids), pool
+        )
+        timings['saving'] = time.perf_counter() - started
+
+    summary = {
+        'allocation_result': allocation_result,
+        'students_allocated': plan.total_students,
+        'students_unallocated': len(pool) - plan.total_students,
+        'num_groups': plan.num_groups,
+        'metrics': metrics,
+        'timings': timings,
+        'emails_queued': 0,
+    }
+
+    if send_notifications and not dry_run:
+        # Rendered into the outbox here and sent by allocation.outbox.drain
+        report('notifying', 70)
+        started = time.perf_counter()
+        summary['emails_queued'] = queue_group_emails(groups, NOTIFICATION_SUBJECT, NOTIFICATION_BODY)
+        timings['notifying'] = time.perf_counter() - started
+
+    report('done', 100)
+    return summary
+
+
+def compare_cache_key(token):
+    return f'allocation:compare:{token}'
+
+
+def compare_allocations(department, num_groups, seeds=None, workers=None):
+    """
+    Evaluate every registered strategy (several seeds for the randomised
+    ones) on one snapshot of the department's unassigned students without
+    writing anything.
+
+    The ranked candidates are kept in the cache for
+    ``ALLOCATION_PLAN_CACHE_SECONDS`` under a token so one of them can be
+    committed later with ``commit_compared_plan``. Returns
+    ``{'token', 'candidates'}``; candidates are dicts with ``method``,
+    ``seed``, ``score``, ``metrics`` and ``plan``, best first.
+    """
+    pool, supervisors, fingerprint = load_snapshot(department, with_preferences=True)
+    check_allocation_inputs(len(pool), len(supervisors), num_groups)
+
+    candidates = compare_strategies(
+        pool,
+        num_groups,
+        supervisors=supervisors,
+        seeds=seeds or getattr(settings, 'ALLOCATION_COMPARE_SEEDS', 3),
+        workers=workers or getattr(settings, 'ALLOCATION_COMPARE_WORKERS', 1),
+    )
+    for candidate in candidates:
+        candidate['supervisor_ids'] = group_supervisor_ids(candidate['plan'], supervisors.ids)
+        candidate['students_unallocated'] = len(pool) - candidate['plan'].total_students
+
+    token = uuid.uuid4().hex
+    cache.set(
+        compare_cache_key(token),
+        {'department_id': department.id, 'fingerprint': fingerprint, 'candidates': candidates},
+        getattr(settings, 'ALLOCATION_PLAN_CACHE_SECONDS', 900),
+    )
+    return {'token': token, 'candidates': candidates}
+
+
+def commit_compared_plan(department, token, index):
+    """
+    Persist candidate ``index`` of a comparison as-is (no recomputation).
+
+    Raises AllocationError if the comparison expired, belongs to another
+    department, or the department's students or supervisors changed since.
+    """
+    key = compare_cache_key(token)
+    comparison = cache.get(key)
+    if comparison is None or comparison['department_id'] != department.id:
+        raise AllocationError('This comparison has expired. Please compare the strategies again.')
+    try:
+        candidate = comparison['candidates'][index]
+    except IndexError:
+        raise AllocationError('Unknown plan.') from None
+
+    pool, _, fingerprint = load_snapshot(department, with_preferences=True)
+    if fingerprint != comparison['fingerprint']:
+        cache.delete(key)
+        raise AllocationError('Students or supervisors have changed since this comparison. Please compare again.')
+
+    allocation_result, groups = save_plan(candidate['plan'], department, candidate['supervisor_ids'], pool)
+    cache.delete(key)
+    return allocation_result
+
+
+def preview_cache_key(department, method, num_groups, optimize_ms, fingerprint):
+    return f'allocation:preview:{department.id}:{method}:{num_groups}:{optimize_ms}:{fingerprint}'
+
+
+def preview_allocation(department, method, num_groups, optimize_ms=0):
+    """
+    Compute (or fetch) the plan ``execute_allocation`` would save, without
+    saving it.
+
+    Results are cached under the input fingerprint, so re-opening a preview
+    whose students and supervisors have not changed only costs the snapshot
+    load and a cache lookup. Returns a dict with ``plan``, ``supervisor_ids``,
+    ``metrics``, ``groups`` (per-group number, supervisor id, size and mean
+    CGPA), ``students_unallocated``, ``fingerprint`` and ``cached``.
+    """
+    pool, supervisors, fingerprint = load_snapshot(
+        department, with_preferences=method in PREFERENCE_STRATEGIES
+    )
+    check_allocation_inputs(len(pool), len(supervisors), num_groups)
+    if method in FIXED_ASSIGNMENT_STRATEGIES:
+        optimize_ms = 0
+
+    key = preview_cache_key(department, method, num_groups, optimize_ms, fingerprint)
+    preview = cache.get(key)
+    if preview is not None:
+        preview['cached'] = True
+        return preview
+
+    plan = allocate(method, pool, num_groups, supervisors=supervisors)
+    if optimize_ms:
+        plan = optimize_plan(plan, pool, budget_ms=optimize_ms)
+    supervisor_ids = group_supervisor_ids(plan, supervisors.ids)
+
+    preview = {
+        'plan': plan,
+        'supervisor_ids': supervisor_ids,
+        'metrics': plan_metrics(plan, pool),
+        'groups': [
+            {
+                'number': index + 1,
+                'supervisor_id': supervisor_id,
+                'size': len(members),
+                'average_cgpa': total / len(members) / 100 if members else 0,
+            }
+            for index, (supervisor_id, members, total)
+            in enumerate(zip(supervisor_ids, plan.groups, group_sums(plan, pool)))
+        ],
+        'students_unallocated': len(pool) - plan.total_students,
+        'fingerprint': fingerprint,
+        'cached': False,
+    }
+    cache.set(key, preview, getattr(settings, 'ALLOCATION_PLAN_CACHE_SECONDS', 900))
+    return preview
+
+
+def commit_preview(department, method, num_groups, optimize_ms, fingerprint):
+    """
+    Persist the cached preview for these inputs as shown (no recomputation).
+
+    Raises AllocationError if the preview expired or the department's data
+    no longer matches ``fingerprint``.
+    """
+    pool, _, current = load_snapshot(department, with_preferences=method in PREFERENCE_STRATEGIES)
+    if current != fingerprint:
+        raise AllocationError('Students or supervisors have changed since this preview. Please preview again.')
+    if method in FIXED_ASSIGNMENT_STRATEGIES:
+        optimize_ms = 0
+
+    key = preview_cache_key(department, method, num_groups, optimize_ms, fingerprint)
+    preview = cache.get(key)
+    if preview is None:
+        raise AllocationError('This preview has expired. Please preview again.')
+
+    allocation_result, groups = save_plan(preview['plan'], department, preview['supervisor_ids'], pool)
+    cache.delete(key)
+    return allocation_result
+
+
+def extend_latest_allocation(department):
+    """
+    Place the department's unassigned students into the groups of its latest
+    AllocationResult instead of starting a new one.
+
+    Takes every group's current size and CGPA sum from its stored
+    statistics, places students with ``place_into_groups`` and writes only
+    the new membership rows and the updated statistics. A supervisor's
+    ``max_students`` bounds their total load: students they already
+    supervise in earlier runs count against it, and groups whose
+    supervisor is at the limit get nobody.
+    """
+    latest = AllocationResult.objects.filter(department=department).order_by('-created_at', '-pk').first()
+    if latest is None:
+        raise AllocationError('There is no previous allocation to add students to.')
+
+    pool = load_student_pool(department)
+    if not len(pool):
+        raise AllocationError('There are no unassigned students to add.')
+
+    groups = list(
+        Group.objects.filter(allocation_result=latest, department=department)
+        .select_related('supervisor')
+        .order_by('number')
+    )
+    earlier_load = dict(
+        Group.objects.filter(supervisor__in=[group.supervisor_id for group in groups if group.supervisor_id])
+        .exclude(allocation_result=latest)
+        .values_list('supervisor_id')
+        .annotate(load=Sum('student_count'))
+    )
+
+    open_groups, capacities = [], []
+    for group in groups:
+        limit = group.supervisor.max_students if group.supervisor else None
+        if limit:
+            # place_into_groups caps the group's final size
+            limit -= earlier_load.get(group.supervisor_id, 0)
+            if limit <= group.student_count:
+                continue
+        open_groups.append(group)
+        capacities.append(limit or 0)
+
+    plan = place_into_groups(
+        pool,
+        sizes=[group.student_count for group in open_groups],
+        sums=[to_points(group.cgpa_total) for group in open_groups],
+        capacities=capacities,
+    )
+    added = add_members(plan, open_groups, pool)
+    latest.student_count += added
+
+    return {
+        'allocation_result': latest,
+        'students_allocated': added,
+        'students_unallocated': len(pool) - added,
+        'num_groups': len(groups),
+    }
+
+
+def summary_message(summary):
+    message = (
+        f"Successfully allocated {summary['students_allocated']} students "
+        f"into {summary['num_groups']} groups "
+        f"(group mean CGPA spread {summary['metrics']['mean_spread']:.2f})."
+    )
+    if summary['students_unallocated']:
+        message += (
+            f" {summary['students_unallocated']} students could not be placed "
+            f"because supervisor capacity ran out."
+        )
+    if summary['emails_queued']:
+        message += f" {summary['emails_queued']} email notifications queued for sending."
+    return message
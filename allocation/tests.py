@@ -1,3 +1,949 @@
-from django.test import TestCase
+import csv
+import io
+import random
+import time
+import zipfile
+from array import array
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection
+from django.db.models import Count
+from django.template.loader import render_to_string
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from allocation import exports, jobs, outbox
+from allocation.engine import (
+    CLASSIFICATIONS,
+    PreferenceTable,
+    StudentPool,
+    SupervisorPool,
+    allocate,
+    classify_points,
+    optimize_plan,
+    plan_metrics,
+    to_points,
+)
+from allocation.engine.balance import heap_balanced, place_into_groups
+from allocation.engine.flow import MinCostFlow, _apportion, _deal
+from allocation.models import AllocationJob, AllocationResult, EmailOutbox, Group
+from allocation.notifications import STUDENT_HTML, STUDENT_TEXT, StudentNotification, recipient
+from allocation.persistence import AllocationError, save_plan
+from allocation.services import (
+    commit_compared_plan,
+    commit_preview,
+    compare_allocations,
+    execute_allocation,
+    extend_latest_allocation,
+    load_student_pool,
+    preview_allocation,
+)
+from frontend.models import Department, School
+from students.models import Student, SupervisorPreference
+from supervisors.models import Supervisor
+
+UNREACHABLE = 'unreachable@example.com'
+
+
+def sample_pool(size=47, seed=3):
+    """(id, cgpa) rows spread over every classification, ids ascending."""
+    rng = random.Random(seed)
+    return [(number + 1, Decimal(rng.randint(50, 500)) / 100) for number in range(size)]
+
+
+def baseline_groups(method, rows, num_groups, seed):
+    """
+    The per-Student allocation functions views.py had before the engine,
+    on ``(id, cgpa)`` rows and with a seeded ``random.Random``.
+    """
+    rng = random.Random(seed)
+    groups = [[] for _ in range(num_groups)]
+    if method == 'grade_based':
+        ranked = sorted(rows, key=lambda row: row[1], reverse=True)
+        first_class = [row for row in ranked if row[1] >= Decimal('4.50')]
+        head = first_class[:3 * num_groups]
+        for index, row in enumerate(head):
+            groups[index % num_groups].append(row[0])
+        for index, row in enumerate(row for row in ranked if row not in head):
+            groups[index % num_groups].append(row[0])
+    elif method == 'random':
+        shuffled = [row[0] for row in rows]
+        rng.shuffle(shuffled)
+        for index, student_id in enumerate(shuffled):
+            groups[index % num_groups].append(student_id)
+    else:
+        classified = defaultdict(list)
+        for student_id, cgpa in rows:
+            classified[classify_points(to_points(cgpa))].append(student_id)
+        # The baseline walked classes in first-seen order; the engine walks
+        # them best class first, which only changes who lands in which group.
+        for code in sorted(classified):
+            rng.shuffle(classified[code])
+            for index, student_id in enumerate(classified[code]):
+                groups[index % num_groups].append(student_id)
+    return groups
+
+
+class EngineStrategyTests(SimpleTestCase):
+    def test_strategies_match_the_baseline(self):
+        rows = sample_pool()
+        pool = StudentPool.from_rows(rows)
+        for method in ('grade_based', 'random', 'balanced'):
+            for num_groups in (1, 4, 6):
+                with self.subTest(method=method, num_groups=num_groups):
+                    plan = allocate(method, pool, num_groups, seed=11)
+                    expected = baseline_groups(method, rows, num_groups, seed=11)
+                    self.assertEqual([list(members) for members in plan.groups], expected)
+
+    def test_balanced_class_mix_does_not_depend_on_class_order(self):
+        rows = sample_pool()
+        plan = allocate('balanced', StudentPool.from_rows(rows), 4, seed=5)
+        cgpa = dict(rows)
+        mix = [
+            sorted(classify_points(to_points(cgpa[student_id])) for student_id in members)
+            for members in plan.groups
+        ]
+        # Every class is dealt from group 1, whatever order the classes come in.
+        counts = defaultdict(int)
+        for _, value in rows:
+            counts[classify_points(to_points(value))] += 1
+        expected = [[] for _ in range(4)]
+        for code in sorted(counts):
+            for index in range(counts[code]):
+                expected[index % 4].append(code)
+        self.assertEqual(mix, [sorted(codes) for codes in expected])
+
+    def test_cgpa_points_round_trip(self):
+        for text in ('0.00', '1.00', '2.39', '2.40', '3.495', '4.50', '5.00'):
+            with self.subTest(cgpa=text):
+                points = to_points(Decimal(text))
+                self.assertEqual(points, to_points(text))
+                self.assertEqual(points, to_points(float(text)))
+                self.assertEqual(Decimal(points) / 100, Decimal(text).quantize(Decimal('0.01')))
+        self.assertEqual(classify_points(to_points('4.50')), 0)
+        self.assertEqual(classify_points(to_points('4.49')), 1)
+        self.assertEqual(classify_points(to_points('0.99')), 5)
+
+
+class FlakyBackend(EmailBackend):
+    """locmem backend that refuses one address."""
+
+    def send_messages(self, messages):
+        for message in messages:
+            if UNREACHABLE in message.to:
+                raise ConnectionError('mailbox unavailable')
+        return super().send_messages(messages)
+
+
+class HeapBalancedTests(SimpleTestCase):
+    def test_spread_is_no_worse_than_balanced(self):
+        for size, num_groups in ((47, 4), (120, 7), (200, 10)):
+            pool = StudentPool.from_rows(sample_pool(size, seed=size))
+            heap = plan_metrics(heap_balanced(pool, num_groups, seed=1), pool)
+            for seed in range(5):
+                with self.subTest(size=size, num_groups=num_groups, seed=seed):
+                    dealt = plan_metrics(allocate('balanced', pool, num_groups, seed=seed), pool)
+                    self.assertLessEqual(heap['size_spread'], 1)
+                    self.assertLessEqual(heap['mean_spread'], dealt['mean_spread'])
+
+    def test_swap_pass_keeps_members_and_sizes(self):
+        pool = StudentPool.from_rows(sample_pool(120, seed=8))
+        greedy = heap_balanced(pool, 7, seed=1, swap_seconds=0)
+        swapped = heap_balanced(pool, 7, seed=1)
+        self.assertEqual(sorted(map(len, swapped.groups)), sorted(map(len, greedy.groups)))
+        self.assertEqual(
+            sorted(student_id for members in swapped.groups for student_id in members), sorted(pool.ids)
+        )
+        self.assertLessEqual(plan_metrics(swapped, pool)['mean_stddev'], plan_metrics(greedy, pool)['mean_stddev'])
+
+
+def objective(plan, pool):
+    """The quantity optimize_plan minimises, computed from scratch."""
+    cgpa = dict(zip(pool.ids, pool.points))
+    overall = sum(pool.points) / len(pool) / 100
+    shares = [pool.classes.count(code) / len(pool) for code in range(len(CLASSIFICATIONS))]
+    total = 0.0
+    for members in plan.groups:
+        if not members:
+            continue
+        points = [cgpa[student_id] for student_id in members]
+        total += (sum(points) / len(points) / 100 - overall) ** 2
+        codes = [classify_points(value) for value in points]
+        total += sum((codes.count(code) / len(codes) - share) ** 2 for code, share in enumerate(shares))
+    return total
+
+
+class OptimizePlanTests(SimpleTestCase):
+    def test_never_worse_than_the_starting_plan(self):
+        pool = StudentPool.from_rows(sample_pool(90, seed=4))
+        for method in ('grade_based', 'random', 'balanced', 'heap_balanced'):
+            for seed in range(3):
+                with self.subTest(method=method, seed=seed):
+                    plan = allocate(method, pool, 6, seed=seed)
+                    optimized = optimize_plan(plan, pool, budget_ms=50, seed=seed)
+                    self.assertLessEqual(objective(optimized, pool), objective(plan, pool) + 1e-9)
+
+    def test_keeps_members_sizes_and_supervisors(self):
+        pool = StudentPool.from_rows(sample_pool(60, seed=6))
+        supervisors = SupervisorPool([11, 12, 13, 14], [10, 25, 0, 12])
+        plan = allocate('capacity', pool, 4, supervisors=supervisors)
+        optimized = optimize_plan(plan, pool, budget_ms=50, seed=1)
+        self.assertEqual([len(members) for members in optimized.groups], [len(members) for members in plan.groups])
+        self.assertEqual(optimized.supervisor_ids, plan.supervisor_ids)
+        self.assertEqual(
+            sorted(student_id for members in optimized.groups for student_id in members),
+            sorted(student_id for members in plan.groups for student_id in members),
+        )
+
+    def test_stops_on_convergence_and_at_the_deadline(self):
+        tiny = StudentPool.from_rows(sample_pool(4, seed=1))
+        started = time.perf_counter()
+        optimize_plan(allocate('random', tiny, 2, seed=1), tiny, budget_ms=3000, seed=1)
+        self.assertLess(time.perf_counter() - started, 0.5)
+
+        large = StudentPool.from_rows(sample_pool(3000, seed=2))
+        started = time.perf_counter()
+        optimize_plan(allocate('random', large, 30, seed=1), large, budget_ms=100, seed=1)
+        self.assertLess(time.perf_counter() - started, 0.2)
+
+
+def reference_min_cost_flow(num_nodes, edges, source, sink, max_flow=None):
+    """Plain successive shortest paths, one Bellman-Ford per augmenting path."""
+    graph = []
+    for tail, head, capacity, cost in edges:
+        graph.append([tail, head, capacity, cost])
+        graph.append([head, tail, 0, -cost])
+    limit = float('inf') if max_flow is None else max_flow
+    flow = cost = 0
+    while flow < limit:
+        distance = [float('inf')] * num_nodes
+        via = [None] * num_nodes
+        distance[source] = 0
+        for _ in range(num_nodes):
+            for index, (tail, head, capacity, edge_cost) in enumerate(graph):
+                if capacity > 0 and distance[tail] + edge_cost < distance[head]:
+                    distance[head] = distance[tail] + edge_cost
+                    via[head] = index
+        if distance[sink] == float('inf'):
+            break
+        path, node = [], sink
+        while node != source:
+            path.append(via[node])
+            node = graph[via[node]][0]
+        push = min([limit - flow] + [graph[index][2] for index in path])
+        for index in path:
+            graph[index][2] -= push
+            graph[index ^ 1][2] += push
+        flow += push
+        cost += push * distance[sink]
+    return flow, cost
+
+
+class CapacityFlowTests(SimpleTestCase):
+    def test_solver_matches_successive_shortest_paths(self):
+        rng = random.Random(7)
+        for trial in range(200):
+            num_nodes = rng.randint(2, 9)
+            edges = [
+                (rng.randrange(num_nodes), rng.randrange(num_nodes), rng.randint(0, 6), rng.randint(0, 5))
+                for _ in range(rng.randint(1, 25))
+            ]
+            edges = [edge for edge in edges if edge[0] != edge[1]]
+            max_flow = rng.choice([None, rng.randint(1, 8)])
+            graph = MinCostFlow(num_nodes)
+            for edge in edges:
+                graph.add_edge(*edge)
+            with self.subTest(trial=trial):
+                self.assertEqual(
+                    graph.solve(0, num_nodes - 1, max_flow),
+                    reference_min_cost_flow(num_nodes, edges, 0, num_nodes - 1, max_flow),
+                )
+
+    def test_capacities_are_respected(self):
+        pool = StudentPool.from_rows(sample_pool(100, seed=9))
+        for capacities in ([10, 25, 0, 12], [30, 30, 30, 30], [0, 0, 0, 5], [1, 2, 3, 200]):
+            with self.subTest(capacities=capacities):
+                supervisors = SupervisorPool([11, 12, 13, 14], capacities)
+                plan = allocate('capacity', pool, 4, supervisors=supervisors)
+                limits = dict(zip(supervisors.ids, supervisors.resolved_capacities(4, len(pool))))
+                for supervisor_id, members in zip(plan.supervisor_ids, plan.groups):
+                    self.assertLessEqual(len(members), limits[supervisor_id])
+                placed = [student_id for members in plan.groups for student_id in members]
+                self.assertEqual(len(placed), len(set(placed)))
+                self.assertEqual(len(placed), min(len(pool), sum(limits.values())))
+
+    def test_short_capacity_leaves_the_lowest_ranked_out(self):
+        rows = sample_pool(80, seed=10)
+        pool = StudentPool.from_rows(rows)
+        plan = allocate('capacity', pool, 3, supervisors=SupervisorPool([1, 2, 3], [10, 15, 20]))
+        self.assertEqual(plan.total_students, 45)
+        placed = {student_id for members in plan.groups for student_id in members}
+        cgpa = dict(rows)
+        for bucket in pool.buckets():
+            left_out = [cgpa[pool.ids[index]] for index in bucket if pool.ids[index] not in placed]
+            kept = [cgpa[pool.ids[index]] for index in bucket if pool.ids[index] in placed]
+            if left_out and kept:
+                self.assertGreaterEqual(min(kept), max(left_out))
+
+    def test_apportion_parts_add_up(self):
+        rng = random.Random(12)
+        for _ in range(300):
+            weights = [rng.choice([0, rng.randint(1, 50)]) for _ in range(rng.randint(1, 8))]
+            total = rng.randint(0, 200)
+            parts = _apportion(total, weights)
+            self.assertEqual(len(parts), len(weights))
+            if any(weights):
+                self.assertEqual(sum(parts), total)
+                for part, weight in zip(parts, weights):
+                    self.assertLess(abs(part - total * weight / sum(weights)), 1)
+            else:
+                self.assertEqual(parts, [0] * len(weights))
+
+    def test_deal_spreads_each_quota_over_the_bucket(self):
+        members = [array('q') for _ in range(2)]
+        _deal(list(range(6)), [2, 4], members, array('q', range(100, 106)))
+        self.assertEqual(sorted(members[0] + members[1]), list(range(100, 106)))
+        self.assertEqual((len(members[0]), len(members[1])), (2, 4))
+        # The smaller quota takes one student from each half of the bucket
+        self.assertLess(members[0][0], 103)
+        self.assertGreaterEqual(members[0][1], 103)
+
+
+class StableMatchingTests(SimpleTestCase):
+    def matching(self, rows, preferences, capacities, seed=None):
+        pool = StudentPool.from_rows(rows)
+        pool.preferences = PreferenceTable.from_rows(pool, preferences)
+        supervisors = SupervisorPool(range(1, len(capacities) + 1), capacities)
+        plan = allocate('preference', pool, len(capacities), seed=seed, supervisors=supervisors)
+        return plan, dict(zip(supervisors.ids, supervisors.resolved_capacities(len(capacities), len(pool))))
+
+    def test_stable_and_within_capacity(self):
+        rng = random.Random(21)
+        for trial in range(30):
+            rows = sample_pool(40, seed=trial)
+            preferences = [
+                (student_id, rng.sample(range(1, 6), rng.randint(0, 4))) for student_id, _ in rows
+            ]
+            plan, limits = self.matching(rows, preferences, [rng.choice([0, 4, 7, 10]) for _ in range(5)])
+            assigned = {
+                student_id: supervisor_id
+                for supervisor_id, members in zip(plan.supervisor_ids, plan.groups)
+                for student_id in members
+            }
+            members = dict(zip(plan.supervisor_ids, plan.groups))
+            cgpa = dict(rows)
+            with self.subTest(trial=trial):
+                for supervisor_id, group in members.items():
+                    self.assertLessEqual(len(group), limits[supervisor_id])
+                for student_id, ranking in preferences:
+                    current = assigned.get(student_id)
+                    better = ranking[:ranking.index(current)] if current in ranking else ranking
+                    for supervisor_id in better:
+                        held = members.get(supervisor_id, [])
+                        # Full, and every student held ranks at least as high
+                        self.assertEqual(len(held), limits[supervisor_id])
+                        self.assertTrue(all(
+                            (cgpa[other], -other) > (cgpa[student_id], -student_id) for other in held
+                        ))
+
+    def test_students_without_preferences_fall_back_by_cgpa(self):
+        rows = [(number, Decimal('2.00') + Decimal(number) / 10) for number in range(1, 11)]
+        # Students 1-4 fill supervisor 1; 7 of the other six fit in the three free places
+        preferences = [(number, [1]) for number in range(1, 5)]
+        plan, _ = self.matching(rows, preferences, [4, 2, 1])
+        members = dict(zip(plan.supervisor_ids, map(list, plan.groups)))
+        self.assertEqual(members[1], [1, 2, 3, 4])
+        self.assertEqual(sorted(members[2] + members[3]), [8, 9, 10])
+        # Best first, each into the supervisor with the most room relative to its limit
+        self.assertEqual((members[2], members[3]), ([8, 10], [9]))
+
+    def test_ties_are_deterministic(self):
+        rows = [(number, Decimal('3.00')) for number in range(1, 9)]
+        preferences = [(number, [1, 2]) for number in range(1, 9)]
+        plans = [self.matching(rows, preferences, [3, 3, 2], seed=seed)[0] for seed in (5, 5, 6)]
+        self.assertEqual(plans[0], plans[1])
+        self.assertEqual(plans[0], plans[2])
+        # Equal CGPAs rank by id, so the lowest ids get their first choice
+        self.assertEqual(list(plans[0].groups[0]), [1, 2, 3])
+        self.assertEqual(list(plans[0].groups[1]), [4, 5, 6])
+
+
+class PlaceIntoGroupsTests(SimpleTestCase):
+    def test_fills_the_smallest_groups_within_capacity(self):
+        pool = StudentPool.from_rows(sample_pool(3, seed=1))
+        plan = place_into_groups(pool, sizes=[5, 2, 3], sums=[1500, 600, 900], capacities=[0, 4, 0])
+        self.assertEqual([len(members) for members in plan.groups], [0, 2, 1])
+
+        pool = StudentPool.from_rows(sample_pool(6, seed=1))
+        plan = place_into_groups(pool, sizes=[5, 2, 3], sums=[1500, 600, 900], capacities=[0, 4, 0])
+        self.assertEqual([5 + len(plan.groups[0]), 2 + len(plan.groups[1]), 3 + len(plan.groups[2])], [6, 4, 6])
+
+    def test_leftovers_stay_unplaced_when_every_group_is_full(self):
+        rows = sample_pool(5, seed=1)
+        plan = place_into_groups(StudentPool.from_rows(rows), sizes=[3, 1], sums=[900, 300], capacities=[4, 3])
+        self.assertEqual([len(members) for members in plan.groups], [1, 2])
+        # The best students are placed first
+        placed = {student_id for members in plan.groups for student_id in members}
+        ranked = [student_id for student_id, _ in sorted(rows, key=lambda row: (-row[1], row[0]))]
+        self.assertEqual(placed, set(ranked[:3]))
+
+
+class SavePlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        school = School.objects.create(name='Save School', code='SS')
+        cls.department = Department.objects.create(school=school, name='Save', code='SV')
+        cls.supervisor_ids = [
+            Supervisor.objects.create(name=f'Dr {number}', department=cls.department).pk for number in range(8)
+        ]
+
+    def add_students(self, count, prefix):
+        for number in range(count):
+            Student.objects.create(
+                matric_no=f'{prefix}{number}', full_name=f'Student {prefix}{number}',
+                cgpa=Decimal('2.00') + Decimal(number) / 10, department=self.department,
+            )
+        return load_student_pool(self.department)
+
+    def save(self, pool, num_groups):
+        plan = allocate('balanced', pool, num_groups, seed=1)
+        return save_plan(plan, self.department, self.supervisor_ids[:num_groups], pool)
+
+    def test_query_count_does_not_depend_on_group_count(self):
+        pool = self.add_students(16, 'A')
+        with CaptureQueriesContext(connection) as two_groups:
+            self.save(pool, 2)
+
+        pool = self.add_students(16, 'B')
+        with self.assertNumQueries(len(two_groups)):
+            result, groups = self.save(pool, 8)
+        self.assertEqual((len(groups), result.student_count), (8, 16))
+        self.assertEqual(Group.students.through.objects.filter(group__allocation_result=result).count(), 16)
+
+
+class ConcurrentRunTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        school = School.objects.create(name='Job School', code='JS')
+        cls.department = Department.objects.create(school=school, name='Jobs', code='JB')
+        cls.other = Department.objects.create(school=school, name='Other', code='OT')
+        for department in (cls.department, cls.other):
+            for number in range(2):
+                Supervisor.objects.create(name=f'Dr {number}', department=department)
+            for number in range(6):
+                Student.objects.create(
+                    matric_no=f'{department.code}{number}', full_name=f'Student {number}',
+                    cgpa=Decimal('3.00'), department=department,
+                )
+
+    def queue(self, department):
+        return AllocationJob.objects.create(department=department, method='balanced', num_groups=2)
+
+    def test_one_running_job_per_department(self):
+        first, second, elsewhere = self.queue(self.department), self.queue(self.department), self.queue(self.other)
+        self.assertTrue(jobs.claim(first.pk))
+        self.assertFalse(jobs.claim(second.pk))
+        self.assertTrue(jobs.claim(elsewhere.pk))
+        self.assertFalse(jobs.claim(first.pk))
+
+        AllocationJob.objects.filter(pk=first.pk).update(status=AllocationJob.STATUS_SUCCEEDED)
+        self.assertTrue(jobs.claim(second.pk))
+
+    def test_stale_students_are_not_saved_twice(self):
+        pool = load_student_pool(self.department)
+        plan = allocate('balanced', pool, 2, seed=1)
+        # Another run places the same students after this one loaded them
+        execute_allocation(self.department, 'balanced', 2)
+        with self.assertRaises(AllocationError):
+            save_plan(plan, self.department, list(Supervisor.objects.filter(
+                department=self.department).values_list('pk', flat=True)), pool)
+        self.assertEqual(Group.objects.filter(department=self.department).count(), 2)
+        self.assertFalse(
+            Student.objects.filter(department=self.department).annotate(runs=Count('groups')).filter(runs__gt=1)
+        )
+
+    @override_settings(ALLOCATION_JOB_TIMEOUT_SECONDS=60)
+    def test_stale_running_jobs_fail(self):
+        stuck, recent = self.queue(self.department), self.queue(self.other)
+        AllocationJob.objects.filter(pk=stuck.pk).update(
+            status=AllocationJob.STATUS_RUNNING, started_at=timezone.now() - timedelta(minutes=5)
+        )
+        self.assertTrue(jobs.claim(recent.pk))
+        self.assertEqual(jobs.fail_stale_jobs(), 1)
+        stuck.refresh_from_db()
+        self.assertEqual((stuck.status, stuck.phase), (AllocationJob.STATUS_FAILED, 'failed'))
+        self.assertTrue(jobs.job_status(stuck)['finished'])
+        self.assertEqual(AllocationJob.objects.get(pk=recent.pk).status, AllocationJob.STATUS_RUNNING)
+
+        # A queued job of the stuck department can run again
+        stuck_again = self.queue(self.department)
+        AllocationJob.objects.filter(pk=stuck_again.pk).update(
+            status=AllocationJob.STATUS_RUNNING, started_at=timezone.now() - timedelta(minutes=5)
+        )
+        self.assertTrue(jobs.claim(self.queue(self.department).pk))
+
+
+    @override_settings(ALLOCATION_JOB_TIMEOUT_SECONDS=60)
+    def test_stale_queued_jobs_fail(self):
+        # The pool died before claiming it
+        abandoned, waiting, recent = self.queue(self.department), self.queue(self.other), self.queue(self.other)
+        AllocationJob.objects.filter(pk__in=[abandoned.pk, waiting.pk]).update(
+            created_at=timezone.now() - timedelta(minutes=5)
+        )
+        # Queued behind a job that is still running
+        AllocationJob.objects.filter(pk=recent.pk).update(
+            status=AllocationJob.STATUS_RUNNING, started_at=timezone.now()
+        )
+        self.assertEqual(jobs.fail_stale_jobs(), 1)
+        abandoned.refresh_from_db()
+        self.assertEqual((abandoned.status, abandoned.phase), (AllocationJob.STATUS_FAILED, 'failed'))
+        self.assertTrue(jobs.job_status(abandoned)['finished'])
+        self.assertEqual(AllocationJob.objects.get(pk=waiting.pk).status, AllocationJob.STATUS_QUEUED)
+
+
+class DryRunTestCase(TestCase):
+    """A department with unassigned students, for plans computed before saving."""
+
+    @classmethod
+    def setUpTestData(cls):
+        school = School.objects.create(name='Plan School', code='PS')
+        cls.department = Department.objects.create(school=school, name='Plans', code='PL')
+        for number in range(4):
+            Supervisor.objects.create(name=f'Dr {number}', max_students=10, department=cls.department)
+        for number, (_, cgpa) in enumerate(sample_pool(30, seed=2)):
+            Student.objects.create(
+                matric_no=f'P{number:02d}', full_name=f'Student {number}', cgpa=cgpa, department=cls.department
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def add_student(self, matric_no='LATE1'):
+        return Student.objects.create(
+            matric_no=matric_no, full_name='Late Student', cgpa=Decimal('3.10'), department=self.department
+        )
+
+    def saved_groups(self, allocation_result):
+        groups = allocation_result.groups.order_by('number').prefetch_related('students')
+        return [
+            (group.supervisor_id, sorted(student.pk for student in group.students.all())) for group in groups
+        ]
+
+
+class CompareAllocationsTests(DryRunTestCase):
+    def test_process_pool_matches_in_process(self):
+        in_process = compare_allocations(self.department, 3, seeds=2, workers=1)['candidates']
+        pooled = compare_allocations(self.department, 3, seeds=2, workers=2)['candidates']
+        self.assertEqual(
+            [(candidate['method'], candidate['seed'], candidate['score']) for candidate in pooled],
+            [(candidate['method'], candidate['seed'], candidate['score']) for candidate in in_process],
+        )
+        # heap_balanced shuffles member order without a seed; compare who is in which group
+        self.assertEqual(
+            [[sorted(members) for members in candidate['plan'].groups] for candidate in pooled],
+            [[sorted(members) for members in candidate['plan'].groups] for candidate in in_process],
+        )
+
+    def test_requests_compare_in_process_by_default(self):
+        with mock.patch('allocation.engine.compare.ProcessPoolExecutor') as executor:
+            comparison = compare_allocations(self.department, 3, seeds=2)
+        executor.assert_not_called()
+        self.assertTrue(comparison['candidates'])
+
+    def test_commit_saves_the_chosen_plan(self):
+        comparison = compare_allocations(self.department, 3, seeds=2, workers=1)
+        chosen = comparison['candidates'][2]
+        result = commit_compared_plan(self.department, comparison['token'], 2)
+        self.assertEqual(result.method, chosen['plan'].method)
+        self.assertEqual(
+            self.saved_groups(result),
+            [
+                (supervisor_id, sorted(members))
+                for supervisor_id, members in zip(chosen['supervisor_ids'], chosen['plan'].groups)
+            ],
+        )
+        # The token is spent
+        with self.assertRaises(AllocationError):
+            commit_compared_plan(self.department, comparison['token'], 0)
+
+    def test_stale_or_foreign_tokens_are_rejected(self):
+        comparison = compare_allocations(self.department, 3, seeds=1, workers=1)
+        other = Department.objects.create(school=self.department.school, name='Other', code='OP')
+        with self.assertRaisesMessage(AllocationError, 'expired'):
+            commit_compared_plan(other, comparison['token'], 0)
+        with self.assertRaisesMessage(AllocationError, 'expired'):
+            commit_compared_plan(self.department, 'not-a-token', 0)
+
+        self.add_student()
+        with self.assertRaisesMessage(AllocationError, 'changed'):
+            commit_compared_plan(self.department, comparison['token'], 0)
+        self.assertFalse(AllocationResult.objects.filter(department=self.department).exists())
+
+
+class RunCsvTests(DryRunTestCase):
+    def test_members_are_listed_highest_cgpa_first(self):
+        execute_allocation(self.department, 'balanced', 3)
+        allocation = AllocationResult.objects.get(department=self.department)
+        cgpas = dict(Student.objects.values_list('matric_no', 'cgpa'))
+        rows = list(exports.allocation_rows(allocation, self.department))
+        self.assertEqual(len(rows), 30)
+        self.assertEqual(
+            rows, sorted(rows, key=lambda row: (int(row[0].split()[1]), -cgpas[row[2]], row[2]))
+        )
+
+class RosterArchiveTests(DryRunTestCase):
+    def test_archive_holds_each_groups_roster(self):
+        execute_allocation(self.department, 'balanced', 3)
+        allocation = AllocationResult.objects.get(department=self.department)
+        # Numbers can repeat, e.g. after a group was renumbered by hand
+        allocation.groups.filter(number=3).update(number=1)
+        groups = list(allocation.groups.order_by('number', 'id'))
+
+        data = b''.join(exports.roster_archive(allocation, self.department))
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            index = list(csv.reader(io.StringIO(archive.read('index.csv').decode())))
+            self.assertEqual(index[0], exports.INDEX_HEADER)
+            self.assertEqual([row[0] for row in index[1:]], ['Group 1', 'Group 1', 'Group 2'])
+            self.assertEqual(sorted(archive.namelist()), sorted(['index.csv'] + [row[5] for row in index[1:]]))
+            for group, row in zip(groups, index[1:]):
+                members = sorted(group.students.values_list('matric_no', flat=True))
+                roster = list(csv.reader(io.StringIO(archive.read(row[5]).decode())))
+                self.assertEqual(roster[0], exports.ROSTER_HEADER)
+                self.assertEqual([member[0] for member in roster[1:]], members)
+                self.assertEqual(int(row[3]), len(members))
+
+
+class PreviewAllocationTests(DryRunTestCase):
+    def test_cache_hit_returns_the_same_plan(self):
+        first = preview_allocation(self.department, 'random', 3)
+        second = preview_allocation(self.department, 'random', 3)
+        self.assertEqual((first['cached'], second['cached']), (False, True))
+        self.assertEqual(second['plan'], first['plan'])
+        self.assertEqual(second['fingerprint'], first['fingerprint'])
+        self.assertFalse(preview_allocation(self.department, 'random', 2)['cached'])
+
+    def test_student_changes_change_the_fingerprint(self):
+        fingerprint = preview_allocation(self.department, 'balanced', 3)['fingerprint']
+        student = self.add_student()
+        added = preview_allocation(self.department, 'balanced', 3)
+        self.assertFalse(added['cached'])
+        self.assertNotEqual(added['fingerprint'], fingerprint)
+
+        student.cgpa = Decimal('4.80')
+        student.save()
+        edited = preview_allocation(self.department, 'balanced', 3)
+        self.assertFalse(edited['cached'])
+        self.assertNotEqual(edited['fingerprint'], added['fingerprint'])
+
+        Supervisor.objects.filter(department=self.department).update(max_students=12)
+        self.assertNotEqual(preview_allocation(self.department, 'balanced', 3)['fingerprint'], edited['fingerprint'])
+
+    def test_commit_saves_the_preview_unless_stale(self):
+        preview = preview_allocation(self.department, 'balanced', 3)
+        self.add_student()
+        with self.assertRaisesMessage(AllocationError, 'changed'):
+            commit_preview(self.department, 'balanced', 3, 0, preview['fingerprint'])
+        self.assertFalse(AllocationResult.objects.filter(department=self.department).exists())
+
+        preview = preview_allocation(self.department, 'balanced', 3)
+        result = commit_preview(self.department, 'balanced', 3, 0, preview['fingerprint'])
+        self.assertEqual(
+            self.saved_groups(result),
+            [
+                (supervisor_id, sorted(members))
+                for supervisor_id, members in zip(preview['supervisor_ids'], preview['plan'].groups)
+            ],
+        )
+
+
+class ExtendAllocationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        school = School.objects.create(name='Extend School', code='ES')
+        cls.department = Department.objects.create(school=school, name='Extend', code='EX')
+        cls.ada = Supervisor.objects.create(name='Dr Ada', department=cls.department)
+        cls.ben = Supervisor.objects.create(name='Dr Ben', department=cls.department)
+
+    def add_students(self, count, prefix):
+        for number in range(count):
+            Student.objects.create(
+                matric_no=f'{prefix}{number}', full_name=f'Student {prefix}{number}',
+                cgpa=Decimal('2.50') + Decimal(number) / 10, department=self.department,
+            )
+
+    def test_limits_count_earlier_runs(self):
+        self.add_students(8, 'A')
+        execute_allocation(self.department, 'balanced', 2)
+        self.add_students(4, 'B')
+        latest = execute_allocation(self.department, 'balanced', 2)['allocation_result']
+
+        # Four in the first run and two in the latest: Dr Ada is at her limit
+        Supervisor.objects.filter(pk=self.ada.pk).update(max_students=6)
+        self.add_students(6, 'C')
+        summary = extend_latest_allocation(self.department)
+        self.assertEqual((summary['students_allocated'], summary['students_unallocated']), (6, 0))
+        sizes = dict(latest.groups.values_list('supervisor_id', 'student_count'))
+        self.assertEqual(sizes, {self.ada.pk: 2, self.ben.pk: 8})
+
+        Supervisor.objects.filter(pk=self.ada.pk).update(max_students=7)
+        Supervisor.objects.filter(pk=self.ben.pk).update(max_students=13)
+        self.add_students(3, 'D')
+        summary = extend_latest_allocation(self.department)
+        self.assertEqual((summary['students_allocated'], summary['students_unallocated']), (2, 1))
+        sizes = dict(latest.groups.values_list('supervisor_id', 'student_count'))
+        self.assertEqual(sizes, {self.ada.pk: 3, self.ben.pk: 9})
+
+
+class SupervisorLoadTests(TestCase):
+    """``max_students`` counts the students a supervisor has from earlier runs."""
+
+    @classmethod
+    def setUpTestData(cls):
+        school = School.objects.create(name='Load School', code='LS')
+        cls.department = Department.objects.create(school=school, name='Load', code='LD')
+        cls.ada = Supervisor.objects.create(name='Dr Ada', max_students=6, department=cls.department)
+        cls.ben = Supervisor.objects.create(name='Dr Ben', max_students=10, department=cls.department)
+
+    def add_students(self, count, prefix):
+        return [
+            Student.objects.create(
+                matric_no=f'{prefix}{number}', full_name=f'Student {prefix}{number}',
+                cgpa=Decimal('2.50') + Decimal(number) / 10, department=self.department,
+            )
+            for number in range(count)
+        ]
+
+    def loads(self):
+        loads = defaultdict(int)
+        for supervisor_id, size in Group.objects.filter(department=self.department).values_list(
+            'supervisor_id', 'student_count'
+        ):
+            loads[supervisor_id] += size
+        return dict(loads)
+
+    def setUp(self):
+        # Four students each from an earlier run
+        self.add_students(8, 'A')
+        execute_allocation(self.department, 'balanced', 2)
+        self.add_students(10, 'B')
+
+    def test_capacity_strategy_counts_earlier_runs(self):
+        summary = execute_allocation(self.department, 'capacity', 2)
+        self.assertEqual((summary['students_allocated'], summary['students_unallocated']), (8, 2))
+        self.assertEqual(self.loads(), {self.ada.pk: 6, self.ben.pk: 10})
+
+    def test_full_supervisors_get_no_group(self):
+        Supervisor.objects.filter(pk=self.ada.pk).update(max_students=4)
+        with self.assertRaisesMessage(AllocationError, 'cannot exceed number of supervisors (1)'):
+            execute_allocation(self.department, 'capacity', 2)
+        summary = execute_allocation(self.department, 'capacity', 1)
+        self.assertEqual(summary['students_allocated'], 6)
+        self.assertEqual(self.loads(), {self.ada.pk: 4, self.ben.pk: 10})
+
+    def test_preference_strategy_counts_earlier_runs(self):
+        # Every new student ranks Dr Ada first, who has room for two more
+        for student in Student.objects.filter(groups__isnull=True):
+            SupervisorPreference.objects.create(student=student, ranking=[self.ada.pk, self.ben.pk])
+        summary = execute_allocation(self.department, 'preference', 2)
+        self.assertEqual(summary['students_allocated'], 8)
+        self.assertEqual(self.loads(), {self.ada.pk: 6, self.ben.pk: 10})
+
+
+class AllocateDepartmentsCommandTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        school = School.objects.create(name='Batch School', code='BS')
+        cls.departments = [
+            Department.objects.create(school=school, name=f'Batch {code}', code=code) for code in ('BA', 'BB')
+        ]
+        for department in cls.departments:
+            for number in range(2):
+                Supervisor.objects.create(name=f'Dr {number}', department=department)
+            for number in range(6):
+                Student.objects.create(
+                    matric_no=f'{department.code}{number}', full_name=f'Student {number}',
+                    cgpa=Decimal('3.00'), department=department,
+                )
+        cls.empty = Department.objects.create(school=school, name='Batch Empty', code='BE')
+
+    def test_each_department_gets_a_run(self):
+        stdout = io.StringIO()
+        call_command('allocate_departments', school=['BS'], workers=1, stdout=stdout)
+        for department in self.departments:
+            result = AllocationResult.objects.get(department=department)
+            self.assertEqual(result.groups.count(), 2)
+            self.assertFalse(Student.objects.filter(department=department, groups__isnull=True).exists())
+        self.assertFalse(AllocationResult.objects.filter(department=self.empty).exists())
+        output = stdout.getvalue()
+        self.assertIn(f'{self.empty}: skipped', output)
+        self.assertIn('2 departments allocated (12 students), 1 skipped, 0 failed', output)
+
+class OutboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        school = School.objects.create(name='Mail School', code='MS')
+        cls.department = Department.objects.create(school=school, name='Mail', code='ML')
+        for number in range(2):
+            Supervisor.objects.create(name=f'Dr {number}', email=f'dr{number}@example.com', department=cls.department)
+        for number in range(6):
+            Student.objects.create(
+                matric_no=f'M{number}', full_name=f'Student {number}', cgpa=Decimal('3.00'),
+                email=UNREACHABLE if number == 0 else f'student{number}@example.com' if number < 5 else '',
+                department=cls.department,
+            )
+
+    def allocate(self):
+        return execute_allocation(self.department, 'balanced', 2, send_notifications=True)
+
+    def test_allocation_queues_instead_of_sending(self):
+        summary = self.allocate()
+        # Two supervisors and the five students with an address
+        self.assertEqual(summary['emails_queued'], 7)
+        self.assertEqual(EmailOutbox.objects.filter(status=EmailOutbox.STATUS_PENDING).count(), 7)
+        self.assertEqual(mail.outbox, [])
+
+    def test_drain_sends_and_records_each_recipient(self):
+        self.allocate()
+        EmailOutbox.objects.filter(to_email=UNREACHABLE).delete()
+        counts = outbox.drain(workers=1, batch_size=4)
+        self.assertEqual(counts, {'sent': 6, 'retrying': 0, 'failed': 0})
+        self.assertEqual(len(mail.outbox), 6)
+        self.assertFalse(EmailOutbox.objects.exclude(status=EmailOutbox.STATUS_SENT).exists())
+
+        supervisor_mail = next(message for message in mail.outbox if message.to == ['dr0@example.com'])
+        self.assertEqual(supervisor_mail.attachments[0][0], 'group_1_students.csv')
+        self.assertEqual(outbox.drain(workers=1), {'sent': 0, 'retrying': 0, 'failed': 0})
+
+    @override_settings(
+        EMAIL_BACKEND='allocation.tests.FlakyBackend', EMAIL_OUTBOX_MAX_ATTEMPTS=2, EMAIL_OUTBOX_RETRY_SECONDS=60
+    )
+    def test_failures_back_off_then_give_up(self):
+        self.allocate()
+        with self.assertLogs('allocation.outbox', 'WARNING'):
+            self.assertEqual(outbox.drain(workers=1), {'sent': 6, 'retrying': 1, 'failed': 0})
+        row = EmailOutbox.objects.get(to_email=UNREACHABLE)
+        self.assertEqual((row.status, row.attempts), (EmailOutbox.STATUS_PENDING, 1))
+        self.assertIn('mailbox unavailable', row.last_error)
+        self.assertGreater(row.next_attempt_at, timezone.now() + timedelta(seconds=50))
+
+        # Not due yet
+        self.assertEqual(outbox.drain(workers=1)['retrying'], 0)
+        EmailOutbox.objects.filter(pk=row.pk).update(next_attempt_at=timezone.now())
+        with self.assertLogs('allocation.outbox', 'WARNING'):
+            self.assertEqual(outbox.drain(workers=1), {'sent': 0, 'retrying': 0, 'failed': 1})
+        self.assertEqual(EmailOutbox.objects.get(pk=row.pk).status, EmailOutbox.STATUS_FAILED)
+
+    @override_settings(EMAIL_BACKEND='allocation.tests.FlakyBackend', EMAIL_OUTBOX_RETRY_SECONDS=60)
+    def test_retries_are_drained_on_a_timer(self):
+        self.assertIsNone(outbox.schedule_retry())
+        self.allocate()
+        with self.assertLogs('allocation.outbox', 'WARNING'):
+            outbox.drain(workers=1)
+        with mock.patch('allocation.outbox.threading.Timer') as timer, \
+                mock.patch.object(outbox, '_retry_timer', None):
+            delay = outbox.schedule_retry()
+            self.assertAlmostEqual(delay, 60, delta=5)
+            timer.assert_called_once()
+            self.assertEqual(timer.call_args.args[0], delay)
+            timer.return_value.start.assert_called_once()
+
+            # A timer that fires by then is kept
+            timer.return_value.is_alive.return_value = True
+            outbox.schedule_retry()
+            timer.assert_called_once()
+
+    def test_claimed_rows_are_not_claimed_twice(self):
+        self.allocate()
+        first = outbox.claim_batch(5)
+        second = outbox.claim_batch(5)
+        self.assertEqual((len(first), len(second)), (5, 2))
+        self.assertFalse({row.pk for row in first} & {row.pk for row in second})
+        self.assertEqual(outbox.claim_batch(5), [])
+
+    def test_rate_limiter_spaces_sends(self):
+        limiter = outbox.RateLimiter(50)
+        started = time.monotonic()
+        for _ in range(4):
+            limiter.wait()
+        self.assertGreaterEqual(time.monotonic() - started, 0.055)
+
+
+class StudentNotificationTests(SimpleTestCase):
+    def test_matches_a_full_render(self):
+        group = Group(number=4)
+        supervisor = Supervisor(name='Dr <Quote> & "Co"', email='dr@example.com')
+        notification = StudentNotification(group, supervisor, 'Meet on Monday\nRoom 2 & 3')
+        self.assertIsNotNone(notification.html_parts)
+        self.assertIsNotNone(notification.text_parts)
+        for student in (
+            Student(full_name="O'Brien <b>", matric_no='M&1', cgpa=Decimal('3.50')),
+            Student(full_name='', matric_no='M2', cgpa=Decimal('4.00')),
+        ):
+            context = {
+                'group': group, 'supervisor': supervisor, 'body': 'Meet on Monday\nRoom 2 & 3',
+                'recipient': recipient(student),
+            }
+            self.assertEqual(
+                notification.render(student),
+                (render_to_string(STUDENT_TEXT, context), render_to_string(STUDENT_HTML, context)),
+            )
+
+    def assert_renders_like_templates(self, sources, students):
+        """Render ``sources`` (name -> template text) as the student e-mail via StudentNotification."""
+        templates = {'test/base.html': '<p>{% block body %}{% endblock %}</p>', **sources}
+        loaders = [('django.template.loaders.locmem.Loader', templates)]
+        with override_settings(TEMPLATES=[{
+            'BACKEND': 'django.template.backends.django.DjangoTemplates', 'OPTIONS': {'loaders': loaders},
+        }]), mock.patch('allocation.notifications.STUDENT_HTML', 'test/student.html'), \
+                mock.patch('allocation.notifications.STUDENT_TEXT', 'test/student.txt'):
+            group, supervisor = Group(number=1), Supervisor(name='Dr A')
+            notification = StudentNotification(group, supervisor, '')
+            for student in students:
+                context = {'group': group, 'supervisor': supervisor, 'body': '', 'recipient': recipient(student)}
+                self.assertEqual(
+                    notification.render(student),
+                    (render_to_string('test/student.txt', context), render_to_string('test/student.html', context)),
+                )
+        return notification
+
+    def students(self):
+        return [
+            Student(full_name='Ada', matric_no='M1', cgpa=Decimal('3.20')),
+            Student(full_name='Ben', matric_no='M2', cgpa=Decimal('4.75')),
+        ]
+
+    def test_filtered_and_conditional_fields_render_per_student(self):
+        template = (
+            'CGPA {{ recipient.cgpa|floatformat:1 }}{% if recipient.cgpa >= 4.5 %} First class!{% endif %}'
+            ' Hi {{ recipient.name }}'
+        )
+        notification = self.assert_renders_like_templates(
+            {'test/student.txt': template, 'test/student.html': template}, self.students()
+        )
+        self.assertIsNone(notification.text_parts)
+        self.assertIn('First class!', notification.render(self.students()[1])[0])
+
+    def test_fields_in_a_parent_template_are_checked(self):
+        notification = self.assert_renders_like_templates({
+            'test/student.txt': 'Hi {{ recipient.name }}',
+            'test/student.html': '{% extends "test/base.html" %}{% block body %}{{ recipient.name }}{% endblock %}',
+            'test/base.html': '{% if recipient.cgpa > 4 %}Top{% endif %}{% block body %}{% endblock %}',
+        }, self.students())
+        self.assertIsNone(notification.html_parts)
+
+    def test_plain_fields_use_slots(self):
+        notification = self.assert_renders_like_templates({
+            'test/student.txt': 'Hi {{ recipient.name }} ({{ recipient.matric_no }})',
+            'test/student.html': '{% extends "test/base.html" %}{% block body %}{{ recipient.cgpa }}{% endblock %}',
+        }, self.students())
+        self.assertIsNotNone(notification.text_parts)
+        self.assertIsNotNone(notification.html_parts)
 
-# Create your tests here.
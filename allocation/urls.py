@@ -5,11 +5,21 @@ app_name = 'allocation'
 
 urlpatterns = [
     path('run/', views.run_allocation, name='run'),
+    path('extend/', views.extend_allocation, name='extend'),
+    path('preview/', views.preview, name='preview'),
+    path('preview/commit/', views.commit_preview_plan, name='commit_preview'),
+    path('compare/', views.compare_allocation, name='compare'),
+    path('compare/commit/', views.commit_plan, name='commit_plan'),
     path('results/', views.allocation_results, name='results'),
     path('download-csv/', views.download_csv, name='download_csv'),
     path('download-csv/<int:pk>/', views.download_csv, name='download_csv'),
+    path('download-csv/history/', views.download_history_csv, name='download_history_csv'),
+    path('download-rosters/', views.download_rosters, name='download_rosters'),
+    path('download-rosters/<int:pk>/', views.download_rosters, name='download_rosters'),
     path('detail/<int:pk>/', views.allocation_detail, name='detail'),
+    path('groups/<int:pk>/roster/', views.group_roster, name='group_roster'),
     path("send-group-email/", views.send_group_email, name="send_group_email"),
+    path('jobs/<int:pk>/status/', views.job_status, name='job_status'),
 
 
 ]
\ No newline at end of file
@@ -1,23 +1,35 @@
-import io
+import hashlib
 import json
 
 from django.contrib.auth.decorators import login_required
-from django.core.mail import EmailMultiAlternatives, get_connection
-from django.db.models import Count, Avg
+from django.core.mail import get_connection
+from django.db.models import Prefetch
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django.views.decorators.http import require_POST
-from nacos_allocation import settings
+from frontend.cache import cached, versioned_key
+from frontend.stats import department_stats
+from frontend.pagination import KeysetPaginator
 from students.models import Student
 from supervisors.models import Supervisor
-from .models import Group, AllocationResult
-from .forms import AllocationForm
-import csv
-import random
-from collections import defaultdict
+from . import exports, jobs, outbox
+from .engine import FIXED_ASSIGNMENT_STRATEGIES
+from .models import Group, AllocationResult, AllocationJob
+from .forms import AllocationForm, CommitPlanForm, CommitPreviewForm, CompareForm
+from .services import (
+    AllocationError,
+    check_allocation_inputs,
+    commit_compared_plan,
+    commit_preview,
+    compare_allocations,
+    extend_latest_allocation,
+    preview_allocation,
+)
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 
 import logging
@@ -35,144 +47,187 @@ def run_allocation(request):
             send_notifications = form.cleaned_data.get('send_notifications', False)
             department = request.user.department
 
-            # Get only students from the user's department who are not already in any group
-            unassigned_students = list(Student.objects.filter(
-                department=department,
-                groups__isnull=True
-            ))
-
-            # CHANGE: Only get supervisors from the user's department, not all supervisors
-            supervisors = list(Supervisor.objects.filter(department=department))
-
-            if len(unassigned_students) == 0 or len(supervisors) == 0:
-                messages.error(request, 'Need at least 1 unassigned student and 1 supervisor to run allocation.')
-                return redirect('allocation:run')
-
-            if num_groups > len(supervisors):
-                messages.error(request, f'Number of groups cannot exceed number of supervisors ({len(supervisors)}).')
+            # Cheap up-front checks so obvious mistakes are reported immediately;
+            # the job re-checks against the data it actually loads.
+            try:
+                check_allocation_inputs(
+                    Student.objects.filter(department=department, groups__isnull=True).count(),
+                    Supervisor.objects.filter(department=department).count(),
+                    num_groups,
+                )
+            except AllocationError as exc:
+                messages.error(request, str(exc))
                 return redirect('allocation:run')
 
-            # CHANGE: Filter used supervisors by department as well
-            used_supervisor_ids = set(Group.objects.filter(
-                department=department
-            ).values_list('supervisor_id', flat=True))
-
-            unused_supervisors = [s for s in supervisors if s.id not in used_supervisor_ids]
-
-            # If we have unused supervisors, use them first
-            if unused_supervisors:
-                available_supervisors = unused_supervisors + [s for s in supervisors if s.id in used_supervisor_ids]
-            else:
-                available_supervisors = supervisors
-
-            # Perform allocation based on method
-            if method == 'grade_based':
-                groups = grade_based_allocation(unassigned_students, available_supervisors, num_groups)
-            elif method == 'random':
-                groups = random_allocation(unassigned_students, available_supervisors, num_groups)
-            else:  # balanced
-                groups = balanced_allocation(unassigned_students, available_supervisors, num_groups)
-
-            # Save allocation results
-            allocation_result = AllocationResult.objects.create(
+            # Load, allocate, persist and notify run out-of-band; the page polls job_status.
+            job = AllocationJob.objects.create(
+                department=department,
+                requested_by=request.user,
                 method=method,
-                num_groups=num_groups
+                num_groups=num_groups,
+                send_notifications=send_notifications,
+                optimize_ms=form.cleaned_data['optimize_budget_ms'] if form.cleaned_data.get('optimize') else 0,
             )
+            jobs.submit(job)
 
-            created_groups = []
-            for group_data in groups:
-                group = Group.objects.create(
-                    number=group_data['number'],
-                    supervisor=group_data['supervisor'],
-                    allocation_result=allocation_result,
-                    department=department
-                )
-                group.students.set(group_data['students'])
-                created_groups.append(group)
-
-            # Send notifications if requested
-            email_results = []
-            if send_notifications:
-                subject = "Project Group Allocation Notification"
-                body = "You have been allocated to a project group. Please check the system for details."
-
-                for group in created_groups:
-                    result = send_emails_for_group(group, subject, body)
-                    email_results.append(result)
-
-                # Count successful emails
-                successful_groups = sum(1 for r in email_results if r['success'])
-                successful_students = sum(r['students_sent'] for r in email_results)
-
-                messages.success(request,
-                                 f'Successfully allocated {len(unassigned_students)} students into {num_groups} groups. '
-                                 f'Email notifications sent for {successful_groups} groups ({successful_students} students).'
-                                 )
-            else:
-                messages.success(request,
-                                 f'Successfully allocated {len(unassigned_students)} students into {num_groups} groups.'
-                                 )
-
-            return redirect('allocation:results')
+            return redirect(f"{reverse('allocation:run')}?job={job.pk}")
     else:
         form = AllocationForm()
 
-    # Get counts for the template - filter by department
+    # Counts for the template, cached until the department's data changes
     department = request.user.department
-    total_students = Student.objects.filter(department=department).count()
-    unassigned_students_count = Student.objects.filter(
-        department=department, groups__isnull=True
-    ).count()
-
-    # CHANGE: Only count supervisors from the user's department
-    total_supervisors = Supervisor.objects.filter(department=department).count()
+    summary = cached(department, 'run-summary', lambda: {
+        'stats': department_stats(department),
+        'previous_allocations': list(
+            AllocationResult.objects.filter(department=department).order_by('-created_at')[:5]
+        ),
+    })
 
-    previous_allocations = AllocationResult.objects.filter(
-        groups__department=department
-    ).distinct().order_by('-created_at')[:5]
+    job = None
+    job_id = request.GET.get('job')
+    if job_id and job_id.isdigit():
+        job = AllocationJob.objects.filter(pk=job_id, department=department).first()
 
+    stats = summary['stats']
     return render(request, 'allocation/run.html', {
         'form': form,
-        'total_students': total_students,
-        'unassigned_students_count': unassigned_students_count,
-        'total_supervisors': total_supervisors,
-        'previous_allocations': previous_allocations,
+        'job': job,
+        'total_students': stats.total_students,
+        'unassigned_students_count': stats.unassigned_students,
+        'total_supervisors': stats.total_supervisors,
+        'previous_allocations': summary['previous_allocations'],
     })
 
 
-def grade_based_allocation(students, supervisors, num_groups):
-    # Sort students by cgpa (highest first)
-    students_sorted = sorted(students, key=lambda s: s.cgpa, reverse=True)
+@login_required(login_url='/login/')
+@require_POST
+def extend_allocation(request):
+    """Add late-registered (unassigned) students to the latest allocation's groups."""
+    try:
+        summary = extend_latest_allocation(request.user.department)
+    except AllocationError as exc:
+        messages.error(request, str(exc))
+        return redirect('allocation:run')
+
+    message = (
+        f"Added {summary['students_allocated']} students to the "
+        f"{summary['num_groups']} groups of the latest allocation."
+    )
+    if summary['students_unallocated']:
+        message += (
+            f" {summary['students_unallocated']} students could not be placed "
+            f"because supervisor capacity ran out."
+        )
+    messages.success(request, message)
+    return redirect('allocation:detail', pk=summary['allocation_result'].pk)
 
-    # Initialize groups
-    groups = []
-    for i in range(num_groups):
-        groups.append({
-            'number': i + 1,
-            'supervisor': supervisors[i % len(supervisors)],
-            'students': []
-        })
 
-    # First, assign at least 3 First-Class students to each group (if available)
-    first_class_students = [s for s in students_sorted if s.cgpa >= 4.50]  # First class based on CGPA
+@login_required(login_url='/login/')
+def preview(request):
+    """
+    Show the plan a run with these settings would save, without saving it.
+    GET so the preview can be re-opened; unchanged inputs come from cache.
+    """
+    form = AllocationForm(request.GET)
+    if not form.is_valid():
+        messages.error(request, 'Please choose a method and a valid number of groups.')
+        return redirect('allocation:run')
+
+    method = form.cleaned_data['allocation_method']
+    num_groups = form.cleaned_data['num_groups']
+    optimize_ms = form.cleaned_data['optimize_budget_ms'] if form.cleaned_data.get('optimize') else 0
+    department = request.user.department
 
-    for i in range(min(3 * num_groups, len(first_class_students))):
-        group_idx = i % num_groups
-        groups[group_idx]['students'].append(first_class_students[i])
+    try:
+        result = preview_allocation(department, method, num_groups, optimize_ms=optimize_ms)
+    except AllocationError as exc:
+        messages.error(request, str(exc))
+        return redirect('allocation:run')
 
-    # Remove assigned students
-    assigned_students = set()
-    for group in groups:
-        assigned_students.update(group['students'])
+    supervisor_names = dict(
+        Supervisor.objects.filter(id__in=result['supervisor_ids']).values_list('id', 'name')
+    )
+    for group in result['groups']:
+        group['supervisor_name'] = supervisor_names.get(group['supervisor_id'], '')
+
+    return render(request, 'allocation/preview.html', {
+        'preview': result,
+        'method': method,
+        'method_label': dict(AllocationForm.ALLOCATION_METHODS)[method],
+        'num_groups': num_groups,
+        'optimize_ms': optimize_ms if method not in FIXED_ASSIGNMENT_STRATEGIES else 0,
+    })
 
-    remaining_students = [s for s in students_sorted if s not in assigned_students]
 
-    # Distribute remaining students round-robin
-    for i, student in enumerate(remaining_students):
-        group_idx = i % num_groups
-        groups[group_idx]['students'].append(student)
+@login_required(login_url='/login/')
+@require_POST
+def commit_preview_plan(request):
+    """Persist the plan shown by the preview page."""
+    form = CommitPreviewForm(request.POST)
+    if not form.is_valid():
+        return HttpResponseBadRequest("Invalid preview.")
 
-    return groups
+    try:
+        allocation_result = commit_preview(
+            request.user.department,
+            form.cleaned_data['allocation_method'],
+            form.cleaned_data['num_groups'],
+            form.cleaned_data['optimize_ms'],
+            form.cleaned_data['fingerprint'],
+        )
+    except AllocationError as exc:
+        messages.error(request, str(exc))
+        return redirect('allocation:run')
+
+    messages.success(request, f'Saved allocation with {allocation_result.num_groups} groups.')
+    return redirect('allocation:detail', pk=allocation_result.pk)
+
+
+@login_required(login_url='/login/')
+@require_POST
+def compare_allocation(request):
+    """Rank every strategy on the current unassigned students without saving anything."""
+    form = CompareForm(request.POST)
+    if not form.is_valid():
+        messages.error(request, 'Please enter a valid number of groups.')
+        return redirect('allocation:run')
+
+    try:
+        comparison = compare_allocations(request.user.department, form.cleaned_data['num_groups'])
+    except AllocationError as exc:
+        messages.error(request, str(exc))
+        return redirect('allocation:run')
+
+    method_labels = dict(AllocationForm.ALLOCATION_METHODS)
+    for candidate in comparison['candidates']:
+        candidate['label'] = method_labels.get(candidate['method'], candidate['method'])
+
+    return render(request, 'allocation/compare.html', {
+        'token': comparison['token'],
+        'candidates': comparison['candidates'],
+        'num_groups': form.cleaned_data['num_groups'],
+    })
+
+
+@login_required(login_url='/login/')
+@require_POST
+def commit_plan(request):
+    """Persist one of the plans shown by compare_allocation."""
+    form = CommitPlanForm(request.POST)
+    if not form.is_valid():
+        return HttpResponseBadRequest("Invalid plan.")
+
+    try:
+        allocation_result = commit_compared_plan(
+            request.user.department, form.cleaned_data['token'], form.cleaned_data['index']
+        )
+    except AllocationError as exc:
+        messages.error(request, str(exc))
+        return redirect('allocation:run')
+
+    method_label = dict(AllocationForm.ALLOCATION_METHODS).get(allocation_result.method, allocation_result.method)
+    messages.success(request, f'Saved {method_label} plan with {allocation_result.num_groups} groups.')
+    return redirect('allocation:detail', pk=allocation_result.pk)
 
 
 @login_required(login_url='/login/')
@@ -181,54 +236,73 @@ def allocation_results(request):
 
     groups_qs = (
         Group.objects
-        .filter(department=department)
+        .filter(department=department, allocation_result__isnull=False)
         .select_related('supervisor', 'allocation_result')
-        .prefetch_related('students')
-        .annotate(
-            total_students=Count('students', distinct=True),
-            average_cgpa=Avg('students__cgpa'),
-        )
-        .order_by('-allocation_result__created_at', 'number')
     )
 
-    paginator = Paginator(groups_qs, 20)
-    page = request.GET.get('page')
-
-    try:
-        groups = paginator.page(page)
-    except PageNotAnInteger:
-        groups = paginator.page(1)
-    except EmptyPage:
-        groups = paginator.page(paginator.num_pages)
+    # Newest run first; keyset pages so deep pages cost the same as the first
+    paginator = KeysetPaginator(
+        groups_qs, ['-allocation_result__created_at', 'number'], 20,
+        count_key=versioned_key(department, 'groups:count')
+    )
+    groups = paginator.page(request.GET.get('cursor'))
 
     return render(request, 'allocation/results.html', {
         'groups': groups,
-        'total_groups': groups_qs.count(),
-        'total_students': Student.objects.filter(department=department).count(),
+        'total_groups': groups.count,
+        'total_students': department_stats(department).total_students,
         'total_supervisors': Supervisor.objects.count(),
     })
 
 
+def run_validators(allocation, *extra):
+    """
+    Strong ETag and Last-Modified for a response built only from ``allocation``
+    (plus ``extra`` parts, e.g. the user for pages that show their name).
+    """
+    etag = quote_etag(':'.join([allocation.version, *map(str, extra)]))
+    return etag, int(allocation.updated_at.timestamp())
+
+
+def session_tag(request):
+    """
+    Short digest of the session key, for ETags of pages with forms: the key
+    changes at every login, and so does the CSRF token the page embeds.
+    """
+    key = request.session.session_key or ''
+    return hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+
+
+def conditional_run_response(request, allocation, build, *extra):
+    """
+    Answer 304 if the client's copy of this run's response is current,
+    otherwise ``build()`` it; either way with the run's validators.
+    """
+    etag, last_modified = run_validators(allocation, *extra)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = build()
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Per-user pages: revalidate every time, never share.
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 # allocation/views.py
+@login_required(login_url='/login/')
 def download_csv(request, pk=None):
     """
     If pk is provided, download that AllocationResult's CSV.
     If pk is None, download the latest AllocationResult.
+    The file is streamed (see allocation.exports).
     """
     department = request.user.department
 
     if pk is not None:
-        # Fix: Use distinct() to avoid duplicate AllocationResult objects
-        allocation = get_object_or_404(
-            AllocationResult.objects.filter(
-                groups__department=department
-            ).distinct(),
-            pk=pk
-        )
+        allocation = get_object_or_404(AllocationResult, department=department, pk=pk)
     else:
-        allocation = AllocationResult.objects.filter(
-            groups__department=department
-        ).distinct().order_by('-created_at').first()
+        allocation = AllocationResult.objects.filter(department=department).order_by('-created_at').first()
         if allocation is None:
             # no allocation to download
             return HttpResponse("No allocations found.", status=404)
@@ -237,66 +311,41 @@ def download_csv(request, pk=None):
     created_str = allocation.created_at.strftime("%Y%m%d_%H%M")
     filename = f"allocation_{allocation.id}_{created_str}.csv"
 
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    writer = csv.writer(response)
-
-    # header
-    writer.writerow(['Group', 'Supervisor', 'Matric No', 'Student Name'])
-
-    groups = allocation.groups.filter(department=department).prefetch_related('students', 'supervisor')
-    for group in groups:
-        supervisor_name = group.supervisor.name if getattr(group, 'supervisor', None) else ''
-        for student in group.students.all():
-            writer.writerow([f'Group {group.number}', supervisor_name, student.matric_no,
-                             getattr(student, 'get_full_name', lambda: '')() or getattr(student, 'name', '')])
-
-    return response
-
-def random_allocation(students, supervisors, num_groups):
-    students_copy = students[:]  # avoid mutating original
-    random.shuffle(students_copy)
+    return conditional_run_response(request, allocation, lambda: exports.csv_response(
+        filename,
+        exports.ALLOCATION_HEADER,
+        exports.allocation_rows(allocation, department),
+        cache_key=allocation.version,
+    ))
 
-    groups = []
-    for i in range(num_groups):
-        groups.append({
-            'number': i + 1,
-            'supervisor': supervisors[i % len(supervisors)],
-            'students': []
-        })
 
-    for i, student in enumerate(students_copy):
-        group_idx = i % num_groups
-        groups[group_idx]['students'].append(student)
-
-    return groups
-
-
-def balanced_allocation(students, supervisors, num_groups):
-    # Group students by classification
-    classified_students = defaultdict(list)
-    for student in students:
-        classified_students[student.classification()].append(student)
-
-    # Sort each classification group randomly (to avoid bias)
-    for classification in classified_students:
-        random.shuffle(classified_students[classification])
+@login_required(login_url='/login/')
+def download_rosters(request, pk=None):
+    """
+    Zip with one roster CSV per group plus index.csv, for the given run (or
+    the latest one), streamed as it is compressed.
+    """
+    department = request.user.department
+    allocations = AllocationResult.objects.filter(department=department)
+    if pk is not None:
+        allocation = get_object_or_404(allocations, pk=pk)
+    else:
+        allocation = allocations.order_by('-created_at').first()
+        if allocation is None:
+            return HttpResponse("No allocations found.", status=404)
 
-    groups = []
-    for i in range(num_groups):
-        groups.append({
-            'number': i + 1,
-            'supervisor': supervisors[i % len(supervisors)],
-            'students': []
-        })
+    filename = f"allocation_{allocation.id}_{allocation.created_at:%Y%m%d_%H%M}_rosters.zip"
+    return conditional_run_response(
+        request, allocation, lambda: exports.zip_response(filename, exports.roster_archive(allocation, department))
+    )
 
-    # Distribute classification groups round-robin
-    for class_group in classified_students.values():
-        for i, student in enumerate(class_group):
-            group_idx = i % num_groups
-            groups[group_idx]['students'].append(student)
 
-    return groups
+@login_required(login_url='/login/')
+def download_history_csv(request):
+    """Every run of the department in one streamed CSV, newest run first."""
+    department = request.user.department
+    filename = f"allocation_history_{department.code if department else 'none'}_{timezone.now():%Y%m%d_%H%M}.csv"
+    return exports.csv_response(filename, exports.HISTORY_HEADER, exports.history_rows(department))
 
 
 # views.py
@@ -305,60 +354,64 @@ def allocation_detail(request, pk):
     try:
         department = request.user.department
 
-        # Fix: Use distinct() to avoid duplicate AllocationResult objects
-        allocation = get_object_or_404(
-            AllocationResult.objects.filter(
-                groups__department=department
-            ).distinct(),
-            id=pk
+        allocation = get_object_or_404(AllocationResult, department=department, id=pk)
+        if len(messages.get_messages(request)):
+            # A page carrying flash messages must not be revalidated later.
+            return render_allocation_detail(request, allocation, department)
+        # The page shows the user's name and embeds a CSRF token, so their id
+        # and session are part of the ETag.
+        return conditional_run_response(
+            request, allocation, lambda: render_allocation_detail(request, allocation, department),
+            request.user.pk, session_tag(request),
         )
 
-        # Get all groups for this allocation
-        all_groups = Group.objects.filter(
-            allocation_result=allocation,
-            department=department
-        ).prefetch_related('students', 'supervisor').order_by('number')
+    except Exception as e:
+        messages.error(request, f"An error occurred while retrieving allocation details: {str(e)}")
+        return redirect('allocation:results')
 
-        # Calculate statistics
-        total_students = sum(group.students.count() for group in all_groups)
-        average_group_size = total_students / len(all_groups) if all_groups else 0
 
-        # Calculate average grade for each group
-        for group in all_groups:
-            group.avg_cgpa = group.students.aggregate(Avg('cgpa'))['cgpa__avg'] or 0
+def render_allocation_detail(request, allocation, department):
+    # Groups of this run; sizes are stored on the rows and members are
+    # prefetched for the current page only (the template shows matric no.)
+    all_groups = Group.objects.filter(
+        allocation_result=allocation,
+        department=department
+    ).select_related('supervisor').prefetch_related(
+        Prefetch('students', queryset=Student.objects.only('id', 'matric_no'))
+    ).order_by('number')
 
-        # Paginate groups
-        paginator = Paginator(all_groups, 10)
-        page = request.GET.get('page')
+    # Run-level statistics come from the run's stored totals
+    total_students = allocation.student_count
+    average_group_size = total_students / allocation.num_groups if allocation.num_groups else 0
 
-        try:
-            groups = paginator.page(page)
-        except PageNotAnInteger:
-            groups = paginator.page(1)
-        except EmptyPage:
-            groups = paginator.page(paginator.num_pages)
+    # Paginate in the database: a COUNT, one page of groups, one prefetch
+    paginator = Paginator(all_groups, 10)
+    page = request.GET.get('page')
 
-        context = {
-            'allocation': allocation,
-            'groups': groups,
-            'total_students': total_students,
-            'average_group_size': round(average_group_size, 1),
-        }
+    try:
+        groups = paginator.page(page)
+    except PageNotAnInteger:
+        groups = paginator.page(1)
+    except EmptyPage:
+        groups = paginator.page(paginator.num_pages)
 
-        return render(request, 'allocation/detail.html', context)
+    context = {
+        'allocation': allocation,
+        'groups': groups,
+        'total_students': total_students,
+        'average_group_size': round(average_group_size, 1),
+    }
 
-    except Exception as e:
-        messages.error(request, f"An error occurred while retrieving allocation details: {str(e)}")
-        return redirect('allocation:results')
+    return render(request, 'allocation/detail.html', context)
 
 
 def send_emails_for_group(group, subject, body):
     """
-    Send emails to supervisor (with CSV attachment) and to students.
+    Send emails to supervisor (with CSV attachment) and to students right
+    away, over one connection; allocation runs queue theirs in the outbox.
     Returns a dictionary with summary and per-student errors.
     """
-    supervisor = getattr(group, "supervisor", None)
-    students = group.students.all()
+    students = list(group.students.all())
 
     result = {
         "group_id": group.id,
@@ -369,91 +422,35 @@ def send_emails_for_group(group, subject, body):
         "errors": [],            # general errors
     }
 
-    # Optional: quick sanity check for student emails (log)
-    student_emails = [s.email for s in students]
-    logger.debug("Preparing to send emails for group %s. Student emails: %s", group.id, student_emails)
+    # No email address — record as failed/skip
+    for student in students:
+        if not student.email:
+            result["students_failed"].append({"student_id": student.id, "email": None, "error": "missing email"})
 
     try:
         # open a single SMTP connection and reuse it
         connection = get_connection(fail_silently=False)
         connection.open()
 
-        # Send supervisor email if present
-        if supervisor and getattr(supervisor, "email", None):
-            try:
-                supervisor_ctx = {
-                    "group": group,
-                    "supervisor": supervisor,
-                    "students": students,
-                    "body": body,
-                }
-                html_content = render_to_string("emails/supervisor_email.html", supervisor_ctx)
-                text_content = strip_tags(html_content) or body
-
-                email = EmailMultiAlternatives(
-                    subject=subject,
-                    body=text_content,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    to=[supervisor.email],
-                    connection=connection
-                )
-                email.attach_alternative(html_content, "text/html")
-
-                # CSV attachment for supervisor
-                csv_buffer = io.StringIO()
-                writer = csv.writer(csv_buffer)
-                writer.writerow(["Matric No", "Full Name", "CGPA", "Email"])
-                for s in students:
-                    writer.writerow([s.matric_no, s.full_name or "", str(s.cgpa), s.email or ""])
-                csv_data = csv_buffer.getvalue()
-                csv_buffer.close()
-                filename = f"group_{group.number}_students.csv"
-                email.attach(filename, csv_data, "text/csv")
-
-                email.send()
-                result["supervisor_email_sent"] = True
-            except Exception as sup_exc:
-                logger.exception("Supervisor email send failed for group %s", group.id)
-                result["errors"].append(f"Supervisor send error: {str(sup_exc)}")
-
-        # Send individual student emails (each has its own try/except)
-        for student in students:
-            if not getattr(student, "email", None):
-                # No email address — record as failed/skip
-                result["students_failed"].append({
-                    "student_id": getattr(student, "id", None),
-                    "email": None,
-                    "error": "missing email"
-                })
-                continue
-
+        for row in outbox.group_emails(group, students, subject, body):
             try:
-                student_ctx = {
-                    "student": student,
-                    "supervisor": supervisor,
-                    "group": group,
-                    "body": body,
-                }
-                html_content = render_to_string("emails/student_email.html", student_ctx)
-                text_content = strip_tags(html_content) or body
-
-                email = EmailMultiAlternatives(
-                    subject=subject,
-                    body=text_content,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    to=[student.email],
-                    connection=connection
-                )
-                email.attach_alternative(html_content, "text/html")
-                email.send()
-                result["students_sent"] += 1
-            except Exception as stud_exc:
-                logger.exception("Failed to send to student %s (group %s)", getattr(student, "id", None), group.id)
-                result["students_failed"].append({
-                    "student_id": getattr(student, "id", None),
-                    "email": getattr(student, "email", None),
-                    "error": str(stud_exc)
-                })
+                connection.send_messages([outbox.to_message(row, connection)])
+            except Exception as exc:
+                if row.kind == row.KIND_SUPERVISOR:
+                    logger.exception("Supervisor email send failed for group %s", group.id)
+                    result["errors"].append(f"Supervisor send error: {str(exc)}")
+                else:
+                    logger.exception("Failed to send to student %s (group %s)", row.student_id, group.id)
+                    result["students_failed"].append({
+                        "student_id": row.student_id,
+                        "email": row.to_email,
+                        "error": str(exc)
+                    })
+            else:
+                if row.kind == row.KIND_SUPERVISOR:
+                    result["supervisor_email_sent"] = True
+                else:
+                    result["students_sent"] += 1
 
         # close connection
         try:
@@ -470,6 +467,33 @@ def send_emails_for_group(group, subject, body):
     return result
 
 
+@login_required(login_url='/login/')
+def job_status(request, pk):
+    """Polled by the run page while an AllocationJob is queued or running."""
+    job = get_object_or_404(AllocationJob, pk=pk, department=request.user.department)
+    if job.status == AllocationJob.STATUS_RUNNING and jobs.fail_stale_jobs(job.department_id):
+        job.refresh_from_db()
+    return JsonResponse(jobs.job_status(job))
+
+
+@login_required(login_url='/login/')
+def group_roster(request, pk):
+    """One group's members as JSON, fetched by the results page on demand."""
+    group = get_object_or_404(
+        Group.objects.select_related('supervisor'), pk=pk, department=request.user.department
+    )
+    students = group.students.order_by('matric_no').values('id', 'full_name', 'matric_no', 'email', 'cgpa')
+    return JsonResponse({
+        'id': group.id,
+        'number': group.number,
+        'supervisor': group.supervisor.name if group.supervisor else '',
+        'supervisor_email': group.supervisor.email if group.supervisor else '',
+        'student_count': group.student_count,
+        'average_cgpa': str(group.average_cgpa) if group.average_cgpa is not None else None,
+        'students': [{**student, 'cgpa': str(student['cgpa'])} for student in students],
+    })
+
+
 @login_required
 @require_POST
 def send_group_email(request):
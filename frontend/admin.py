@@ -2,7 +2,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
-from .models import School, Department, User
+from .models import School, Department, DepartmentStats, User
 
 
 @admin.register(School)
@@ -20,6 +20,19 @@ class DepartmentAdmin(admin.ModelAdmin):
     ordering = ('school', 'name')
 
 
+@admin.register(DepartmentStats)
+class DepartmentStatsAdmin(admin.ModelAdmin):
+    # Maintained by frontend.stats; repair with manage.py rebuild_department_stats
+    list_display = (
+        'department', 'total_students', 'unassigned_students', 'total_supervisors', 'total_groups',
+        'completed_allocations', 'updated_at',
+    )
+    readonly_fields = list_display
+
+    def has_add_permission(self, request):
+        return False
+
+
 class CustomUserAdmin(UserAdmin):
     # Customize the form and fields displayed
     model = User
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class FrontendConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'frontend'
+
+    def ready(self):
+        from . import signals
+
+        signals.connect()
@@ -0,0 +1,80 @@
+# frontend/cache.py
+"""
+Department-versioned caching.
+
+Every ``Department`` carries a ``data_version`` that frontend.signals bumps
+whenever one of its students, supervisors, groups or allocation runs is
+saved or deleted (code that writes in bulk calls ``bump_data_version``
+itself). Cache keys include the version, so a change makes every entry of
+the department unreachable at once: values are never stale and nothing has
+to be deleted. Old entries simply expire (DEPARTMENT_CACHE_SECONDS).
+
+The version is read from the department instance, which views get with
+``request.user`` on every request, so building a key costs no query.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from .models import Department, DepartmentStats
+
+_pending = threading.local()
+
+
+def defer_department(department_id):
+    """Inside ``batched_bumps()``, remember ``department_id`` and return True."""
+    pending = getattr(_pending, 'ids', None)
+    if pending is None:
+        return False
+    pending.add(department_id)
+    return True
+
+
+def bump_data_version(department_id):
+    """Invalidate everything cached for ``department_id`` (None is ignored)."""
+    if department_id is None or defer_department(department_id):
+        return
+    Department.objects.filter(pk=department_id).update(data_version=F('data_version') + 1)
+
+
+@contextmanager
+def batched_bumps():
+    """
+    Collect the version bumps and DepartmentStats updates made inside the
+    block (e.g. one per saved row of an upload). On exit each department
+    is bumped once and its stats row is dropped, to be recounted on the
+    next read.
+    """
+    if getattr(_pending, 'ids', None) is not None:
+        yield
+        return
+    _pending.ids = set()
+    try:
+        yield
+    finally:
+        ids, _pending.ids = _pending.ids, None
+        if ids:
+            Department.objects.filter(pk__in=ids).update(data_version=F('data_version') + 1)
+            DepartmentStats.objects.filter(pk__in=ids).delete()
+
+
+def versioned_key(department, name, *parts):
+    """Cache key for ``name`` (plus ``parts``) at the department's current version."""
+    if department is None:
+        prefix = 'dept:none'
+    else:
+        prefix = f'dept:{department.pk}:v{department.data_version}'
+    return ':'.join([prefix, name, *map(str, parts)])
+
+
+def cached(department, name, compute, *parts):
+    """``compute()``, cached per department version; the value must pickle."""
+    key = versioned_key(department, name, *parts)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, getattr(settings, 'DEPARTMENT_CACHE_SECONDS', 3600))
+    return value
@@ -0,0 +1,48 @@
+# frontend/management/commands/rebuild_department_stats.py
+from django.core.management.base import BaseCommand, CommandError
+
+from frontend.models import Department, DepartmentStats
+from frontend.stats import count_stats, rebuild_stats
+
+
+class Command(BaseCommand):
+    help = "Recount the DepartmentStats rows from the data (all departments, or the given ids)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("department_ids", nargs="*", type=int, help="Departments to rebuild (default: all).")
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report rows that differ from a fresh count; exit non-zero if any do."
+        )
+
+    def handle(self, *args, **options):
+        departments = Department.objects.order_by("pk")
+        if options["department_ids"]:
+            departments = departments.filter(pk__in=options["department_ids"])
+        stored = {stats.pk: stats for stats in DepartmentStats.objects.filter(pk__in=departments.values("pk"))}
+
+        drifted = 0
+        for department in departments:
+            fresh = count_stats(department.pk)
+            current = stored.get(department.pk)
+            diff = {
+                name: (getattr(current, name), value)
+                for name, value in fresh.items()
+                if current is None or getattr(current, name) != value
+            }
+            if current is not None and diff:
+                drifted += 1
+                changes = ", ".join(f"{name} {old} -> {new}" for name, (old, new) in diff.items())
+                self.stdout.write(self.style.WARNING(f"{department}: {changes}"))
+            if not options["check"]:
+                rebuild_stats(department.pk, fresh)
+
+        if options["check"]:
+            if drifted:
+                raise CommandError(f"{drifted} department(s) have drifted stats.")
+            self.stdout.write(self.style.SUCCESS("All stored department stats match."))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Rebuilt stats for {departments.count()} department(s); {drifted} had drifted."
+            ))
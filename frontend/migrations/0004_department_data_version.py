@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('frontend', '0003_alter_user_managers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='department',
+            name='data_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('frontend', '0004_department_data_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DepartmentStats',
+            fields=[
+                ('department', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='frontend.department')),
+                ('total_students', models.IntegerField(default=0)),
+                ('unassigned_students', models.IntegerField(default=0)),
+                ('total_supervisors', models.IntegerField(default=0)),
+                ('total_groups', models.IntegerField(default=0)),
+                ('completed_allocations', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'department stats',
+            },
+        ),
+    ]
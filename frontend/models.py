@@ -20,6 +20,9 @@ class Department(models.Model):
     school = models.ForeignKey(School, on_delete=models.CASCADE)
     name = models.CharField(max_length=100)
     code = models.CharField(max_length=10)
+    # Bumped whenever the department's students, supervisors, groups or
+    # allocation runs change; see frontend.cache.
+    data_version = models.PositiveBigIntegerField(default=0, editable=False)
 
     class Meta:
         unique_together = ("school", "name")  # Ensures department names are unique within a school
@@ -28,6 +31,27 @@ class Department(models.Model):
         return f"{self.school.name} - {self.name}"
 
 
+class DepartmentStats(models.Model):
+    """
+    Materialized totals shown on the dashboard and the run page, kept
+    current by frontend.stats. Missing rows are rebuilt on read;
+    ``manage.py rebuild_department_stats`` repairs drift.
+    """
+    department = models.OneToOneField(Department, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    total_students = models.IntegerField(default=0)
+    unassigned_students = models.IntegerField(default=0)
+    total_supervisors = models.IntegerField(default=0)
+    total_groups = models.IntegerField(default=0)
+    completed_allocations = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "department stats"
+
+    def __str__(self):
+        return f"Stats for {self.department_id}"
+
+
 class User(AbstractUser):
     # Remove username field and use email instead
     username = None
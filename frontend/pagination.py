@@ -0,0 +1,167 @@
+# frontend/pagination.py
+"""
+Keyset (cursor) pagination.
+
+Django's Paginator needs a COUNT(*) and an OFFSET scan for every page, so
+deep pages cost as much as reading everything before them. A keyset page
+instead continues from the sort key of the last row shown
+(``WHERE (key) > (last key) ORDER BY key LIMIT n``), which an index on the
+ordering answers directly at any depth.
+
+Cursors are opaque URL-safe strings holding the boundary row's key and the
+direction. The total count is optional and, when asked for, cached.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder truncates datetimes to milliseconds, which would make
+    # keys no longer compare equal to the stored values.
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(direction, values):
+    raw = json.dumps([direction, values], cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, num_values):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise InvalidCursor(cursor) from None
+    if direction not in ('next', 'prev') or not isinstance(values, list) or len(values) != num_values:
+        raise InvalidCursor(cursor)
+    return direction, values
+
+
+class KeysetPage:
+    """One page: iterable like a Paginator page, with cursors instead of numbers."""
+
+    def __init__(self, object_list, next_cursor, previous_cursor, count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+class KeysetPaginator:
+    """
+    Paginate ``queryset`` by ``ordering`` (field names, ``-`` for
+    descending; ``pk`` is appended as a tie-breaker so keys are unique).
+    The ordering fields must not be NULL.
+
+    ``count_key`` turns on the total count, cached under that key for
+    PAGINATION_COUNT_CACHE_SECONDS; without it ``page.count`` is None and
+    no COUNT query runs.
+    """
+
+    def __init__(self, queryset, ordering, per_page, count_key=None):
+        ordering = list(ordering)
+        if not {'pk', '-pk', 'id', '-id'} & set(ordering):
+            ordering.append('pk')
+        self.queryset = queryset
+        self.ordering = ordering
+        self.fields = [field.lstrip('-') for field in ordering]
+        self.per_page = per_page
+        self.count_key = count_key
+
+    def page(self, cursor=None):
+        """The page after/before ``cursor``; the first page if it is missing or invalid."""
+        direction, values = 'next', None
+        queryset = self.queryset.order_by(*self.ordering)
+        if cursor:
+            try:
+                direction, values = decode_cursor(cursor, len(self.fields))
+                ordering = self.ordering if direction == 'next' else map(_reverse, self.ordering)
+                queryset = self.queryset.order_by(*ordering).filter(
+                    self._after(values, reverse=direction == 'prev')
+                )
+            except (InvalidCursor, ValidationError, ValueError, TypeError):
+                direction, values = 'next', None
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == 'prev':
+            rows.reverse()
+
+        at_start = values is None or (direction == 'prev' and not has_more)
+        at_end = direction == 'next' and not has_more
+        return KeysetPage(
+            rows,
+            next_cursor=None if at_end or not rows else encode_cursor('next', self._key(rows[-1])),
+            previous_cursor=None if at_start or not rows else encode_cursor('prev', self._key(rows[0])),
+            count=self.count(),
+        )
+
+    def count(self):
+        if self.count_key is None:
+            return None
+        count = cache.get(self.count_key)
+        if count is None:
+            count = self.queryset.count()
+            cache.set(self.count_key, count, getattr(settings, 'PAGINATION_COUNT_CACHE_SECONDS', 60))
+        return count
+
+    def _key(self, row):
+        values = []
+        for field in self.fields:
+            value = row
+            for part in field.split('__'):
+                value = getattr(value, part)
+            values.append(value)
+        return values
+
+    def _after(self, values, reverse=False):
+        """Rows strictly after ``values`` in the (optionally reversed) ordering."""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            descending = field.startswith('-') != reverse
+            name = field.lstrip('-')
+            condition |= equal & Q(**{f"{name}__{'lt' if descending else 'gt'}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+
+def _reverse(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
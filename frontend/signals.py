@@ -0,0 +1,72 @@
+# frontend/signals.py
+"""
+Keep ``Department.data_version`` and ``DepartmentStats`` current when
+department-scoped rows are saved or deleted one at a time. Bulk writes
+bypass signals and update both themselves.
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+
+from .cache import bump_data_version
+from .stats import adjust_stats, invalidate_stats
+
+# Counter each model's rows are counted in.
+COUNTER_FOR = {
+    'Student': 'total_students',
+    'Supervisor': 'total_supervisors',
+    'Group': 'total_groups',
+    'AllocationResult': 'completed_allocations',
+}
+
+
+def instance_saved(sender, instance, created, **kwargs):
+    bump_data_version(instance.department_id)
+    if created:
+        deltas = {COUNTER_FOR[sender.__name__]: 1}
+        if sender.__name__ == 'Student':
+            deltas['unassigned_students'] = 1
+        adjust_stats(instance.department_id, **deltas)
+
+
+def student_deleting(sender, instance, **kwargs):
+    # Memberships are gone by post_delete
+    instance._was_assigned = instance.groups.exists()
+
+
+def instance_deleted(sender, instance, **kwargs):
+    bump_data_version(instance.department_id)
+    if sender.__name__ == 'Group':
+        # Members may now be unassigned
+        invalidate_stats(instance.department_id)
+        return
+    deltas = {COUNTER_FOR[sender.__name__]: -1}
+    if sender.__name__ == 'Student' and not getattr(instance, '_was_assigned', True):
+        deltas['unassigned_students'] = -1
+    adjust_stats(instance.department_id, **deltas)
+
+
+def members_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse or pk_set is None:
+        # group.students.add(...) and friends, or student.groups.clear()
+        department_ids = {instance.department_id}
+    else:
+        # student.groups.add(...): the groups may belong to other departments
+        from allocation.models import Group
+
+        department_ids = set(Group.objects.filter(pk__in=pk_set).values_list('department_id', flat=True))
+    for department_id in department_ids:
+        bump_data_version(department_id)
+        invalidate_stats(department_id)
+
+
+def connect():
+    from allocation.models import AllocationResult, Group
+    from students.models import Student
+    from supervisors.models import Supervisor
+
+    for model in (Student, Supervisor, Group, AllocationResult):
+        post_save.connect(instance_saved, sender=model, dispatch_uid=f'department_save_{model.__name__}')
+        post_delete.connect(instance_deleted, sender=model, dispatch_uid=f'department_delete_{model.__name__}')
+    pre_delete.connect(student_deleting, sender=Student, dispatch_uid='department_delete_student_members')
+    m2m_changed.connect(members_changed, sender=Group.students.through, dispatch_uid='department_members')
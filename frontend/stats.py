@@ -0,0 +1,71 @@
+# frontend/stats.py
+"""
+Maintenance of ``DepartmentStats``.
+
+Single-row saves and deletes adjust the counters through frontend.signals;
+bulk writes (allocation.persistence) adjust them explicitly. Changes whose
+effect on the counters is not known without counting (group or membership
+deletions, edits in the admin) drop the row instead, and the next read
+rebuilds it with one COUNT per counter.
+
+Adjustments only touch an existing row, so a cascade that is deleting the
+department cannot recreate it.
+"""
+from django.db import IntegrityError
+from django.db.models import F
+
+from .cache import defer_department
+from .models import DepartmentStats
+
+
+def count_stats(department_id):
+    """The counters of ``department_id``, counted from scratch."""
+    from allocation.models import AllocationResult, Group
+    from students.models import Student
+    from supervisors.models import Supervisor
+
+    students = Student.objects.filter(department_id=department_id)
+    return {
+        'total_students': students.count(),
+        'unassigned_students': students.filter(groups__isnull=True).count(),
+        'total_supervisors': Supervisor.objects.filter(department_id=department_id).count(),
+        'total_groups': Group.objects.filter(department_id=department_id).count(),
+        'completed_allocations': AllocationResult.objects.filter(department_id=department_id).count(),
+    }
+
+
+def rebuild_stats(department_id, counts=None):
+    """Store ``counts`` (by default a fresh count) as the department's stats."""
+    stats, _ = DepartmentStats.objects.update_or_create(
+        department_id=department_id, defaults=counts or count_stats(department_id)
+    )
+    return stats
+
+
+def department_stats(department):
+    """The department's stats row (one primary-key lookup), rebuilt if missing."""
+    if department is None:
+        return DepartmentStats()
+    stats = DepartmentStats.objects.filter(pk=department.pk).first()
+    if stats is None:
+        try:
+            stats = rebuild_stats(department.pk)
+        except IntegrityError:
+            # Built concurrently by another request
+            stats = DepartmentStats.objects.get(pk=department.pk)
+    return stats
+
+
+def adjust_stats(department_id, **deltas):
+    """Add ``deltas`` (counter name -> change) to the department's counters."""
+    deltas = {name: F(name) + delta for name, delta in deltas.items() if delta}
+    if department_id is None or not deltas or defer_department(department_id):
+        return
+    DepartmentStats.objects.filter(pk=department_id).update(**deltas)
+
+
+def invalidate_stats(department_id):
+    """Drop the department's row; it is rebuilt on the next read."""
+    if department_id is None or defer_department(department_id):
+        return
+    DepartmentStats.objects.filter(pk=department_id).delete()
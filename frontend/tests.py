@@ -1,3 +1,174 @@
-from django.test import TestCase
+import io
+import tempfile
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from allocation.models import AllocationResult, Group
+from allocation.services import execute_allocation, extend_latest_allocation
+from frontend.cache import batched_bumps, cached, versioned_key
+from frontend.models import Department, DepartmentStats, School
+from frontend.stats import count_stats, department_stats
+from frontend.pagination import KeysetPaginator, encode_cursor
+from students.models import Student
+from supervisors.models import Supervisor
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        school = School.objects.create(name='Paging School', code='PS')
+        cls.department = Department.objects.create(school=school, name='Paging', code='PG')
+        # Few distinct CGPAs, so most keys tie on the first column.
+        Student.objects.bulk_create([
+            Student(matric_no=f'P{number:03d}', cgpa=Decimal(number % 4) + Decimal('1.25'), department=cls.department)
+            for number in range(47)
+        ])
+        cls.expected = list(
+            Student.objects.filter(department=cls.department)
+            .order_by('-cgpa', 'matric_no', 'pk')
+            .values_list('pk', flat=True)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def paginator(self, **kwargs):
+        return KeysetPaginator(Student.objects.filter(department=self.department), ['-cgpa', 'matric_no'], 10, **kwargs)
+
+    def test_forward_and_back_visit_every_row_once(self):
+        paginator = self.paginator()
+        pages = [paginator.page()]
+        while pages[-1].has_next:
+            pages.append(paginator.page(pages[-1].next_cursor))
+        self.assertEqual([student.pk for page in pages for student in page], self.expected)
+        self.assertFalse(pages[0].has_previous)
+        self.assertEqual(len(pages[-1]), 7)
+
+        backwards = [pages[-1]]
+        while backwards[-1].has_previous:
+            backwards.append(paginator.page(backwards[-1].previous_cursor))
+        self.assertEqual(
+            [[student.pk for student in page] for page in reversed(backwards)],
+            [[student.pk for student in page] for page in pages],
+        )
+        self.assertFalse(backwards[-1].has_previous)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        first = [student.pk for student in self.paginator().page()]
+        for cursor in ('not-a-cursor', encode_cursor('next', [1]), encode_cursor('next', ['x', 'y', 'z'])):
+            self.assertEqual([student.pk for student in self.paginator().page(cursor)], first)
+
+    def test_count_is_optional_and_cached(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(self.paginator().page().count)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.paginator(count_key='paging-test').page().count, 47)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.paginator(count_key='paging-test').page().count, 47)
+
+
+class DataVersionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        school = School.objects.create(name='Version School', code='VS')
+        cls.department = Department.objects.create(school=school, name='Versioned', code='VD')
+        cls.other = Department.objects.create(school=school, name='Other', code='OD')
+
+    def setUp(self):
+        cache.clear()
+
+    def version(self, department=None):
+        return Department.objects.get(pk=(department or self.department).pk).data_version
+
+    def test_changes_bump_only_their_department(self):
+        student = Student.objects.create(matric_no='V1', cgpa=Decimal('3.00'), department=self.department)
+        supervisor = Supervisor.objects.create(name='Dr V', department=self.department)
+        run = AllocationResult.objects.create(department=self.department, method='balanced', num_groups=1)
+        group = Group.objects.create(number=1, supervisor=supervisor, allocation_result=run, department=self.department)
+        before = self.version()
+        group.students.add(student)
+        student.cgpa = Decimal('3.50')
+        student.save()
+        student.delete()
+        self.assertEqual(self.version(), before + 3)
+        self.assertEqual(self.version(self.other), 0)
+
+    def test_batched_bumps_write_once_per_department(self):
+        with batched_bumps():
+            for number in range(5):
+                Student.objects.create(matric_no=f'B{number}', cgpa=Decimal('2.00'), department=self.department)
+            self.assertEqual(self.version(), 0)
+        self.assertEqual(self.version(), 1)
+
+    def check_cached_values_follow_the_version(self):
+        count = lambda: Student.objects.filter(department=self.department).count()
+        department = Department.objects.get(pk=self.department.pk)
+        self.assertEqual(cached(department, 'students', count), 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(cached(department, 'students', count), 0)
+
+        Student.objects.create(matric_no='C1', cgpa=Decimal('4.00'), department=self.department)
+        department.refresh_from_db()
+        self.assertEqual(cached(department, 'students', count), 1)
+        self.assertNotEqual(versioned_key(department, 'students'), versioned_key(self.other, 'students'))
+
+    def test_cached_values_follow_the_version(self):
+        self.check_cached_values_follow_the_version()
+
+    def test_cached_values_follow_the_version_with_file_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            with override_settings(CACHES={
+                'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+            }):
+                self.check_cached_values_follow_the_version()
+
+
+class DepartmentStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        school = School.objects.create(name='Stats School', code='SS')
+        cls.department = Department.objects.create(school=school, name='Counted', code='CT')
+
+    def assertStatsCurrent(self):
+        stats = DepartmentStats.objects.get(pk=self.department.pk)
+        self.assertEqual({name: getattr(stats, name) for name in count_stats(self.department.pk)}, count_stats(self.department.pk))
+
+    def test_write_paths_keep_the_row_current(self):
+        department_stats(self.department)
+        supervisors = [Supervisor.objects.create(name=f'Dr {number}', department=self.department) for number in range(3)]
+        students = [
+            Student.objects.create(matric_no=f'S{number}', cgpa=Decimal('3.00'), department=self.department)
+            for number in range(9)
+        ]
+        self.assertStatsCurrent()
+
+        execute_allocation(self.department, 'balanced', 3)
+        self.assertStatsCurrent()
+        Student.objects.create(matric_no='LATE', cgpa=Decimal('2.00'), department=self.department)
+        extend_latest_allocation(self.department)
+        self.assertStatsCurrent()
+
+        students[0].delete()
+        Student.objects.create(matric_no='LATER', cgpa=Decimal('2.00'), department=self.department).delete()
+        self.assertStatsCurrent()
+
+        supervisors[0].delete()
+        department_stats(self.department)
+        self.assertStatsCurrent()
+
+    def test_dashboard_counts_are_one_lookup(self):
+        department_stats(self.department)
+        with self.assertNumQueries(1):
+            department_stats(self.department)
+
+    def test_rebuild_command_repairs_drift(self):
+        Student.objects.create(matric_no='D1', cgpa=Decimal('3.00'), department=self.department)
+        department_stats(self.department)
+        DepartmentStats.objects.filter(pk=self.department.pk).update(total_students=40)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_department_stats', '--check', stdout=io.StringIO())
+        call_command('rebuild_department_stats', stdout=io.StringIO())
+        self.assertStatsCurrent()
@@ -6,9 +6,9 @@ from django.contrib import messages
 from django.views import View
 from django.views.decorators.csrf import csrf_protect
 
-from allocation.models import AllocationResult, Group
-from students.models import Student
-from supervisors.models import Supervisor
+from allocation.models import AllocationResult
+from .cache import cached
+from .stats import department_stats
 from .models import User, School, Department
 from .forms import RegistrationForm, DepartmentLoginForm
 
@@ -194,30 +194,21 @@ def dashboard(request):
         }
         return render(request, "dashboard.html", context)
 
-    # Department-scoped counts
-    total_students = Student.objects.filter(department=department).count()
-
-    # If Supervisor has a ForeignKey to department:
-    total_supervisors = Supervisor.objects.filter(department=department).count()
-
-    # If Supervisor has a ManyToManyField named `departments` (uncomment & use instead):
-    # total_supervisors = Supervisor.objects.filter(departments=department).distinct().count()
-
-    total_groups = Group.objects.filter(department=department).count()
+    # Cached until the department's data changes (frontend.cache)
+    context = cached(department, "dashboard", lambda: dashboard_context(department))
+    return render(request, "dashboard.html", context)
 
-    # Reuse the allocation queryset to avoid duplicate/filtering work
-    allocation_qs = AllocationResult.objects.filter(groups__department=department).distinct().order_by('-created_at')
-    completed_allocations = allocation_qs.count()
-    allocations = allocation_qs[:5]
 
-    context = {
-        "total_students": total_students,
-        "total_supervisors": total_supervisors,
-        "total_groups": total_groups,
-        "completed_allocations": completed_allocations,
-        "allocations": allocations,
+def dashboard_context(department):
+    """Department totals (one stats row) and the latest runs shown on the dashboard."""
+    stats = department_stats(department)
+    return {
+        "total_students": stats.total_students,
+        "total_supervisors": stats.total_supervisors,
+        "total_groups": stats.total_groups,
+        "completed_allocations": stats.completed_allocations,
+        "allocations": list(AllocationResult.objects.filter(department=department).order_by('-created_at')[:5]),
     }
-    return render(request, "dashboard.html", context)
 
 
 # views.py
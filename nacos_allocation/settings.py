@@ -13,6 +13,7 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 from .jazzmin import JAZZMIN_SETTINGS
 import sys
 load_dotenv()
@@ -113,11 +114,22 @@ WSGI_APPLICATION = 'nacos_allocation.wsgi.application'
 # }
 
 
+# DATABASE_URL is required. A local SQLite file (development, the allocation
+# benchmark) has to be asked for with SPAS_ALLOW_SQLITE=1, so a deploy that
+# lost its DATABASE_URL fails at startup instead of running on an empty file.
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    if os.getenv("SPAS_ALLOW_SQLITE") != "1":
+        raise ImproperlyConfigured(
+            "DATABASE_URL is not set (set SPAS_ALLOW_SQLITE=1 to use a local SQLite file)."
+        )
+    DATABASE_URL = f"sqlite:///{BASE_DIR / 'db.sqlite3'}"
+
 DATABASES = {
     "default": dj_database_url.parse(
-        os.getenv("DATABASE_URL"),
+        DATABASE_URL,
         conn_max_age=600,
-        ssl_require=True
+        ssl_require=not DATABASE_URL.startswith("sqlite")
     )
 }
 
@@ -150,6 +162,45 @@ EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")  # e.g. your@gmail.com
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD") #  # app password, not account password
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", EMAIL_HOST_USER)
 
+# Threads per web process that execute queued allocation jobs.
+# Set to 0 to leave jobs for `python manage.py run_allocation_jobs`.
+ALLOCATION_JOB_WORKERS = int(os.getenv("ALLOCATION_JOB_WORKERS", 2))
+# Jobs still running after this long are taken to be dead and marked failed.
+ALLOCATION_JOB_TIMEOUT_SECONDS = int(os.getenv("ALLOCATION_JOB_TIMEOUT_SECONDS", 1800))
+
+# Notification e-mails go through allocation.outbox. Senders (threads) per
+# drain, each with one long-lived connection; 0 leaves queued mail for
+# `manage.py send_outbox`. The in-process sender retries failed mail on a
+# timer, which does not survive a restart or a frozen serverless instance
+# (Vercel): there, run `manage.py send_outbox --loop` (or on a schedule).
+EMAIL_OUTBOX_WORKERS = int(os.getenv("EMAIL_OUTBOX_WORKERS", 2))
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", 50))
+# Messages per second over all senders of a drain (0: unlimited).
+EMAIL_OUTBOX_RATE = float(os.getenv("EMAIL_OUTBOX_RATE", 0))
+# Attempts per message; the wait doubles from EMAIL_OUTBOX_RETRY_SECONDS.
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", 5))
+EMAIL_OUTBOX_RETRY_SECONDS = int(os.getenv("EMAIL_OUTBOX_RETRY_SECONDS", 30))
+# Claimed rows not finished within this long are picked up again.
+EMAIL_OUTBOX_CLAIM_SECONDS = int(os.getenv("EMAIL_OUTBOX_CLAIM_SECONDS", 600))
+
+# Strategy comparison: processes per comparison, seeds per randomised
+# strategy, and how long compared plans stay committable. Comparisons run in
+# the request, so the default of 1 evaluates in-process rather than spawning
+# a process pool per request (0 = one process per CPU).
+ALLOCATION_COMPARE_WORKERS = int(os.getenv("ALLOCATION_COMPARE_WORKERS", 1))
+ALLOCATION_COMPARE_SEEDS = int(os.getenv("ALLOCATION_COMPARE_SEEDS", 3))
+ALLOCATION_PLAN_CACHE_SECONDS = int(os.getenv("ALLOCATION_PLAN_CACHE_SECONDS", 900))
+
+# Department-scoped values cached by frontend.cache. Keys carry the
+# department's data version, so this only bounds how long unused entries live.
+DEPARTMENT_CACHE_SECONDS = int(os.getenv("DEPARTMENT_CACHE_SECONDS", 3600))
+
+# How long the row totals shown next to keyset-paginated lists stay cached.
+PAGINATION_COUNT_CACHE_SECONDS = int(os.getenv("PAGINATION_COUNT_CACHE_SECONDS", 60))
+
+# Per-process memory for generated allocation CSVs (bytes, least recently used evicted).
+ALLOCATION_EXPORT_CACHE_BYTES = int(os.getenv("ALLOCATION_EXPORT_CACHE_BYTES", 32 * 1024 * 1024))
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -0,0 +1,355 @@
+# nacos_allocation/tests.py
+"""
+SQL query budget harness.
+
+Every named URL of the project is requested as a department admin against
+a small and a large seeded department. A view fails when its query count
+grows with the data (N+1 patterns) or exceeds the budget declared in
+VIEW_CASES; the failure message lists the statements that were repeated.
+
+New URLs must be added to VIEW_CASES (or UNCHECKED_URLS, with a reason).
+"""
+import json
+import re
+import unittest
+from collections import Counter
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from allocation import exports
+from allocation.models import AllocationJob, Group
+from allocation.services import execute_allocation
+from frontend.models import Department, School, User
+from frontend.stats import department_stats
+from students.models import Student
+from supervisors.models import Supervisor
+
+# (groups, students per group) for the two seeded departments.
+SMALL = (2, 3)
+LARGE = (6, 12)
+
+# How many repeated statements to show per failing view.
+MAX_REPEATED_SHOWN = 5
+
+
+class ViewCase:
+    def __init__(self, budget, method='get', args=None, data=None, json_body=None):
+        self.budget = budget
+        self.method = method
+        self.args = args or (lambda fixture: ())
+        self.data = data or (lambda fixture: {})
+        self.json_body = json_body
+
+
+VIEW_CASES = {
+    'dashboard': ViewCase(budget=12),
+    'login': ViewCase(budget=4),
+    'logout': ViewCase(budget=4, method='post'),
+    'register': ViewCase(budget=4),
+    'password_reset_request': ViewCase(budget=4),
+    'password_reset_question': ViewCase(budget=4),
+    'password_reset_confirm': ViewCase(budget=4),
+
+    'students:list': ViewCase(budget=8),
+    'students:create': ViewCase(budget=6),
+    'students:upload': ViewCase(budget=4),
+    'students:preference_upload': ViewCase(budget=4),
+    'students:download_template': ViewCase(budget=6),
+    'students:edit': ViewCase(budget=8, args=lambda fixture: (fixture['student'],)),
+    'students:delete': ViewCase(budget=17, method='post', args=lambda fixture: (fixture['student'],)),
+
+    'supervisors:list': ViewCase(budget=8),
+    'supervisors:create': ViewCase(budget=4),
+    'supervisors:upload': ViewCase(budget=4),
+    'supervisors:download_template': ViewCase(budget=4),
+    'supervisors:edit': ViewCase(budget=6, args=lambda fixture: (fixture['supervisor'],)),
+    'supervisors:delete': ViewCase(budget=12, method='post', args=lambda fixture: (fixture['supervisor'],)),
+
+    'allocation:run': ViewCase(budget=10),
+    'allocation:extend': ViewCase(budget=16, method='post'),
+    'allocation:preview': ViewCase(
+        budget=12,
+        data=lambda fixture: {'allocation_method': 'balanced', 'num_groups': fixture['num_groups']},
+    ),
+    'allocation:commit_preview': ViewCase(
+        budget=10,
+        method='post',
+        data=lambda fixture: {
+            'allocation_method': 'balanced',
+            'num_groups': fixture['num_groups'],
+            'optimize_ms': 0,
+            'fingerprint': 'stale',
+        },
+    ),
+    'allocation:compare': ViewCase(
+        budget=12, method='post', data=lambda fixture: {'num_groups': fixture['num_groups']}
+    ),
+    'allocation:commit_plan': ViewCase(
+        budget=6, method='post', data=lambda fixture: {'token': 'stale', 'index': 0}
+    ),
+    'allocation:results': ViewCase(budget=10),
+    'allocation:download_csv': ViewCase(budget=8),
+    'allocation:download_history_csv': ViewCase(budget=6),
+    'allocation:download_rosters': ViewCase(budget=7),
+    'allocation:detail': ViewCase(budget=10, args=lambda fixture: (fixture['allocation'],)),
+    'allocation:group_roster': ViewCase(budget=5, args=lambda fixture: (fixture['group'],)),
+    'allocation:send_group_email': ViewCase(
+        budget=8, method='post', json_body=lambda fixture: {'groupId': fixture['group'], 'subject': 'Hi'}
+    ),
+    'allocation:job_status': ViewCase(budget=6, args=lambda fixture: (fixture['job'],)),
+}
+
+# URL names deliberately not measured.
+UNCHECKED_URLS = {
+    'admin': 'Django admin is outside the app code',
+}
+
+# Views whose query count is known to grow with the data. Tests for these
+# are expected failures until the view is fixed; remove entries as they are.
+KNOWN_SCALING = {
+    'students:download_template',  # one student query per supervisor, all departments
+}
+
+
+def url_names(resolver=None, namespace=None):
+    """Fully qualified names of every named pattern, recursing into includes."""
+    resolver = resolver or get_resolver()
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            inner = pattern.namespace
+            if namespace and inner:
+                inner = f'{namespace}:{inner}'
+            yield from url_names(pattern, inner or namespace)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield f'{namespace}:{pattern.name}' if namespace else pattern.name
+
+
+def normalize_sql(sql):
+    """Collapse literals so the same statement with different ids compares equal."""
+    sql = re.sub(r"'[^']*'", '?', sql)
+    sql = re.sub(r'\b\d+\b', '?', sql)
+    return re.sub(r'\((?:\?, )+\?\)', '(?...)', sql)
+
+
+def seed_department(code, num_groups, per_group):
+    department = Department.objects.create(
+        school=School.objects.get_or_create(name='Query School', code='QS')[0],
+        name=f'Department {code}',
+        code=code,
+    )
+    user = User.objects.create_user(
+        email=f'admin-{code}@example.com', password='x', department=department, is_department_admin=True
+    )
+    supervisors = Supervisor.objects.bulk_create([
+        Supervisor(name=f'{code} Supervisor {number}', email=f'{code}{number}@example.com', department=department)
+        for number in range(num_groups)
+    ])
+    Student.objects.bulk_create([
+        Student(
+            matric_no=f'{code}{number:04d}',
+            full_name=f'{code} Student {number}',
+            email=f'{code}.student{number}@example.com',
+            cgpa=Decimal(100 + (number * 37) % 400) / 100,
+            department=department,
+        )
+        for number in range(num_groups * per_group)
+    ])
+    summary = execute_allocation(department, 'balanced', num_groups)
+    # Late registrations, so "extend" and "preview" have work to do.
+    Student.objects.bulk_create([
+        Student(
+            matric_no=f'{code}L{number:03d}',
+            cgpa=Decimal('3.50'),
+            department=department,
+        )
+        for number in range(per_group)
+    ])
+    job = AllocationJob.objects.create(
+        department=department, requested_by=user, method='balanced', num_groups=num_groups
+    )
+    # Bulk inserts above bypass the stats signals; count once, as a first page view would.
+    department_stats(department)
+    return user, {
+        'num_groups': num_groups,
+        'allocation': summary['allocation_result'].pk,
+        'group': Group.objects.filter(department=department).values_list('pk', flat=True).first(),
+        'student': (
+            Student.objects.filter(department=department, groups__isnull=False).values_list('pk', flat=True).first()
+        ),
+        'supervisor': supervisors[0].pk,
+        'job': job.pk,
+    }
+
+
+def measure(name, case, seeded):
+    """Request ``name`` as the seeded admin; returns the response and the SQL run."""
+    user, fixture = seeded
+    client = Client()
+    client.force_login(user)
+    url = reverse(name, args=case.args(fixture))
+    request = getattr(client, case.method)
+    kwargs = {'secure': True}
+    if case.json_body is not None:
+        kwargs.update(data=json.dumps(case.json_body(fixture)), content_type='application/json')
+    else:
+        kwargs['data'] = case.data(fixture)
+
+    # Roll back whatever the view writes so repeated measurements see the same data.
+    with transaction.atomic():
+        with CaptureQueriesContext(connection) as captured:
+            response = request(url, **kwargs)
+            if response.streaming:
+                # Streamed responses run their queries while being read.
+                b''.join(response.streaming_content)
+        transaction.set_rollback(True)
+    return response, [query['sql'] for query in captured.captured_queries]
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.small = seed_department('SM', *SMALL)
+        cls.large = seed_department('LG', *LARGE)
+
+    def setUp(self):
+        # Cached counts, plans or exports from earlier tests would hide queries.
+        cache.clear()
+        exports.csv_cache.clear()
+
+    def test_every_url_has_a_budget(self):
+        missing = [
+            name for name in url_names()
+            if name not in VIEW_CASES and name.split(':')[0] not in UNCHECKED_URLS
+        ]
+        self.assertEqual(missing, [], 'Add these URLs to VIEW_CASES (or UNCHECKED_URLS)')
+
+    def measure(self, name, case, seeded):
+        response, queries = measure(name, case, seeded)
+        self.assertLess(response.status_code, 500, f'{name} returned {response.status_code}')
+        return queries
+
+    def check_view(self, name):
+        case = VIEW_CASES[name]
+        small = self.measure(name, case, self.small)
+        large = self.measure(name, case, self.large)
+
+        problems = []
+        if len(large) > len(small):
+            problems.append(f'query count grows with data: {len(small)} -> {len(large)}')
+        if len(large) > case.budget:
+            problems.append(f'{len(large)} queries, budget {case.budget}')
+        if problems:
+            repeated = [
+                f'  {count}x {sql}'
+                for sql, count in Counter(map(normalize_sql, large)).most_common(MAX_REPEATED_SHOWN)
+                if count > 1
+            ]
+            self.fail(f'{name}: ' + '; '.join(problems) + '\nRepeated SQL:\n' + '\n'.join(repeated or ['  (none)']))
+
+
+def _make_test(name):
+    def test(self):
+        self.check_view(name)
+    test.__name__ = f"test_{name.replace(':', '_')}"
+    test.__doc__ = f'Query budget for {name}'
+    return unittest.expectedFailure(test) if name in KNOWN_SCALING else test
+
+
+for _name in VIEW_CASES:
+    _test = _make_test(_name)
+    setattr(QueryBudgetTests, _test.__name__, _test)
+
+
+class AllocationDetailScalingTests(TestCase):
+    def test_query_count_does_not_depend_on_group_count(self):
+        case = VIEW_CASES['allocation:detail']
+        counts = []
+        for code, num_groups in (('D10', 10), ('D2K', 2000)):
+            response, queries = measure('allocation:detail', case, seed_department(code, num_groups, 1))
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class RunExportCachingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seeded = seed_department('EC', *SMALL)
+
+    def setUp(self):
+        exports.csv_cache.clear()
+
+    def test_unchanged_run_is_not_regenerated(self):
+        case = VIEW_CASES['allocation:download_csv']
+        first, queries = measure('allocation:download_csv', case, self.seeded)
+        self.assertTrue(first.streaming)
+
+        second, cached_queries = measure('allocation:download_csv', case, self.seeded)
+        self.assertFalse(second.streaming)
+        self.assertEqual(second.content.count(b'\r\n'), 1 + SMALL[0] * SMALL[1])
+        self.assertLess(len(cached_queries), len(queries))
+
+        client = Client()
+        client.force_login(self.seeded[0])
+        response = client.get(reverse('allocation:download_csv'), secure=True, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_detail_page_is_not_reused_across_logins(self):
+        user, fixture = self.seeded
+        url = reverse('allocation:detail', args=(fixture['allocation'],))
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(user)
+        first = client.get(url, secure=True)
+        self.assertEqual(client.get(url, secure=True, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        client.logout()
+        client.force_login(user)
+        response = client.get(url, secure=True, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        # The fresh page's CSRF token is accepted
+        token = re.search(rb'name="csrfmiddlewaretoken" value="([^"]+)"', response.content).group(1).decode()
+        logout = client.post(
+            reverse('logout'), {'csrfmiddlewaretoken': token}, secure=True, HTTP_REFERER=f'https://testserver{url}'
+        )
+        self.assertNotEqual(logout.status_code, 403)
+
+
+class GroupRosterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seeded = seed_department('GR', *SMALL)
+        cls.other = seed_department('GO', *SMALL)
+
+    def test_payload_lists_the_members(self):
+        user, fixture = self.seeded
+        group = Group.objects.select_related('supervisor').get(pk=fixture['group'])
+        client = Client()
+        client.force_login(user)
+        payload = client.get(reverse('allocation:group_roster', args=(group.pk,)), secure=True).json()
+
+        self.assertEqual(
+            (payload['id'], payload['number'], payload['supervisor'], payload['supervisor_email']),
+            (group.pk, group.number, group.supervisor.name, group.supervisor.email),
+        )
+        self.assertEqual(payload['student_count'], SMALL[1])
+        self.assertEqual(payload['average_cgpa'], str(group.average_cgpa))
+        members = group.students.order_by('matric_no')
+        self.assertEqual(payload['students'], [
+            {
+                'id': student.pk, 'full_name': student.full_name, 'matric_no': student.matric_no,
+                'email': student.email, 'cgpa': str(student.cgpa),
+            }
+            for student in members
+        ])
+
+    def test_other_departments_groups_are_not_found(self):
+        client = Client()
+        client.force_login(self.seeded[0])
+        url = reverse('allocation:group_roster', args=(self.other[1]['group'],))
+        self.assertEqual(client.get(url, secure=True).status_code, 404)
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
-from .models import Student
+from .models import Student, SupervisorPreference
 
 
 @admin.register(Student)
@@ -15,3 +15,10 @@ class StudentAdmin(admin.ModelAdmin):
     def classification(self, obj):
         return obj.classification()
     classification.short_description = 'Classification'
+
+
+@admin.register(SupervisorPreference)
+class SupervisorPreferenceAdmin(admin.ModelAdmin):
+    list_display = ('student', 'ranking', 'updated_at')
+    search_fields = ('student__matric_no',)
+    raw_id_fields = ('student',)
@@ -72,4 +72,32 @@ class StudentUploadForm(forms.Form):
                 raise forms.ValidationError("File must be a CSV file (.csv)")
             if csv_file.size > 5 * 1024 * 1024:
                 raise forms.ValidationError("File size must be less than 5MB")
-        return csv_file
\ No newline at end of file
+        return csv_file
+
+
+class PreferenceUploadForm(forms.Form):
+    csv_file = forms.FileField(
+        label="CSV File",
+        help_text="Upload a CSV file of ranked supervisor choices (matric_no,choice1[,choice2,...])",
+        widget=forms.FileInput(attrs={
+            'class': 'w-full px-4 py-3 border border-white/40 rounded-xl bg-white/60 backdrop-blur-sm focus:outline-none focus:ring-2 focus:ring-secondary-start focus:border-transparent transition-all duration-200 file:mr-4 file:py-2 file:px-4 file:rounded-lg file:border-0 file:text-sm file:font-medium file:bg-secondary-start file:text-white hover:file:bg-secondary-mid file:transition-all file:duration-200',
+            'accept': '.csv'
+        })
+    )
+    skip_header = forms.BooleanField(
+        required=False,
+        initial=True,
+        label="Skip header row",
+        widget=forms.CheckboxInput(attrs={
+            'class': 'h-4 w-4 text-secondary-start focus:ring-secondary-start border-gray-300 rounded'
+        })
+    )
+
+    def clean_csv_file(self):
+        csv_file = self.cleaned_data.get('csv_file')
+        if csv_file:
+            if not csv_file.name.lower().endswith('.csv'):
+                raise forms.ValidationError("File must be a CSV file (.csv)")
+            if csv_file.size > 5 * 1024 * 1024:
+                raise forms.ValidationError("File size must be less than 5MB")
+        return csv_file
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0003_student_email_student_full_name_student_supervisor_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupervisorPreference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ranking', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='preference', to='students.student')),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('frontend', '0003_alter_user_managers'),
+        ('students', '0004_supervisorpreference'),
+        ('supervisors', '0005_supervisor_max_students'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['department', '-cgpa', 'matric_no'], name='student_dept_cgpa_idx'),
+        ),
+    ]
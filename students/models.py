@@ -2,6 +2,7 @@ from decimal import Decimal
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from allocation.engine import CLASSIFICATIONS, classify_points, to_points
 from frontend.models import Department
 
 
@@ -33,6 +34,8 @@ class Student(models.Model):
 
     class Meta:
         ordering = ['-cgpa']
+        # Serves the keyset-paginated student list (see frontend.pagination).
+        indexes = [models.Index(fields=['department', '-cgpa', 'matric_no'], name='student_dept_cgpa_idx')]
 
     def __str__(self):
         return f"{self.full_name or self.matric_no} ({self.matric_no})"
@@ -44,15 +47,21 @@ class Student(models.Model):
         return self.cgpa
 
     def classification(self):
-        if 4.50 <= float(self.cgpa) <= 5.00:
-            return "First Class"
-        elif 3.50 <= float(self.cgpa) <= 4.49:
-            return "Second Class Upper"
-        elif 2.40 <= float(self.cgpa) <= 3.49:
-            return "Second Class Lower"
-        elif 1.50 <= float(self.cgpa) <= 2.39:
-            return "Third Class"
-        elif 1.00 <= float(self.cgpa) <= 1.49:
-            return "Pass"
-        else:
-            return "Fail"
+        # Single Decimal -> hundredths conversion plus a table lookup; shares
+        # its thresholds with the allocation engine.
+        return CLASSIFICATIONS[classify_points(to_points(self.cgpa))]
+
+
+class SupervisorPreference(models.Model):
+    """A student's ranked supervisor choices, used by preference-based allocation."""
+    student = models.OneToOneField(
+        Student,
+        on_delete=models.CASCADE,
+        related_name='preference'
+    )
+    # Supervisor ids, most preferred first.
+    ranking = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Preferences of {self.student.matric_no}"
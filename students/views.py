@@ -1,12 +1,15 @@
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
+from django.db import transaction
 from django.http import HttpResponse
 
+from allocation.persistence import refresh_group_stats
+from frontend.cache import batched_bumps, versioned_key
+from frontend.pagination import KeysetPaginator
 from supervisors.models import Supervisor
-from .models import Student
-from .forms import StudentForm, StudentUploadForm
+from .models import Student, SupervisorPreference
+from .forms import PreferenceUploadForm, StudentForm, StudentUploadForm
 import csv
 import io
 
@@ -17,16 +20,18 @@ PER_PAGE = 20  # rows per page for pagination
 def student_list(request):
     # Filter students by the current user's department
     department = request.user.department
-    qs = Student.objects.filter(department=department).order_by('-cgpa', 'matric_no')
+    qs = Student.objects.filter(department=department)
 
     # Prefetch related groups to optimize queries
     qs = qs.prefetch_related('groups')
 
-    paginator = Paginator(qs, PER_PAGE)
-    page_number = request.GET.get('page', 1)
-    students = paginator.get_page(page_number)
+    # Keyset pages: cost does not grow with depth; the total is cached
+    paginator = KeysetPaginator(
+        qs, ['-cgpa', 'matric_no'], PER_PAGE, count_key=versioned_key(department, 'students:count')
+    )
+    students = paginator.page(request.GET.get('cursor'))
 
-    has_students = qs.exists()
+    has_students = students.count > 0
 
     return render(request, 'students/list.html', {
         'students': students,
@@ -53,6 +58,7 @@ def student_create(request):
 # views.py
 # views.py
 @login_required(login_url='/login/')
+@batched_bumps()
 def student_upload(request):
     if request.method == 'POST':
         form = StudentUploadForm(request.POST, request.FILES)
@@ -76,6 +82,7 @@ def student_upload(request):
                 success_count = 0
                 error_count = 0
                 errors = []
+                updated_ids = []
 
                 for row_num, row in enumerate(reader, 1):
                     if len(row) < 2:  # Ensure at least matric_no, gpa
@@ -108,6 +115,8 @@ def student_upload(request):
                                 matric_no=matric_no,
                                 defaults={'cgpa': cgpa, 'department': current_department}
                             )
+                            if not created:
+                                updated_ids.append(student.pk)
                         else:
                             # Only create if doesn't exist
                             student, created = Student.objects.get_or_create(
@@ -127,6 +136,13 @@ def student_upload(request):
                         errors.append(f"Row {row_num}: Error saving student - {str(e)}")
                         continue
 
+                # Keep allocated groups' stored statistics in line with new CGPAs
+                if updated_ids:
+                    refresh_group_stats(
+                        Student.groups.through.objects.filter(student_id__in=updated_ids)
+                        .values_list('group_id', flat=True)
+                    )
+
                 messages.success(request,
                                  f'Successfully processed {success_count} students. {error_count} errors occurred.')
 
@@ -150,6 +166,87 @@ def student_upload(request):
     })
 
 
+@login_required(login_url='/login/')
+def preference_upload(request):
+    """
+    Upload ranked supervisor choices: one row per student,
+    ``matric_no, choice1, choice2, ...`` where each choice is a supervisor's
+    name or email in the current department. Re-uploading replaces a
+    student's previous ranking.
+    """
+    if request.method == 'POST':
+        form = PreferenceUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            department = request.user.department
+            students = dict(
+                Student.objects.filter(department=department).values_list('matric_no', 'id')
+            )
+            supervisors = {}
+            for supervisor_id, name, email in Supervisor.objects.filter(
+                department=department
+            ).values_list('id', 'name', 'email'):
+                supervisors[name.strip().lower()] = supervisor_id
+                if email:
+                    supervisors[email.strip().lower()] = supervisor_id
+
+            rankings = {}
+            errors = []
+            try:
+                reader = csv.reader(io.StringIO(request.FILES['csv_file'].read().decode('utf-8')))
+                if form.cleaned_data['skip_header']:
+                    next(reader, None)
+
+                for row_num, row in enumerate(reader, 1):
+                    if not row or not row[0].strip():
+                        continue
+                    matric_no = row[0].strip()
+                    student_id = students.get(matric_no)
+                    if student_id is None:
+                        errors.append(f"Row {row_num}: Unknown student {matric_no}")
+                        continue
+
+                    ranking = []
+                    for choice in row[1:]:
+                        choice = choice.strip()
+                        if not choice:
+                            continue
+                        supervisor_id = supervisors.get(choice.lower())
+                        if supervisor_id is None:
+                            errors.append(f"Row {row_num}: Unknown supervisor '{choice}'")
+                        elif supervisor_id not in ranking:
+                            ranking.append(supervisor_id)
+                    if ranking:
+                        rankings[student_id] = ranking
+
+                # Replace in bulk rather than one update_or_create per row.
+                with transaction.atomic():
+                    SupervisorPreference.objects.filter(student_id__in=rankings.keys()).delete()
+                    SupervisorPreference.objects.bulk_create(
+                        [SupervisorPreference(student_id=student_id, ranking=ranking)
+                         for student_id, ranking in rankings.items()],
+                        batch_size=1000,
+                    )
+
+                messages.success(request,
+                                 f'Saved preferences for {len(rankings)} students. {len(errors)} errors occurred.')
+                if errors:
+                    request.session['upload_errors'] = errors[:10]  # Show first 10 errors
+
+            except Exception as e:
+                messages.error(request, f'Error processing CSV file: {str(e)}')
+
+            return redirect('students:list')
+    else:
+        form = PreferenceUploadForm()
+
+    errors = request.session.pop('upload_errors', [])
+
+    return render(request, 'students/preference_upload.html', {
+        'form': form,
+        'errors': errors
+    })
+
+
 @login_required(login_url='/login/')
 def download_template(request):
     response = HttpResponse(content_type='text/csv')
@@ -181,6 +278,9 @@ def student_edit(request, pk):
         form = StudentForm(request.POST, instance=student)
         if form.is_valid():
             form.save()
+            if form.changed_data:
+                # Group statistics and the runs' exports include this student
+                refresh_group_stats(student.groups.values_list('pk', flat=True))
             messages.success(request, 'Student updated successfully!')
             return redirect('students:list')
     else:
@@ -192,7 +292,9 @@ def student_edit(request, pk):
 def student_delete(request, pk):
     student = get_object_or_404(Student, pk=pk)
     if request.method == 'POST':
+        group_ids = list(student.groups.values_list('pk', flat=True))
         student.delete()
+        refresh_group_stats(group_ids)
         messages.success(request, 'Student deleted successfully!')
         return redirect('students:list')
     return redirect('students:list')
@@ -6,7 +6,7 @@ from .models import Supervisor
 
 @admin.register(Supervisor)
 class SupervisorAdmin(admin.ModelAdmin):
-    list_display = ('name', 'current_students_count', 'created_at')
+    list_display = ('name', 'max_students', 'current_students_count', 'created_at')
     search_fields = ('name',)
     ordering = ('name',)
     readonly_fields = ('current_students_count',)
@@ -6,7 +6,7 @@ from .models import Supervisor
 class SupervisorForm(forms.ModelForm):
     class Meta:
         model = Supervisor
-        fields = ['name', 'email']
+        fields = ['name', 'email', 'max_students']
         widgets = {
             'name': forms.TextInput(attrs={
                 'class': 'w-full px-4 py-3 border border-white/40 rounded-xl bg-white/60 backdrop-blur-sm focus:outline-none focus:ring-2 focus:ring-secondary-start focus:border-transparent transition-all duration-200 placeholder-gray-500',
@@ -16,18 +16,24 @@ class SupervisorForm(forms.ModelForm):
                 'class': 'w-full px-4 py-3 border border-white/40 rounded-xl bg-white/60 backdrop-blur-sm focus:outline-none focus:ring-2 focus:ring-secondary-start focus:border-transparent transition-all duration-200 placeholder-gray-500',
                 'placeholder': 'supervisor@example.com'
             }),
+            'max_students': forms.NumberInput(attrs={
+                'class': 'w-full px-4 py-3 border border-white/40 rounded-xl bg-white/60 backdrop-blur-sm focus:outline-none focus:ring-2 focus:ring-secondary-start focus:border-transparent transition-all duration-200 placeholder-gray-500',
+                'min': '1',
+                'placeholder': 'Leave blank for an equal share'
+            }),
         }
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # Make email not required
         self.fields['email'].required = False
+        self.fields['max_students'].required = False
 
 
 class SupervisorUploadForm(forms.Form):
     csv_file = forms.FileField(
         label="CSV File",
-        help_text="Upload a CSV file with supervisor data (name[,email])",
+        help_text="Upload a CSV file with supervisor data (name[,email,max_students])",
         widget=forms.FileInput(attrs={
             'class': 'w-full px-4 py-3 border border-white/40 rounded-xl bg-white/60 backdrop-blur-sm focus:outline-none focus:ring-2 focus:ring-secondary-start focus:border-transparent transition-all duration-200 file:mr-4 file:py-2 file:px-4 file:rounded-lg file:border-0 file:text-sm file:font-medium file:bg-secondary-start file:text-white hover:file:bg-secondary-mid file:transition-all file:duration-200',
             'accept': '.csv'
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supervisors', '0004_remove_supervisor_unique_supervisor_email_per_department_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supervisor',
+            name='max_students',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -12,6 +12,8 @@ class Supervisor(models.Model):
     )
     name = models.CharField(max_length=100)
     email = models.EmailField(max_length=254, null=True, blank=True)
+    # Upper bound on students for capacity-aware allocation; blank = equal share.
+    max_students = models.PositiveIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
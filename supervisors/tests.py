@@ -1,3 +1,36 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from frontend.models import Department, School, User
+from supervisors.models import Supervisor
+
+
+class SupervisorUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        school = School.objects.create(name='Upload School', code='US')
+        cls.department = Department.objects.create(school=school, name='Upload', code='UP')
+        cls.user = User.objects.create_user(
+            email='admin-up@example.com', password='x', department=cls.department, is_department_admin=True
+        )
+        Supervisor.objects.create(name='Dr Ada', email='ada@example.com', max_students=8, department=cls.department)
+        Supervisor.objects.create(name='Dr Ben', email='ben@example.com', max_students=5, department=cls.department)
+
+    def upload(self, content):
+        self.client.force_login(self.user)
+        return self.client.post(reverse('supervisors:upload'), {
+            'csv_file': SimpleUploadedFile('supervisors.csv', content.encode(), content_type='text/csv'),
+            'skip_header': 'on',
+            'update_existing': 'on',
+        }, secure=True)
+
+    def test_update_without_max_students_keeps_limits(self):
+        self.upload('name,email\nDr Ada,ada@new.example.com\nDr Ben,ben@example.com,\nDr Cy,cy@example.com\n')
+        limits = dict(Supervisor.objects.filter(department=self.department).values_list('name', 'max_students'))
+        self.assertEqual(limits, {'Dr Ada': 8, 'Dr Ben': 5, 'Dr Cy': None})
+        self.assertEqual(Supervisor.objects.get(name='Dr Ada').email, 'ada@new.example.com')
+
+    def test_update_with_max_students_sets_limits(self):
+        self.upload('name,email,max_students\nDr Ada,ada@example.com,3\n')
+        self.assertEqual(Supervisor.objects.get(name='Dr Ada').max_students, 3)
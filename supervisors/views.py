@@ -1,13 +1,15 @@
 # supervisors/views.py
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from django.db.models import Count
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.http import HttpResponse
 
 from allocation.models import Group
+from allocation.persistence import mark_runs_updated
+from frontend.cache import batched_bumps, versioned_key
+from frontend.pagination import KeysetPage, KeysetPaginator
 from students.models import Student
 from .models import Supervisor
 from .forms import SupervisorForm, SupervisorUploadForm
@@ -23,7 +25,7 @@ def supervisor_list(request):
 
     # If user has no department, return empty page (no DB work)
     if not department:
-        empty_page = Paginator([], PER_PAGE).get_page(1)
+        empty_page = KeysetPage([], next_cursor=None, previous_cursor=None, count=0)
         return render(request, 'supervisors/list.html', {
             'supervisors': empty_page,
             'has_supervisors': False,
@@ -32,27 +34,22 @@ def supervisor_list(request):
     # Annotate each supervisor with the number of related students.
     # Adjust the Count() field path below depending on your models:
     # - If Group model FK is `supervisor` and Student model FK to group is `group`,
-    #   the lookup is 'group__students' (students is the related_name on Student -> Group).
+    #   the lookup is 'groups__students' (students is the related_name on Student -> Group).
     # - If your Student model has supervisor FK directly, use 'student' or your related_name.
     supervisors_qs = (
         Supervisor.objects
         .filter(department=department)
         .select_related('department')
-        .annotate(current_students_count=Count('group__students', distinct=True))
-        .order_by('name')
+        .annotate(current_students_count=Count('groups__students', distinct=True))
     )
 
-    # Pagination
-    page_number = request.GET.get('page', 1)
-    paginator = Paginator(supervisors_qs, PER_PAGE)
-    try:
-        supervisors_page = paginator.page(page_number)
-    except PageNotAnInteger:
-        supervisors_page = paginator.page(1)
-    except EmptyPage:
-        supervisors_page = paginator.page(paginator.num_pages)
+    # Keyset pagination by name; the total is cached
+    paginator = KeysetPaginator(
+        supervisors_qs, ['name'], PER_PAGE, count_key=versioned_key(department, 'supervisors:count')
+    )
+    supervisors_page = paginator.page(request.GET.get('cursor'))
 
-    has_supervisors = paginator.count > 0
+    has_supervisors = supervisors_page.count > 0
 
     return render(request, 'supervisors/list.html', {
         'supervisors': supervisors_page,
@@ -75,6 +72,7 @@ def supervisor_create(request):
 
 
 @login_required(login_url='/login/')
+@batched_bumps()
 def upload_supervisors(request):
     if request.method == "POST":
         form = SupervisorUploadForm(request.POST, request.FILES)
@@ -114,12 +112,22 @@ def upload_supervisors(request):
                 if email == '':
                     email = None
 
+                defaults = {'email': email}
+                # Only a filled-in column sets the limit, so re-uploading an
+                # old name,email file keeps the limits already stored.
+                max_students = row[2].strip() if len(row) > 2 else ''
+                if max_students:
+                    if not max_students.isdigit() or int(max_students) < 1:
+                        errors.append(f"Row {row_num}: max_students must be a positive whole number")
+                        continue
+                    defaults['max_students'] = int(max_students)
+
                 try:
                     if update_existing:
                         supervisor, created = Supervisor.objects.update_or_create(
                             name=name,
                             department=request.user.department,
-                            defaults={'email': email}
+                            defaults=defaults
                         )
                         if created:
                             created_count += 1
@@ -130,7 +138,7 @@ def upload_supervisors(request):
                         supervisor, created = Supervisor.objects.get_or_create(
                             name=name,
                             department=request.user.department,  # Added this line
-                            defaults={'email': email}
+                            defaults=defaults
                         )
                         if created:
                             created_count += 1
@@ -168,10 +176,10 @@ def download_supervisor_template(request):
     response['Content-Disposition'] = 'attachment; filename="supervisor_template.csv"'
 
     writer = csv.writer(response)
-    writer.writerow(['name', 'email'])
-    writer.writerow(['Dr. John Smith', 'john.smith@university.edu'])
-    writer.writerow(['Prof. Jane Doe', 'jane.doe@university.edu'])
-    writer.writerow(['Dr. Michael Brown', ''])  # Example without email
+    writer.writerow(['name', 'email', 'max_students'])
+    writer.writerow(['Dr. John Smith', 'john.smith@university.edu', '12'])
+    writer.writerow(['Prof. Jane Doe', 'jane.doe@university.edu', ''])
+    writer.writerow(['Dr. Michael Brown', '', ''])  # Example without email or capacity
 
     return response
 
@@ -183,6 +191,9 @@ def supervisor_edit(request, pk):
         form = SupervisorForm(request.POST, instance=supervisor)
         if form.is_valid():
             form.save()
+            if form.changed_data:
+                # Runs list the supervisor's name and e-mail
+                mark_runs_updated(supervisor.groups.all())
             messages.success(request, 'Supervisor updated successfully!')
             return redirect('supervisors:list')
     else:
@@ -191,6 +202,7 @@ def supervisor_edit(request, pk):
 
 
 @login_required(login_url='/login/')
+@batched_bumps()  # the cascade deletes every group of the supervisor
 def supervisor_delete(request, pk):
     supervisor = get_object_or_404(Supervisor, pk=pk, department=request.user.department)
     if request.method == 'POST':